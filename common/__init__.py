@@ -21,6 +21,7 @@ Created by Jonathan Denning, Jonathan Williamson, Patrick Moore
 
 __all__ = [
     'bezier',
+    'bgl_stub',
     'blender',
     'bmesh_render',
     'debug',
@@ -30,6 +31,7 @@ __all__ = [
     'globals',
     'hasher',
     'irc',
+    'kernels',
     'logger',
     'maths',
     'metaclasses',
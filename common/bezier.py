@@ -25,6 +25,7 @@ from mathutils import Vector, Matrix
 
 from .maths import Point, Vec
 from .utils import iter_running_sum
+from .kernels import as_vectors, cubic_bezier_points, path_cumulative_lengths
 
 
 def compute_quadratic_weights(t):
@@ -232,14 +233,12 @@ class CubicBezier:
             d003, d303 = (p03-p0), (p03-p3)
             p1, p2 = p0+d003*0.5, p3+d303*0.5
             return CubicBezier(p0, p1, p2, p3)
-        l_d = [0] + [(p0-p1).length for p0,
-                     p1 in zip(pts_list[:-1], pts_list[1:])]
-        l_ad = [s for d, s in iter_running_sum(l_d)]
-        dist = sum(l_d)
+        l_ad = path_cumulative_lengths(pts_list)
+        dist = l_ad[-1]
         if dist <= 0:
             p0 = pts_list[0]
             return CubicBezier(p0, p0, p0, p0)
-        l_t = [ad/dist for ad in l_ad]
+        l_t = (l_ad / dist).tolist()
 
         ex, x0, x1, x2, x3 = fit_cubicbezier([pt[0] for pt in pts_list], l_t)
         ey, y0, y1, y2, y3 = fit_cubicbezier([pt[1] for pt in pts_list], l_t)
@@ -369,8 +368,8 @@ class CubicBezier:
     def tessellate_uniform_points(self, segments=None):
         segments = segments or self.segments_default
         ts = [i/(segments-1) for i in range(segments)]
-        ps = [self.eval(t) for t in ts]
-        return ps
+        ps = cubic_bezier_points(self.p0, self.p1, self.p2, self.p3, ts)
+        return as_vectors(ps, Point)
 
     #########################################
     #                                       #
@@ -0,0 +1,462 @@
+'''
+Copyright (C) 2018 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import sys
+import time
+import types
+from collections import Counter
+
+import numpy as np
+
+from .kernels import project_to_window, rasterize_ids
+
+
+'''
+Headless stand-in for Blender's bgl module, so the drawing code
+(bmesh_render, drawing, ui) can run without a GL context, for example in
+`blender --background`.
+
+The stub records every call, counts draw calls, vertices, and state
+changes (including redundant ones), and can rasterize triangles, lines,
+and points into a NumPy image with kernels.rasterize_ids.
+
+The stub must be installed before any module that imports bgl:
+
+    from .common import bgl_stub
+    stub = bgl_stub.install(raster_size=(256, 256))
+    from .common.bmesh_render import BMeshRender
+    ...
+    stub.begin_frame()
+    render.draw(opts)
+    print(stub.end_frame())
+'''
+
+
+# real values for the constants the stub needs to understand; all other
+# GL_* constants get unique values when first used
+_constants = {
+    'GL_FALSE': 0, 'GL_TRUE': 1, 'GL_NO_ERROR': 0,
+    'GL_POINTS': 0x0000, 'GL_LINES': 0x0001, 'GL_LINE_LOOP': 0x0002,
+    'GL_LINE_STRIP': 0x0003, 'GL_TRIANGLES': 0x0004,
+    'GL_BYTE': 0x1400, 'GL_UNSIGNED_BYTE': 0x1401, 'GL_SHORT': 0x1402,
+    'GL_UNSIGNED_SHORT': 0x1403, 'GL_INT': 0x1404, 'GL_UNSIGNED_INT': 0x1405,
+    'GL_FLOAT': 0x1406, 'GL_DOUBLE': 0x140A,
+    'GL_ARRAY_BUFFER': 0x8892, 'GL_ELEMENT_ARRAY_BUFFER': 0x8893,
+    'GL_VERTEX_SHADER': 0x8B31, 'GL_FRAGMENT_SHADER': 0x8B30,
+    'GL_SHADING_LANGUAGE_VERSION': 0x8B8C, 'GL_VIEWPORT': 0x0BA2,
+}
+
+_dtypes = {
+    0x1400: np.int8, 0x1401: np.uint8, 0x1402: np.int16, 0x1403: np.uint16,
+    0x1404: np.int32, 0x1405: np.uint32, 0x1406: np.float32, 0x140A: np.float64,
+}
+
+# functions whose calls change GL state; values are compared to detect
+# redundant calls (key is function name plus leading args that select
+# which state is changed)
+_state_functions = {
+    'glEnable': 1, 'glDisable': 1, 'glHint': 1, 'glLineWidth': 0,
+    'glPointSize': 0, 'glDepthRange': 0, 'glDepthFunc': 0, 'glDepthMask': 0,
+    'glLineStipple': 0, 'glBlendFunc': 0, 'glUseProgram': 0,
+    'glBindBuffer': 1, 'glColor3f': 0, 'glColor4f': 0,
+}
+
+
+class Buffer:
+    ''' stand-in for bgl.Buffer, backed by a NumPy array '''
+
+    def __init__(self, type, dimensions, template=None):
+        dims = [dimensions] if isinstance(dimensions, int) else list(dimensions)
+        self.type = type
+        self.array = np.zeros(dims, dtype=_dtypes[type])
+        if template is not None:
+            self.array[...] = np.array(template, dtype=self.array.dtype).reshape(dims)
+        # byte offset into bound buffer, when used as a "pointer" (see VoidBufValue)
+        self.offset = 0
+        # object that owns the data (see bgl_ext._make_Buffer)
+        self.parent = None
+
+    @staticmethod
+    def from_array(array):
+        ''' wraps array without copying '''
+        buf = Buffer.__new__(Buffer)
+        buf.type = {np.dtype(v): k for (k, v) in _dtypes.items()}[array.dtype]
+        buf.array = array
+        buf.offset = 0
+        buf.parent = array
+        return buf
+
+    @staticmethod
+    def pointer(offset):
+        buf = Buffer(_constants['GL_BYTE'], 1)
+        buf.offset = offset
+        return buf
+
+    @property
+    def dimensions(self):
+        return list(self.array.shape)
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, key):
+        v = self.array[key]
+        return Buffer.from_array(v) if isinstance(v, np.ndarray) else v.item()
+
+    def __setitem__(self, key, value):
+        self.array[key] = value
+
+    def to_list(self):
+        return self.array.tolist()
+
+    def __repr__(self):
+        return 'Buffer(%s)' % str(self.to_list())
+
+
+class StubBGL(types.ModuleType):
+    '''
+    module-like stand-in for bgl.  unknown gl* functions are recorded and
+    return None; unknown GL_* constants get unique values
+    '''
+
+    IS_STUB = True
+    Buffer = Buffer
+
+    def __init__(self, raster_size=None, record_log=False):
+        super().__init__('bgl')
+        self.__dict__.update(_constants)
+        self._next_constant = 0x10000
+        self._next_name = 1
+        self.record_log = record_log
+        self.raster_size = raster_size
+        # model-view-projection matrix used when rasterizing
+        self.raster_mvp = np.eye(4)
+        self.reset()
+
+    def __getattr__(self, name):
+        if name.startswith('GL_'):
+            self.__dict__[name] = self._next_constant
+            self._next_constant += 1
+            return self.__dict__[name]
+        if name.startswith('gl'):
+            fn = lambda *args: self._record(name, args)
+            self.__dict__[name] = fn
+            return fn
+        raise AttributeError(name)
+
+    def reset(self):
+        ''' clears all GL objects, state, statistics, and the image '''
+        self.buffers = {}           # buffer name => np.uint8 array (bytes)
+        self.bound = {}             # target => buffer name
+        self.attribs = {}           # location => (buffer name, size, type, stride, offset)
+        self.programs = {}          # program name => {'attribs': {}, 'uniforms': {}, 'values': {}}
+        self.program = 0
+        self.state = {}
+        self.log = []
+        self.calls = Counter()
+        self.stats = Counter()
+        self.frame_start = None
+        self.clear_image()
+
+    def clear_image(self):
+        if not self.raster_size:
+            self.image, self.depth = None, None
+            return
+        w, h = self.raster_size
+        self.image = np.zeros((h, w, 4), dtype=np.float32)
+        self.depth = np.ones((h, w), dtype=np.float64)
+
+    def begin_frame(self):
+        self.stats = Counter()
+        self.calls = Counter()
+        self.frame_start = time.process_time()
+
+    def end_frame(self, frames=1):
+        ''' returns per-frame statistics since begin_frame, averaged over frames '''
+        stats = {k: v / frames for (k, v) in self.stats.items()}
+        stats['calls'] = sum(self.calls.values()) / frames
+        stats['time'] = (time.process_time() - self.frame_start) / frames
+        return stats
+
+    def _record(self, name, args):
+        self.calls[name] += 1
+        if self.record_log:
+            self.log.append((name, args))
+        if name in _state_functions:
+            n = _state_functions[name]
+            key = (name,) + args[:n]
+            if name in {'glEnable', 'glDisable'}:
+                key, value = ('enable', args[0]), name == 'glEnable'
+            else:
+                value = args[n:]
+            self.stats['state changes'] += 1
+            if self.state.get(key, None) == value:
+                self.stats['redundant state changes'] += 1
+            self.state[key] = value
+
+    def _name(self):
+        self._next_name += 1
+        return self._next_name - 1
+
+    def _program(self):
+        return self.programs.setdefault(self.program, {'attribs': {}, 'uniforms': {}, 'values': {}})
+
+    ###########################################################################
+    # queries and object creation
+
+    def glGetError(self):
+        self._record('glGetError', ())
+        return 0
+
+    def glGetString(self, name):
+        self._record('glGetString', (name,))
+        return '1.20 (bgl stub)'
+
+    def glGetIntegerv(self, pname, buf):
+        self._record('glGetIntegerv', (pname, buf))
+        if pname == _constants['GL_VIEWPORT'] and self.raster_size:
+            buf[:] = [0, 0, self.raster_size[0], self.raster_size[1]]
+
+    def glGenBuffers(self, n, buf):
+        self._record('glGenBuffers', (n, buf))
+        for i in range(n):
+            buf[i] = self._name()
+
+    def glGenLists(self, n):
+        self._record('glGenLists', (n,))
+        return self._name()
+
+    def glCreateProgram(self):
+        self._record('glCreateProgram', ())
+        name = self._name()
+        self.programs[name] = {'attribs': {}, 'uniforms': {}, 'values': {}}
+        return name
+
+    def glCreateShader(self, shadertype):
+        self._record('glCreateShader', (shadertype,))
+        return self._name()
+
+    def glGetAttribLocation(self, program, name):
+        self._record('glGetAttribLocation', (program, name))
+        attribs = self.programs[program]['attribs']
+        return attribs.setdefault(name, len(attribs))
+
+    def glGetUniformLocation(self, program, name):
+        self._record('glGetUniformLocation', (program, name))
+        uniforms = self.programs[program]['uniforms']
+        return uniforms.setdefault(name, len(uniforms))
+
+    def glUseProgram(self, program):
+        self._record('glUseProgram', (program,))
+        self.program = program
+
+    ###########################################################################
+    # buffers and attributes
+
+    def glBindBuffer(self, target, buffer):
+        self._record('glBindBuffer', (target, buffer))
+        self.bound[target] = buffer
+
+    def glBufferData(self, target, size, data, usage):
+        self._record('glBufferData', (target, size, data, usage))
+        self.stats['upload bytes'] += size
+        buf = np.zeros(size, dtype=np.uint8)
+        if data is not None:
+            buf[:] = np.frombuffer(np.ascontiguousarray(data.array).tobytes()[:size], dtype=np.uint8)
+        self.buffers[self.bound.get(target, 0)] = buf
+
+    def glBufferSubData(self, target, offset, size, data):
+        self._record('glBufferSubData', (target, offset, size, data))
+        self.stats['upload bytes'] += size
+        raw = np.frombuffer(np.ascontiguousarray(data.array).tobytes()[:size], dtype=np.uint8)
+        self.buffers[self.bound.get(target, 0)][offset:offset + size] = raw
+
+    def glVertexAttribPointer(self, index, size, type, normalized, stride, pointer):
+        self._record('glVertexAttribPointer', (index, size, type, normalized, stride, pointer))
+        buffer = self.bound.get(_constants['GL_ARRAY_BUFFER'], 0)
+        self.attribs[index] = (buffer, size, type, stride, getattr(pointer, 'offset', 0))
+
+    def _read_attrib(self, index):
+        buffer, size, type, stride, offset = self.attribs[index]
+        dtype = np.dtype(_dtypes[type])
+        data = self.buffers[buffer][offset:]
+        if stride and stride != size * dtype.itemsize:
+            rows = len(data) // stride
+            data = data[:rows * stride].reshape(rows, stride)[:, :size * dtype.itemsize]
+        data = np.ascontiguousarray(data).reshape(-1)
+        return data[:len(data) // dtype.itemsize * dtype.itemsize].view(dtype).reshape(-1, size)
+
+    ###########################################################################
+    # uniforms
+
+    def _uniform(self, name, location, value):
+        self._record(name, (location,) + tuple(value))
+        self._program()['values'][location] = value
+
+    def glUniform1f(self, location, v0): self._uniform('glUniform1f', location, (v0,))
+    def glUniform2f(self, location, *v): self._uniform('glUniform2f', location, v)
+    def glUniform3f(self, location, *v): self._uniform('glUniform3f', location, v)
+    def glUniform4f(self, location, *v): self._uniform('glUniform4f', location, v)
+
+    def _uniform_array(self, name, size, location, count, value):
+        # uniform arrays are stored as a tuple of count values
+        self._record(name, (location, count, value))
+        values = np.asarray(value.array).reshape(count, size)
+        self._program()['values'][location] = tuple(tuple(v) if size > 1 else v[0] for v in values.tolist())
+
+    def glUniform1fv(self, location, count, value): self._uniform_array('glUniform1fv', 1, location, count, value)
+    def glUniform2fv(self, location, count, value): self._uniform_array('glUniform2fv', 2, location, count, value)
+    def glUniform3fv(self, location, count, value): self._uniform_array('glUniform3fv', 3, location, count, value)
+    def glUniform4fv(self, location, count, value): self._uniform_array('glUniform4fv', 4, location, count, value)
+
+    def get_uniform(self, name, program=None):
+        ''' returns last value assigned to uniform name of program (default: current) '''
+        program = self.programs.get(program or self.program, None)
+        if not program or name not in program['uniforms']:
+            return None
+        return program['values'].get(program['uniforms'][name], None)
+
+    ###########################################################################
+    # drawing
+
+    def glDrawArrays(self, mode, first, count):
+        self._record('glDrawArrays', (mode, first, count))
+        self._draw(mode, np.arange(first, first + count))
+
+    def _element_indices(self, count, type, indices):
+        offset = getattr(indices, 'offset', 0)
+        data = self.buffers.get(self.bound.get(_constants['GL_ELEMENT_ARRAY_BUFFER'], 0), None)
+        dtype = np.dtype(_dtypes[type])
+        if data is None:
+            return np.arange(count)
+        return np.ascontiguousarray(data[offset:offset + count * dtype.itemsize]).view(dtype)
+
+    def glDrawElements(self, mode, count, type, indices):
+        self._record('glDrawElements', (mode, count, type, indices))
+        self._draw(mode, self._element_indices(count, type, indices))
+
+    def glDrawArraysInstanced(self, mode, first, count, primcount):
+        self._record('glDrawArraysInstanced', (mode, first, count, primcount))
+        self._draw(mode, np.arange(first, first + count), instances=primcount)
+
+    def glDrawElementsInstanced(self, mode, count, type, indices, primcount):
+        self._record('glDrawElementsInstanced', (mode, count, type, indices, primcount))
+        self._draw(mode, self._element_indices(count, type, indices), instances=primcount)
+
+    def _draw(self, mode, idx, instances=None):
+        '''
+        counts and rasterizes one draw call.  positions are scaled like the
+        bmesh_render shader does: by uniform vert_scale, or for instanced
+        draws by vert_scales[instance]
+        '''
+        self.stats['draw calls'] += 1
+        self.stats['vertices'] += len(idx) * (instances or 1)
+        if self.image is None or not len(idx):
+            return
+        prim_size = {
+            _constants['GL_POINTS']: 1,
+            _constants['GL_LINES']: 2,
+            _constants['GL_TRIANGLES']: 3,
+        }.get(mode, None)
+        program = self._program()
+        loc = next((program['attribs'][n] for n in ('vert_pos', 'vPos') if n in program['attribs']), None)
+        if prim_size is None or loc not in self.attribs:
+            return
+        coords = self._read_attrib(loc)[idx, :3].astype(np.float64)
+        if coords.shape[1] < 3:     # 2D positions (ex: Batch2D) lie on z=0
+            coords = np.pad(coords, ((0, 0), (0, 3 - coords.shape[1])), 'constant')
+        coords = coords[:len(coords) // prim_size * prim_size]
+        if instances is None:
+            scales = [self.get_uniform('vert_scale') or (1.0, 1.0, 1.0)]
+        else:
+            vert_scales = self.get_uniform('vert_scales') or ()
+            scales = [vert_scales[i] if i < len(vert_scales) else (1.0, 1.0, 1.0) for i in range(instances)]
+        size = {
+            1: self.state.get(('glPointSize',), (1.0,))[0],
+            2: self.state.get(('glLineWidth',), (1.0,))[0],
+        }.get(prim_size, 1.0)
+        color = self.get_uniform('color') or (1.0, 1.0, 1.0, 1.0)
+        w, h = self.raster_size
+        for scale in scales:
+            win, valid = project_to_window(coords * scale, self.raster_mvp, self.raster_size)
+            valid = valid.reshape(-1, prim_size).all(axis=1)
+            ids, self.depth = rasterize_ids(
+                (0, 0, w, h), win.reshape(-1, prim_size, 3)[valid], prim_size,
+                np.ones(int(valid.sum()), dtype=np.int64), size=size,
+                ids_buf=np.zeros((h, w), dtype=np.int64), depth_buf=self.depth,
+            )
+            self.image[ids == 1] = color
+
+
+def install(**kwargs):
+    '''
+    replaces bgl with a StubBGL (see StubBGL for kwargs) and returns it.
+    must be called before importing any module that imports bgl
+    '''
+    stub = StubBGL(**kwargs)
+    sys.modules['bgl'] = stub
+    return stub
+
+
+def benchmark_bmesh_render(resolutions=(16, 64, 256), frames=10, opts=None):
+    '''
+    draws UV spheres of increasing resolution with BMeshRender under the
+    installed stub, and prints draw calls, vertices, state changes, and
+    CPU time per frame.  run in `blender --background` after install()
+    '''
+    import bmesh
+    from .bmesh_render import BMeshRender
+
+    stub = sys.modules['bgl']
+    assert getattr(stub, 'IS_STUB', False), 'install bgl_stub before importing bmesh_render'
+    if opts is None:
+        opts = {
+            'poly color': (1.0, 1.0, 1.0, 0.25), 'line color': (1.0, 1.0, 1.0, 1.0),
+            'point color': (1.0, 1.0, 1.0, 1.0), 'line width': 1.0, 'point size': 4.0,
+            'mirror x': True,
+        }
+
+    results = []
+    for res in resolutions:
+        bme = bmesh.new()
+        bmesh.ops.create_uvsphere(bme, u_segments=res, v_segments=res, diameter=1.0)
+        render = BMeshRender(bme)
+
+        stub.begin_frame()
+        render.draw(opts)
+        build = stub.end_frame()
+
+        stub.begin_frame()
+        for _ in range(frames):
+            render.draw(opts)
+        stats = stub.end_frame(frames)
+        stats['faces'] = len(bme.faces)
+        stats['build time'] = build['time']
+        assert stats.get('draw calls', 0) > 0, 'BMeshRender.draw did not draw anything'
+        results.append(stats)
+        print('%7d faces: build %7.2fms, frame %7.2fms, %4d calls, %3d draws, %8d verts, %3d state (%d redundant)' % (
+            stats['faces'], stats['build time'] * 1000, stats['time'] * 1000,
+            stats['calls'], stats.get('draw calls', 0), stats.get('vertices', 0),
+            stats.get('state changes', 0), stats.get('redundant state changes', 0),
+        ))
+        del render
+        bme.free()
+    return results
@@ -39,6 +39,8 @@ import traceback
 
 import bmesh
 import bgl
+import gpu
+import numpy as np
 import bpy
 from bpy_extras.view3d_utils import (
     location_3d_to_region_2d, region_2d_to_vector_3d
@@ -50,11 +52,16 @@ from mathutils import Vector, Matrix, Quaternion
 from mathutils.bvhtree import BVHTree
 
 from .debug import dprint
-from .shaders import Shader, buf_zero
+from .shaders import Shader, ShaderVariants, buf_zero
 from .utils import shorten_floats
-from .maths import Point, Direction, Frame, XForm
+from .maths import Point, Direction, Frame, XForm, BBox
 from .maths import invert_matrix, matrix_normal
 from .profiler import profiler
+from .drawing import Drawing
+from .bmesh_utils import BMeshTriangulationCache, get_select_bytes
+from .kernels import index_runs, grid_partition, cluster_decimate, aabbs_view_bounds
+from .kernels import project_to_window, rasterize_ids, nearest_id
+from ..ext.bgl_ext import np_array_as_bgl_Buffer, VoidBufValue
 
 
 
@@ -71,16 +78,28 @@ dprint('GLSL Version: ' + bgl.glGetString(bgl.GL_SHADING_LANGUAGE_VERSION))
 
 def setupBMeshShader(shader):
     ctx = bpy.context
+    if not ctx.area or not ctx.space_data: return     # background mode (ex: bgl_stub)
     area, spc, r3d = ctx.area, ctx.space_data, ctx.space_data.region_3d
-    shader.assign('perspective', 1.0 if r3d.view_perspective !=
+    glstate.uniform(shader, 'perspective', 1.0 if r3d.view_perspective !=
                   'ORTHO' else 0.0)
-    shader.assign('clip_start', spc.clip_start)
-    shader.assign('clip_end', spc.clip_end)
-    shader.assign('view_distance', r3d.view_distance)
-    shader.assign('vert_scale', Vector((1, 1, 1)))
-    shader.assign('screen_size', Vector((area.width, area.height)))
+    glstate.uniform(shader, 'clip_start', spc.clip_start)
+    glstate.uniform(shader, 'clip_end', spc.clip_end)
+    glstate.uniform(shader, 'view_distance', r3d.view_distance)
+    glstate.uniform(shader, 'vert_scale', Vector((1, 1, 1)))
+    glstate.uniform(shader, 'use_instancing', 0.0)
+    glstate.uniform(shader, 'screen_size', Vector((area.width, area.height)))
 
-bmeshShader = Shader.load_from_file('bmeshShader', 'bmesh_render.glsl', funcStart=setupBMeshShader)
+bmeshShader = ShaderVariants('bmeshShader', 'bmesh_render.glsl', funcStart=setupBMeshShader, deferUniforms=True)
+pickShader = Shader.load_from_file('pickShader', 'bmesh_pick.glsl')
+
+
+def get_bmeshShader_defines(opts):
+    ''' returns compile-time features of the bmeshShader variant for drawing with opts '''
+    defines = {'CULL_BACKFACES': 'true' if opts.get('cull backfaces', False) else 'false'}
+    r3d = getattr(bpy.context.space_data, 'region_3d', None)
+    if r3d:
+        defines['PERSPECTIVE'] = 'false' if r3d.view_perspective == 'ORTHO' else 'true'
+    return defines
 
 
 def glCheckError(title):
@@ -110,22 +129,97 @@ def glColor(color):
         bgl.glColor4f(*color)
 
 
+class GLState:
+    '''
+    remembers GL state set through bmesh_render, and skips calls that
+    would not change anything.
+
+    other code (Blender, ui drawing) changes GL state without telling us,
+    so GL state is forgotten by reset, which the drawing entry points call
+    before each batch of draws.  uniforms belong to the shader program and
+    are remembered by the Shader itself (see Shader.assign).
+
+    start_recording / stop_recording count changes and skipped calls (for
+    example, per frame); the counts also go to the profiler counters.
+    '''
+
+    def __init__(self):
+        self.state = {}
+        self.recording = None
+
+    def reset(self):
+        ''' forget GL state '''
+        self.state.clear()
+
+    def start_recording(self):
+        self.recording = {'changes': 0, 'skipped': 0}
+
+    def stop_recording(self):
+        ''' returns dict with number of state changes and skipped calls since start_recording '''
+        recording, self.recording = self.recording, None
+        return recording
+
+    def _record(self, changed):
+        if changed:
+            profiler.count('GLState changes')
+        else:
+            profiler.count('GLState skipped')
+        if self.recording is not None:
+            self.recording['changes' if changed else 'skipped'] += 1
+
+    def _set(self, cache, key, value, fn, *args):
+        value = Shader.freeze_value(value)
+        changed = cache.get(key, None) != value
+        if changed:
+            fn(*args)
+            cache[key] = value
+        self._record(changed)
+
+    def enable(self, cap, enabled=True):
+        fn = bgl.glEnable if enabled else bgl.glDisable
+        self._set(self.state, ('enable', cap), bool(enabled), fn, cap)
+
+    def disable(self, cap):
+        self.enable(cap, enabled=False)
+
+    def hint(self, target, mode):
+        self._set(self.state, ('hint', target), mode, bgl.glHint, target, mode)
+
+    def line_width(self, width):
+        self._set(self.state, 'line width', width, bgl.glLineWidth, width)
+
+    def point_size(self, size):
+        self._set(self.state, 'point size', size, bgl.glPointSize, size)
+
+    def depth_range(self, near, far):
+        self._set(self.state, 'depth range', (near, far), bgl.glDepthRange, near, far)
+
+    def line_stipple(self, factor, pattern):
+        self._set(self.state, 'line stipple', (factor, pattern), bgl.glLineStipple, factor, pattern)
+
+    def uniform(self, shader, name, value):
+        self._record(shader.assign(name, value))
+
+
+glstate = GLState()
+
+
 def glSetDefaultOptions(opts=None):
-    bgl.glEnable(bgl.GL_MULTISAMPLE)
-    bgl.glEnable(bgl.GL_BLEND)
-    bgl.glDisable(bgl.GL_LIGHTING)
-    bgl.glEnable(bgl.GL_DEPTH_TEST)
-    bgl.glEnable(bgl.GL_POINT_SMOOTH)
-    bgl.glEnable(bgl.GL_LINE_SMOOTH)
-    bgl.glHint(bgl.GL_LINE_SMOOTH_HINT, bgl.GL_NICEST)
+    glstate.enable(bgl.GL_MULTISAMPLE)
+    glstate.enable(bgl.GL_BLEND)
+    glstate.disable(bgl.GL_LIGHTING)
+    glstate.enable(bgl.GL_DEPTH_TEST)
+    glstate.enable(bgl.GL_POINT_SMOOTH)
+    glstate.enable(bgl.GL_LINE_SMOOTH)
+    glstate.hint(bgl.GL_LINE_SMOOTH_HINT, bgl.GL_NICEST)
 
 
 def glEnableStipple(enable=True):
     if enable:
-        bgl.glLineStipple(4, 0x5555)
-        bgl.glEnable(bgl.GL_LINE_STIPPLE)
+        glstate.line_stipple(4, 0x5555)
+        glstate.enable(bgl.GL_LINE_STIPPLE)
     else:
-        bgl.glDisable(bgl.GL_LINE_STIPPLE)
+        glstate.disable(bgl.GL_LINE_STIPPLE)
 
 
 # def glEnableBackfaceCulling(enable=True):
@@ -148,17 +242,30 @@ def glSetOptions(prefix, opts):
         if opt in opts:
             cb(opts[opt])
     dpi_mult = opts.get('dpi mult', 1.0)
-    set_if_set('offset', lambda v: bmeshShader.assign('offset', v))
-    set_if_set('dotoffset', lambda v: bmeshShader.assign('dotoffset', v))
-    set_if_set('color', lambda v: bmeshShader.assign('color', v))
+    set_if_set('offset', lambda v: glstate.uniform(bmeshShader, 'offset', v))
+    set_if_set('dotoffset', lambda v: glstate.uniform(bmeshShader, 'dotoffset', v))
+    set_if_set('color', lambda v: glstate.uniform(bmeshShader, 'color', v))
     set_if_set('color selected',
-               lambda v: bmeshShader.assign('color_selected', v))
-    set_if_set('hidden', lambda v: bmeshShader.assign('hidden', v))
-    set_if_set('width', lambda v: bgl.glLineWidth(v*dpi_mult))
-    set_if_set('size', lambda v: bgl.glPointSize(v*dpi_mult))
+               lambda v: glstate.uniform(bmeshShader, 'color_selected', v))
+    set_if_set('hidden', lambda v: glstate.uniform(bmeshShader, 'hidden', v))
+    set_if_set('width', lambda v: glstate.line_width(v*dpi_mult))
+    set_if_set('size', lambda v: glstate.point_size(v*dpi_mult))
     set_if_set('stipple', lambda v: glEnableStipple(v))
 
 
+def get_mirror_scales(mx, my, mz):
+    ''' returns list of vert_scales for each mirrored copy, in draw order '''
+    scales = []
+    if mx: scales.append((-1,  1,  1))
+    if my: scales.append(( 1, -1,  1))
+    if mz: scales.append(( 1,  1, -1))
+    if mx and my: scales.append((-1, -1,  1))
+    if mx and mz: scales.append((-1,  1, -1))
+    if my and mz: scales.append(( 1, -1, -1))
+    if mx and my and mz: scales.append((-1, -1, -1))
+    return scales
+
+
 def glSetMirror(symmetry=None, view=None, effect=0.0, frame: Frame=None):
     mirroring = (0, 0, 0)
     if symmetry and frame:
@@ -166,19 +273,23 @@ def glSetMirror(symmetry=None, view=None, effect=0.0, frame: Frame=None):
         my = 1.0 if 'y' in symmetry else 0.0
         mz = 1.0 if 'z' in symmetry else 0.0
         mirroring = (mx, my, mz)
-        bmeshShader.assign('mirror_o', frame.o)
-        bmeshShader.assign('mirror_x', frame.x)
-        bmeshShader.assign('mirror_y', frame.y)
-        bmeshShader.assign('mirror_z', frame.z)
-    bmeshShader.assign('mirror_view', {'Edge': 1, 'Face': 2}.get(view, 0))
-    bmeshShader.assign('mirror_effect', effect)
-    bmeshShader.assign('mirroring', mirroring)
+        glstate.uniform(bmeshShader, 'mirror_o', frame.o)
+        glstate.uniform(bmeshShader, 'mirror_x', frame.x)
+        glstate.uniform(bmeshShader, 'mirror_y', frame.y)
+        glstate.uniform(bmeshShader, 'mirror_z', frame.z)
+    glstate.uniform(bmeshShader, 'mirror_view', {'Edge': 1, 'Face': 2}.get(view, 0))
+    glstate.uniform(bmeshShader, 'mirror_effect', effect)
+    glstate.uniform(bmeshShader, 'mirroring', mirroring)
 
 
 def glDrawBMFace(bmf, opts=None, enableShader=True):
     glDrawBMFaces([bmf], opts=opts, enableShader=enableShader)
 
 
+# used by glDrawBMFaces when opts does not provide a 'triangulation cache'
+default_triangulation_cache = BMeshTriangulationCache()
+
+
 def triangulateFace(verts):
     l = len(verts)
     if l < 3: return
@@ -197,143 +308,158 @@ def triangulateFace(verts):
         yield (v0, v1, v2)
 
 
+def vertex_dict_getter(vdict):
+    '''
+    returns function mapping a BMVert to its (co, normal) through vdict (the
+    'vertex dict' option), which lets callers override vertex positions and
+    normals.  BMVerts missing from vdict are added with their own values
+    '''
+    def get(bmv):
+        v = vdict.get(bmv, None)
+        if v is None:
+            v = vdict[bmv] = (bmv.co, bmv.normal)
+        return v
+    return get
+
+
 @profiler.profile
-def glDrawBMFaces(lbmf, opts=None, enableShader=True):
-    opts_ = opts or {}
-    nosel = opts_.get('no selection', False)
-    mx = opts_.get('mirror x', False)
-    my = opts_.get('mirror y', False)
-    mz = opts_.get('mirror z', False)
-    dn = opts_.get('normal', 0.0)
-    vdict = opts_.get('vertex dict', {})
+def bmfaces_to_arrays(lbmf, tricache=None, triangles_only=False, keys=None, elem_indices=None, vdict=None):
+    '''
+    builds flat per-vertex position, normal, and selection lists for
+    triangles of lbmf in a single pass.  flat-shaded faces use face normal.
+    if keys is a list, the BMVert of each buffered vertex is appended to it.
+    if elem_indices is a list, the index into lbmf of each buffered vertex
+    is appended to it.  if vdict is given, vertex positions and normals
+    come from it (see vertex_dict_getter)
+    '''
+    if triangles_only:
+        triangulate = lambda bmf: (bmf.verts,)
+    else:
+        triangulate = (tricache or default_triangulation_cache).iter_triangles
+    get = vertex_dict_getter(vdict) if vdict is not None else None
+    pos, norm, sel = [], [], []
+    pos_append, norm_append = pos.append, norm.append
+    for i, bmf in enumerate(lbmf):
+        s = 1.0 if bmf.select else 0.0
+        smooth, fn = bmf.smooth, bmf.normal
+        for tri in triangulate(bmf):
+            for bmv in tri:
+                c, n = get(bmv) if get else (bmv.co, bmv.normal)
+                pos_append(c)
+                norm_append(n if smooth else fn)
+            sel += (s, s, s)
+            if keys is not None: keys += tri
+            if elem_indices is not None: elem_indices += (i, i, i)
+    return pos, norm, sel
 
-    bmeshShader.assign('focus_mult', opts_.get('focus mult', 1.0))
-    bmeshShader.assign('use_selection', 0.0 if nosel else 1.0)
 
-    @profiler.profile
-    def render_general(sx, sy, sz):
-        bmeshShader.assign('vert_scale', (sx, sy, sz))
-        bmeshShader.assign('selected', 0.0)
-        for bmf in lbmf:
-            bmeshShader.assign('selected', 1.0 if bmf.select else 0.0)
-            if bmf.smooth:
-                for v0, v1, v2 in triangulateFace(bmf.verts):
-                    if v0 not in vdict:
-                        vdict[v0] = (v0.co, v0.normal)
-                    if v1 not in vdict:
-                        vdict[v1] = (v1.co, v1.normal)
-                    if v2 not in vdict:
-                        vdict[v2] = (v2.co, v2.normal)
-                    (c0, n0), (c1, n1), (c2,
-                                         n2) = vdict[v0], vdict[v1], vdict[v2]
-                    bmeshShader.assign('vert_norm', n0)
-                    bmeshShader.assign('vert_pos',  c0)
-                    bmeshShader.assign('vert_norm', n1)
-                    bmeshShader.assign('vert_pos',  c1)
-                    bmeshShader.assign('vert_norm', n2)
-                    bmeshShader.assign('vert_pos',  c2)
-            else:
-                bgl.glNormal3f(*bmf.normal)
-                bmeshShader.assign('vert_norm', bmf.normal)
-                for v0, v1, v2 in triangulateFace(bmf.verts):
-                    if v0 not in vdict:
-                        vdict[v0] = (v0.co, v0.normal)
-                    if v1 not in vdict:
-                        vdict[v1] = (v1.co, v1.normal)
-                    if v2 not in vdict:
-                        vdict[v2] = (v2.co, v2.normal)
-                    (c0, n0), (c1, n1), (c2,
-                                         n2) = vdict[v0], vdict[v1], vdict[v2]
-                    bmeshShader.assign('vert_pos', c0)
-                    bmeshShader.assign('vert_pos', c1)
-                    bmeshShader.assign('vert_pos', c2)
+@profiler.profile
+def bmedges_to_arrays(lbme, dn=0.0, keys=None, elem_indices=None, vdict=None):
+    ''' builds flat position, normal, and selection lists for lines of lbme '''
+    get = vertex_dict_getter(vdict) if vdict is not None else None
+    pos, norm, sel = [], [], []
+    pos_append, norm_append = pos.append, norm.append
+    for i, bme in enumerate(lbme):
+        s = 1.0 if bme.select else 0.0
+        for bmv in bme.verts:
+            c, n = get(bmv) if get else (bmv.co, bmv.normal)
+            pos_append(c + n * dn if dn else c)
+            norm_append(n)
+        sel += (s, s)
+        if keys is not None: keys += bme.verts
+        if elem_indices is not None: elem_indices += (i, i)
+    return pos, norm, sel
 
-    @profiler.profile
-    def render_triangles(sx, sy, sz):
-        # optimized for triangle-only meshes
-        # (source meshes that have been triangulated)
-        bmeshShader.assign('vert_scale', (sx, sy, sz))
-        bmeshShader.assign('selected', 0.0)
-        for bmf in lbmf:
-            bmeshShader.assign('selected', 1.0 if bmf.select else 0.0)
-            if bmf.smooth:
-                v0, v1, v2 = bmf.verts
-                if v0 not in vdict:
-                    vdict[v0] = (v0.co, v0.normal)
-                if v1 not in vdict:
-                    vdict[v1] = (v1.co, v1.normal)
-                if v2 not in vdict:
-                    vdict[v2] = (v2.co, v2.normal)
-                (c0, n0), (c1, n1), (c2, n2) = vdict[v0], vdict[v1], vdict[v2]
-                bmeshShader.assign('vert_norm', n0)
-                bmeshShader.assign('vert_pos',  c0)
-                # bgl.glNormal3f(*n0)
-                # bgl.glVertex3f(*c0)
-                bmeshShader.assign('vert_norm', n1)
-                bmeshShader.assign('vert_pos',  c1)
-                # bgl.glNormal3f(*n1)
-                # bgl.glVertex3f(*c1)
-                bmeshShader.assign('vert_norm', n2)
-                bmeshShader.assign('vert_pos',  c2)
-                # bgl.glNormal3f(*n2)
-                # bgl.glVertex3f(*c2)
-            else:
-                bgl.glNormal3f(*bmf.normal)
-                v0, v1, v2 = bmf.verts
-                if v0 not in vdict:
-                    vdict[v0] = (v0.co, v0.normal)
-                if v1 not in vdict:
-                    vdict[v1] = (v1.co, v1.normal)
-                if v2 not in vdict:
-                    vdict[v2] = (v2.co, v2.normal)
-                (c0, n0), (c1, n1), (c2, n2) = vdict[v0], vdict[v1], vdict[v2]
-                bmeshShader.assign('vert_pos',  c0)
-                # bgl.glVertex3f(*c0)
-                bmeshShader.assign('vert_pos',  c1)
-                # bgl.glVertex3f(*c1)
-                bmeshShader.assign('vert_pos',  c2)
-                # bgl.glVertex3f(*c2)
-
-    render = render_triangles if opts_.get(
-        'triangles only', False) else render_general
 
-    if enableShader:
-        bmeshShader.enable()
+@profiler.profile
+def bmverts_to_arrays(lbmv, dn=0.0, vdict=None):
+    ''' builds flat position, normal, and selection lists for points of lbmv '''
+    get = vertex_dict_getter(vdict) if vdict is not None else None
+    pos, norm, sel = [], [], []
+    pos_append, norm_append, sel_append = pos.append, norm.append, sel.append
+    for bmv in lbmv:
+        c, n = get(bmv) if get else (bmv.co, bmv.normal)
+        pos_append(c + n * dn if dn else c)
+        norm_append(n)
+        sel_append(1.0 if bmv.select else 0.0)
+    return pos, norm, sel
 
-    glSetOptions('poly', opts)
-    bgl.glBegin(bgl.GL_TRIANGLES)
-    render(1, 1, 1)
-    bgl.glEnd()
-    bgl.glDisable(bgl.GL_LINE_STIPPLE)
-
-    if mx or my or mz:
-        glSetOptions('poly mirror', opts)
-        bgl.glBegin(bgl.GL_TRIANGLES)
-        if mx:
-            render(-1,  1,  1)
-        if my:
-            render(1, -1,  1)
-        if mz:
-            render(1,  1, -1)
-        if mx and my:
-            render(-1, -1,  1)
-        if mx and mz:
-            render(-1,  1, -1)
-        if my and mz:
-            render(1, -1, -1)
-        if mx and my and mz:
-            render(-1, -1, -1)
-        bgl.glEnd()
-        bgl.glDisable(bgl.GL_LINE_STIPPLE)
 
+@profiler.profile
+def simplefaces_to_arrays(lsf):
+    ''' builds flat position, normal, and selection lists for simple faces (lists of (co,norm)) '''
+    pos, norm = [], []
+    for sf in lsf:
+        for tri in triangulateFace(sf):
+            for c, n in tri:
+                pos.append(c)
+                norm.append(n)
+    return pos, norm, [0.0] * len(pos)
+
+
+def glDrawBuffered(gltype, pos, norm, sel, opts=None, enableShader=True):
+    '''
+    uploads the given arrays to the shared BGLBufferedRender for gltype
+    and draws them (including mirrored copies) with a single draw call each.
+    the shared render's GL buffers are only reallocated when the number of
+    vertices changes
+    '''
+    glstate.reset()
+    render = get_immediate_render(gltype)
+    render.buffer(pos, norm, sel, None)
+    if enableShader:
+        bmeshShader.select(get_bmeshShader_defines(opts or {}))
+        bmeshShader.enable()
+    render.draw(opts or {})
+    glstate.disable(bgl.GL_LINE_STIPPLE)
     if enableShader:
         bmeshShader.disable()
 
 
+@profiler.profile
+def glDrawBMFaces(lbmf, opts=None, enableShader=True):
+    opts_ = opts or {}
+    pos, norm, sel = bmfaces_to_arrays(
+        lbmf,
+        tricache=opts_.get('triangulation cache', None),
+        triangles_only=opts_.get('triangles only', False),
+        vdict=opts_.get('vertex dict', None),
+    )
+    glDrawBuffered(bgl.GL_TRIANGLES, pos, norm, sel, opts=opts_, enableShader=enableShader)
+
+
+def as_float32_array(values):
+    '''
+    returns values as a C-contiguous float32 array.
+    arrays that already are C-contiguous float32 are returned without copying
+    '''
+    return np.ascontiguousarray(values, dtype=np.float32)
+
+
 class BGLBufferedRender:
     DEBUG_PRINT = False
     DEBUG_CHKERR = False
 
+    # draw all mirrored copies with a single instanced draw call, where supported
+    USE_INSTANCING = True
+    has_instancing = hasattr(bgl, 'glDrawArraysInstanced') and hasattr(bgl, 'glDrawElementsInstanced')
+
+    # dirty runs separated by at most this many clean vertices are merged
+    # into a single glBufferSubData call (fewer calls for a few extra bytes)
+    DIRTY_MERGE_GAP = 8
+    # if more runs than this are dirty, upload one span covering all of them
+    DIRTY_MAX_RUNS = 64
+
+    # number of components per vertex, and type, of each attribute buffer.
+    # selection is one byte per vertex, so it can be refreshed cheaply
+    ATTRIB_DIMS = {'pos': 3, 'norm': 3, 'sel': 1}
+    ATTRIB_DTYPES = {'pos': np.float32, 'norm': np.float32, 'sel': np.uint8}
+
+    # chunks drawn smaller than this (in pixels) use their decimated indices
+    LOD_PIXELS = 32
+    # grid resolution (per axis, per chunk) of the decimated indices
+    LOD_RESOLUTION = 8
+
     def __init__(self, gltype):
         self.count = 0
         self.gltype = gltype
@@ -353,64 +479,109 @@ class BGLBufferedRender:
         self.vbo_norm = self.vbos[1]
         self.vbo_sel = self.vbos[2]
         self.vbo_idx = self.vbos[3]
+        self.attrib_vbos = {
+            'pos': self.vbo_pos,
+            'norm': self.vbo_norm,
+            'sel': self.vbo_sel,
+        }
 
         self.render_indices = False
 
+        # CPU-side copies of the uploaded attributes, so that small edits can
+        # be written in place and only the changed ranges re-uploaded
+        self.arrays = {}
+        self.dirty_offsets = {attr: [] for attr in self.ATTRIB_DIMS}
+        # (size in bytes, usage) of each GL buffer's storage, so buffering
+        # arrays of the same size overwrites the storage instead of
+        # reallocating it (see _buffer_data)
+        self.allocated = {}
+        # key (ex: BMVert) => offsets of buffered vertices generated from key
+        self.key_offsets = {}
+        # index of source element (ex: BMFace) of each buffered vertex
+        self.elem_indices = None
+
+        # spatial chunks (see buffer), and pointers into the element buffer
+        # for each chunk's decimated indices
+        self.chunks = None
+        self.lod_ptrs = {}
+
     def __del__(self):
         bgl.glDeleteBuffers(4, self.vbos)
         del self.vbos
 
     @profiler.profile
-    def buffer(self, pos, norm, sel, idx):
-        sizeOfFloat, sizeOfInt = 4, 4
+    def buffer(self, pos, norm, sel, idx, keys=None, chunk_size=None, elem_indices=None):
+        '''
+        uploads all attributes, replacing what was buffered before.
+        pos, norm, sel, idx can be lists or NumPy arrays.  C-contiguous
+        float32 (int32 for idx) arrays of the right shape are used as-is,
+        without copying; note that update_* will then write into them.
+        keys (optional) gives a key per vertex (ex: the BMVert each position
+        came from), which update_key uses to find the vertices to update.
+        elem_indices (optional) gives the index of the source element of
+        each vertex, which update_element_selection uses.
+        if chunk_size is given (and idx is not), primitives are reordered
+        into spatial chunks of about chunk_size primitives, so that draw can
+        cull chunks against the view and draw small chunks decimated.
+        '''
         self.count = 0
         count = len(pos)
         counts = list(map(len, [pos, norm, sel]))
 
+        has_idx = idx is not None and len(idx) > 0
         goodcounts = all(c == count for c in counts)
         assert goodcounts, ('All arrays must contain '
                             'the same number of elements %s' % str(counts))
+        assert keys is None or len(keys) == count, (
+            'keys must contain a key for each element')
+
+        self.arrays = {}
+        self.key_offsets = {}
+        self.elem_indices = None
+        self.chunks = None
+        self.lod_ptrs = {}
+        for dirty in self.dirty_offsets.values():
+            dirty.clear()
 
         if count == 0:
             return
 
         try:
-            buf_pos = bgl.Buffer(bgl.GL_FLOAT, [count, 3], pos)
-            buf_norm = bgl.Buffer(bgl.GL_FLOAT, [count, 3], norm)
-            buf_sel = bgl.Buffer(bgl.GL_FLOAT, count, sel)
-            if idx:
+            self.arrays = {
+                'pos': as_float32_array(pos).reshape(count, 3),
+                'norm': as_float32_array(norm).reshape(count, 3),
+                'sel': np.ascontiguousarray(sel, dtype=np.uint8).reshape(count),
+            }
+            if elem_indices is not None:
+                self.elem_indices = np.asarray(elem_indices, dtype=np.int64).reshape(count)
+            if has_idx:
                 # WHY NO GL_UNSIGNED_INT?????
-                buf_idx = bgl.Buffer(bgl.GL_INT, count, idx)
+                idx = np.ascontiguousarray(idx, dtype=np.int32)
+            elif chunk_size and count > chunk_size * self.gl_count:
+                # idx holds the decimated indices of all chunks
+                keys, idx = self._build_chunks(chunk_size, keys)
             if self.DEBUG_PRINT:
-                print('buf_pos  = ' + shorten_floats(str(buf_pos)))
-                print('buf_norm = ' + shorten_floats(str(buf_norm)))
+                print('buf_pos  = ' + shorten_floats(str(self.arrays['pos'])))
+                print('buf_norm = ' + shorten_floats(str(self.arrays['norm'])))
         except Exception as e:
             print(
                 'ERROR (buffer): caught exception while '
                 'buffering to Buffer ' + str(e))
             raise e
+
+        # vertices with keys are expected to be edited, so hint to GL
+        usage = bgl.GL_STATIC_DRAW if keys is None else bgl.GL_DYNAMIC_DRAW
         try:
-            bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, self.vbo_pos)
-            bgl.glBufferData(bgl.GL_ARRAY_BUFFER, count * 3 *
-                             sizeOfFloat, buf_pos,
-                             bgl.GL_STATIC_DRAW)
-            self._check_error('buffer: vbo_pos')
-            bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, self.vbo_norm)
-            bgl.glBufferData(bgl.GL_ARRAY_BUFFER, count * 3 *
-                             sizeOfFloat, buf_norm,
-                             bgl.GL_STATIC_DRAW)
-            self._check_error('buffer: vbo_norm')
-            bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, self.vbo_sel)
-            bgl.glBufferData(bgl.GL_ARRAY_BUFFER, count * 1 *
-                             sizeOfFloat, buf_sel,
-                             bgl.GL_STATIC_DRAW)
-            self._check_error('buffer: vbo_sel')
-            if idx:
+            for attr in self.ATTRIB_DIMS:
+                self._upload(attr, usage=usage)
+            if has_idx or self.chunks:
+                buf_idx = np_array_as_bgl_Buffer(idx)
                 bgl.glBindBuffer(bgl.GL_ELEMENT_ARRAY_BUFFER, self.vbo_idx)
-                bgl.glBufferData(bgl.GL_ELEMENT_ARRAY_BUFFER,
-                                 count * sizeOfInt, buf_idx,
-                                 bgl.GL_STATIC_DRAW)
+                self._buffer_data('idx', bgl.GL_ELEMENT_ARRAY_BUFFER,
+                                  idx.nbytes, buf_idx, bgl.GL_STATIC_DRAW)
                 self._check_error('buffer: vbo_idx')
+                profiler.count('BGLBufferedRender upload bytes', idx.nbytes)
+                del buf_idx
         except Exception as e:
             print(
                 'ERROR (buffer): caught exception while '
@@ -419,17 +590,234 @@ class BGLBufferedRender:
         finally:
             bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, 0)
             bgl.glBindBuffer(bgl.GL_ELEMENT_ARRAY_BUFFER, 0)
-        del buf_pos, buf_norm, buf_sel
-        if idx:
-            del buf_idx
 
-        if idx:
+        if keys is not None:
+            key_offsets = self.key_offsets
+            for i, key in enumerate(keys):
+                if key in key_offsets:
+                    key_offsets[key].append(i)
+                else:
+                    key_offsets[key] = [i]
+
+        if has_idx:
             self.count = len(idx)
             self.render_indices = True
         else:
             self.count = len(pos)
             self.render_indices = False
 
+    @profiler.profile
+    def _build_chunks(self, chunk_size, keys):
+        '''
+        reorders the buffered primitives into spatial chunks, and computes
+        each chunk's bounds and decimated indices.
+        returns the reordered keys and the decimated indices of all chunks
+        '''
+        n = self.gl_count
+        centers = self.arrays['pos'].reshape(-1, n, 3).mean(axis=1)
+        order, starts, ends = grid_partition(centers, chunk_size)
+        vorder = (order[:, None] * n + np.arange(n)).ravel()
+        self.arrays = {attr: array[vorder] for (attr, array) in self.arrays.items()}
+        if self.elem_indices is not None:
+            self.elem_indices = self.elem_indices[vorder]
+        if keys is not None:
+            keys = [keys[i] for i in vorder.tolist()]
+
+        pos = self.arrays['pos']
+        lod_idx, lod_starts, lod_ends = cluster_decimate(
+            pos, n, starts, ends, resolution=self.LOD_RESOLUTION
+        )
+        vstarts = starts * n
+        self.chunks = {
+            'starts': vstarts,
+            'ends': ends * n,
+            'mins': np.minimum.reduceat(pos, vstarts),
+            'maxs': np.maximum.reduceat(pos, vstarts),
+            'lod starts': lod_starts,
+            'lod ends': lod_ends,
+        }
+        return keys, np.ascontiguousarray(lod_idx, dtype=np.int32)
+
+    def get_chunk_bboxes(self):
+        ''' returns BBox of each chunk (empty if not chunked) '''
+        if not self.chunks:
+            return []
+        mins, maxs = self.chunks['mins'].tolist(), self.chunks['maxs'].tolist()
+        return [BBox(from_coords=[mn, mx]) for (mn, mx) in zip(mins, maxs)]
+
+    def _get_lod_ptr(self, offset):
+        # element buffer "pointer" (byte offset) to decimated indices
+        if offset not in self.lod_ptrs:
+            self.lod_ptrs[offset] = VoidBufValue(offset * 4)
+        return self.lod_ptrs[offset].buf
+
+    @profiler.profile
+    def _get_draw_ranges(self, scales, mvp=None, viewport=None, lod_pixels=None):
+        '''
+        returns list of (first, count, indices) to draw, where indices is
+        None for glDrawArrays or a pointer into the element buffer for
+        glDrawElements.  if chunked and mvp is given, chunks outside the
+        view (for all scales) are culled, and chunks smaller than
+        lod_pixels on screen are drawn with their decimated indices.
+        '''
+        if self.render_indices:
+            return [(0, self.count, buf_zero)]
+        if not self.chunks or mvp is None:
+            return [(0, self.count, None)]
+
+        chunks = self.chunks
+        mins, maxs = chunks['mins'], chunks['maxs']
+        visible, pixels = False, 0.0
+        for scale in scales:
+            scale = np.array(scale, dtype=np.float32)
+            smins, smaxs = mins * scale, maxs * scale
+            vis, pix = aabbs_view_bounds(
+                np.minimum(smins, smaxs), np.maximum(smins, smaxs),
+                mvp, viewport,
+            )
+            visible = visible | vis
+            pixels = np.maximum(pixels, np.where(vis, pix, 0.0))
+        if lod_pixels is None:
+            lod_pixels = self.LOD_PIXELS
+        lod = visible & (pixels < lod_pixels)
+
+        nvisible, nlod = int(visible.sum()), int(lod.sum())
+        profiler.count('BGLBufferedRender chunks drawn', nvisible - nlod)
+        profiler.count('BGLBufferedRender chunks decimated', nlod)
+        profiler.count('BGLBufferedRender chunks culled', len(visible) - nvisible)
+
+        starts, ends = chunks['starts'].tolist(), chunks['ends'].tolist()
+        lod_starts, lod_ends = chunks['lod starts'].tolist(), chunks['lod ends'].tolist()
+        lod = lod.tolist()
+        ranges = []
+        for i in np.flatnonzero(visible).tolist():
+            if lod[i]:
+                if lod_ends[i] > lod_starts[i]:
+                    ptr = self._get_lod_ptr(lod_starts[i])
+                    ranges.append((0, lod_ends[i] - lod_starts[i], ptr))
+                continue
+            # merge with previous range if consecutive in vertex buffer
+            if ranges and ranges[-1][2] is None and sum(ranges[-1][:2]) == starts[i]:
+                ranges[-1] = (ranges[-1][0], ends[i] - ranges[-1][0], None)
+            else:
+                ranges.append((starts[i], ends[i] - starts[i], None))
+        return ranges
+
+    def _buffer_data(self, name, target, nbytes, buf, usage):
+        '''
+        uploads all of buf to the GL buffer bound to target.  the storage
+        is only (re)allocated with glBufferData if its size or usage
+        changed; otherwise it is overwritten with glBufferSubData
+        '''
+        if self.allocated.get(name, None) == (nbytes, usage):
+            bgl.glBufferSubData(target, 0, nbytes, buf)
+        else:
+            bgl.glBufferData(target, nbytes, buf, usage)
+            self.allocated[name] = (nbytes, usage)
+
+    def _upload(self, attr, start=None, end=None, usage=bgl.GL_STATIC_DRAW):
+        '''
+        uploads the CPU-side copy of attr to its vbo.  if start is None, the
+        whole buffer is written (see _buffer_data); otherwise only vertices
+        [start, end) are written with glBufferSubData.
+        '''
+        array = self.arrays[attr]
+        if start is not None:
+            # rows of a C-contiguous array are contiguous, so no copy here
+            array = array[start:end]
+        # buf wraps array's memory; buf holds a reference to array, and GL
+        # copies the data before returning, so buf can be freed right after
+        buf = np_array_as_bgl_Buffer(array)
+        nbytes = array.nbytes
+        bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, self.attrib_vbos[attr])
+        if start is None:
+            self._buffer_data(attr, bgl.GL_ARRAY_BUFFER, nbytes, buf, usage)
+        else:
+            offset = start * self.arrays[attr].strides[0]
+            bgl.glBufferSubData(bgl.GL_ARRAY_BUFFER, offset, nbytes, buf)
+        self._check_error('_upload: vbo_%s' % attr)
+        profiler.count('BGLBufferedRender upload bytes', nbytes)
+        del buf
+
+    def update_offsets(self, offsets, pos=None, norm=None, sel=None):
+        '''
+        writes new attribute values for the buffered vertices at offsets.
+        values are either one value for all offsets or one per offset.
+        changes are uploaded by flush (called automatically by draw).
+        '''
+        if not self.arrays or len(offsets) == 0:
+            return
+        for attr, values in (('pos', pos), ('norm', norm), ('sel', sel)):
+            if values is None:
+                continue
+            self.arrays[attr][offsets] = np.asarray(values, dtype=self.ATTRIB_DTYPES[attr])
+            self.dirty_offsets[attr].append(np.asarray(offsets, dtype=np.int64))
+        if pos is not None and self.chunks:
+            # grow bounds of chunks containing the moved vertices
+            offsets = np.asarray(offsets, dtype=np.int64)
+            ichunks = np.searchsorted(self.chunks['starts'], offsets, side='right') - 1
+            moved = self.arrays['pos'][offsets]
+            np.minimum.at(self.chunks['mins'], ichunks, moved)
+            np.maximum.at(self.chunks['maxs'], ichunks, moved)
+
+    def update_range(self, start, pos=None, norm=None, sel=None):
+        ''' writes new attribute values for consecutive vertices beginning at start '''
+        l = max(len(v) for v in (pos, norm, sel) if v is not None)
+        self.update_offsets(np.arange(start, start + l), pos=pos, norm=norm, sel=sel)
+
+    def update_key(self, key, pos=None, norm=None, sel=None):
+        '''
+        writes new attribute values for all buffered vertices generated from
+        key (see keys parameter of buffer).  returns False if key is unknown
+        '''
+        offsets = self.key_offsets.get(key, None)
+        if not offsets:
+            return False
+        self.update_offsets(offsets, pos=pos, norm=norm, sel=sel)
+        return True
+
+    @profiler.profile
+    def update_selection(self, sel):
+        '''
+        replaces selection of all buffered vertices (one value per vertex).
+        only vertices whose selection changed are uploaded (see flush)
+        '''
+        if not self.arrays:
+            return
+        sel = np.asarray(sel, dtype=np.uint8)
+        changed = np.flatnonzero(sel != self.arrays['sel'])
+        if len(changed):
+            self.update_offsets(changed, sel=sel[changed])
+
+    def update_element_selection(self, elem_sel):
+        '''
+        updates selection from select state of source elements (ex: from
+        get_select_bytes), using elem_indices given to buffer
+        '''
+        if self.elem_indices is None:
+            return
+        self.update_selection(np.asarray(elem_sel, dtype=np.uint8)[self.elem_indices])
+
+    def is_dirty(self):
+        return any(self.dirty_offsets.values())
+
+    @profiler.profile
+    def flush(self):
+        ''' uploads dirty ranges of each attribute with glBufferSubData '''
+        try:
+            for attr, dirty in self.dirty_offsets.items():
+                if not dirty:
+                    continue
+                offsets = np.unique(np.concatenate(dirty))
+                dirty.clear()
+                runs = index_runs(offsets, gap=self.DIRTY_MERGE_GAP)
+                if len(runs) > self.DIRTY_MAX_RUNS:
+                    runs = [(runs[0][0], runs[-1][1])]
+                for start, end in runs:
+                    self._upload(attr, start, end)
+        finally:
+            bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, 0)
+
     @profiler.profile
     def _check_error(self, title):
         if not self.DEBUG_CHKERR:
@@ -455,26 +843,66 @@ class BGLBufferedRender:
             print('ERROR (%s): code %d' % (title, err))
 
     @profiler.profile
-    def _draw(self, sx, sy, sz):
-        bmeshShader.assign('vert_scale', (sx, sy, sz))
+    def _draw(self, ranges, scale=(1, 1, 1)):
+        glstate.uniform(bmeshShader, 'vert_scale', scale)
         if self.DEBUG_PRINT:
             print('==> drawing %d %s (%d)  (%d verts)' % (
                 self.count / self.gl_count,
                 self.gltype_name, self.gltype, self.count))
-        if self.render_indices:
-            bgl.glDrawElements(self.gltype, self.count,
-                               bgl.GL_UNSIGNED_INT, buf_zero)
-            self._check_error('_draw: glDrawElements (%d, %d, %d)' % (
-                self.gltype, self.count, bgl.GL_UNSIGNED_INT))
+        bmeshShader.flush()
+        for first, count, indices in ranges:
+            if indices is not None:
+                bgl.glDrawElements(self.gltype, count,
+                                   bgl.GL_UNSIGNED_INT, indices)
+                self._check_error('_draw: glDrawElements (%d, %d, %d)' % (
+                    self.gltype, count, bgl.GL_UNSIGNED_INT))
+            else:
+                bgl.glDrawArrays(self.gltype, first, count)
+                self._check_error('_draw: glDrawArrays (%d)' % count)
+            profiler.count('BGLBufferedRender draw calls')
+            profiler.count('BGLBufferedRender draw instances')
+
+    @profiler.profile
+    def _draw_instanced(self, ranges, scales):
+        # each instance picks its scale from vert_scales[gl_InstanceIDARB]
+        glstate.uniform(bmeshShader, 'vert_scales', scales)
+        glstate.uniform(bmeshShader, 'use_instancing', 1.0)
+        bmeshShader.flush()
+        for first, count, indices in ranges:
+            if indices is not None:
+                bgl.glDrawElementsInstanced(self.gltype, count,
+                                            bgl.GL_UNSIGNED_INT, indices,
+                                            len(scales))
+                self._check_error('_draw_instanced: glDrawElementsInstanced')
+            else:
+                bgl.glDrawArraysInstanced(self.gltype, first, count, len(scales))
+                self._check_error('_draw_instanced: glDrawArraysInstanced')
+            profiler.count('BGLBufferedRender draw calls')
+            profiler.count('BGLBufferedRender draw instances', len(scales))
+        glstate.uniform(bmeshShader, 'use_instancing', 0.0)
+
+    def _draw_mirrored(self, ranges, scales):
+        if not scales or not ranges:
+            return
+        if self.USE_INSTANCING and self.has_instancing:
+            self._draw_instanced(ranges, scales)
         else:
-            bgl.glDrawArrays(self.gltype, 0, self.count)
-            self._check_error('_draw: glDrawArrays (%d)' % self.count)
+            for scale in scales:
+                self._draw(ranges, scale)
 
     @profiler.profile
-    def draw(self, opts):
+    def draw(self, opts, mvp=None, viewport=None):
+        '''
+        draws buffered geometry (and mirrored copies) using opts.
+        if the buffer is chunked and mvp (model-view-projection matrix) and
+        viewport (width, height) are given, chunks are culled to the view.
+        '''
         if self.count == 0:
             return
 
+        if self.is_dirty():
+            self.flush()
+
         if self.gltype == bgl.GL_LINES:
             if opts.get('line width', 1.0) <= 0:
                 return
@@ -487,11 +915,11 @@ class BGLBufferedRender:
             'mirror y', False), opts.get('mirror z', False)
         focus = opts.get('focus mult', 1.0)
 
-        bmeshShader.assign('focus_mult', focus)
-        bmeshShader.assign('use_selection', 0.0 if nosel else 1.0)
-        bmeshShader.assign('cull_backfaces', 1.0 if opts.get('cull backfaces', False) else 0.0)
-        bmeshShader.assign('alpha_backface', opts.get('alpha backface', 0.5))
-        bmeshShader.assign('normal_offset', opts.get('normal offset', 0.0))
+        glstate.uniform(bmeshShader, 'focus_mult', focus)
+        glstate.uniform(bmeshShader, 'use_selection', 0.0 if nosel else 1.0)
+        glstate.uniform(bmeshShader, 'cull_backfaces', 1.0 if opts.get('cull backfaces', False) else 0.0)
+        glstate.uniform(bmeshShader, 'alpha_backface', opts.get('alpha backface', 0.5))
+        glstate.uniform(bmeshShader, 'normal_offset', opts.get('normal offset', 0.0))
 
         bmeshShader.vertexAttribPointer(
             self.vbo_pos,  'vert_pos',  3, bgl.GL_FLOAT, buf=buf_zero)
@@ -500,30 +928,22 @@ class BGLBufferedRender:
             self.vbo_norm, 'vert_norm', 3, bgl.GL_FLOAT, buf=buf_zero)
         self._check_error('draw: vertex attrib array norm')
         bmeshShader.vertexAttribPointer(
-            self.vbo_sel,  'selected',  1, bgl.GL_FLOAT, buf=buf_zero)
+            self.vbo_sel,  'selected',  1, bgl.GL_UNSIGNED_BYTE, buf=buf_zero)
         self._check_error('draw: vertex attrib array sel')
         bgl.glBindBuffer(bgl.GL_ELEMENT_ARRAY_BUFFER, self.vbo_idx)
         self._check_error('draw: element array buffer idx')
 
+        lod_pixels = opts.get('lod pixels', self.LOD_PIXELS)
+
         glSetOptions(self.options_prefix, opts)
-        self._draw(1, 1, 1)
+        ranges = self._get_draw_ranges([(1, 1, 1)], mvp, viewport, lod_pixels)
+        self._draw(ranges)
 
         if mx or my or mz:
             glSetOptions('%s mirror' % self.options_prefix, opts)
-            if mx:
-                self._draw(-1,  1,  1)
-            if my:
-                self._draw(1, -1,  1)
-            if mz:
-                self._draw(1,  1, -1)
-            if mx and my:
-                self._draw(-1, -1,  1)
-            if mx and mz:
-                self._draw(-1,  1, -1)
-            if my and mz:
-                self._draw(1, -1, -1)
-            if mx and my and mz:
-                self._draw(-1, -1, -1)
+            scales = get_mirror_scales(mx, my, mz)
+            ranges = self._get_draw_ranges(scales, mvp, viewport, lod_pixels)
+            self._draw_mirrored(ranges, scales)
 
         bmeshShader.disableVertexAttribArray('vert_pos')
         bmeshShader.disableVertexAttribArray('vert_norm')
@@ -532,63 +952,20 @@ class BGLBufferedRender:
         bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, 0)
 
 
-@profiler.profile
-def glDrawSimpleFaces(lsf, opts=None, enableShader=True):
-    opts_ = opts or {}
-    nosel = opts_.get('no selection', False)
-    mx = opts_.get('mirror x', False)
-    my = opts_.get('mirror y', False)
-    mz = opts_.get('mirror z', False)
-    dn = opts_.get('normal', 0.0)
-
-    bmeshShader.assign('focus_mult', opts_.get('focus mult', 1.0))
-    bmeshShader.assign('use_selection', 0.0 if nosel else 1.0)
-    bmeshShader.assign('selected', 0.0)
-
-    @profiler.profile
-    def render(sx, sy, sz):
-        bmeshShader.assign('vert_scale', (sx, sy, sz))
-        for sf in lsf:
-            for v0, v1, v2 in triangulateFace(sf):
-                (c0, n0), (c1, n1), (c2, n2) = v0, v1, v2
-                bgl.glNormal3f(*n0)
-                bgl.glVertex3f(*c0)
-                bgl.glNormal3f(*n1)
-                bgl.glVertex3f(*c1)
-                bgl.glNormal3f(*n2)
-                bgl.glVertex3f(*c2)
+# BGLBufferedRender instances reused by the glDrawBM* functions, one per gltype.
+# created lazily, because generating buffers requires a GL context
+immediate_renders = {}
 
-    if enableShader:
-        bmeshShader.enable()
+def get_immediate_render(gltype):
+    if gltype not in immediate_renders:
+        immediate_renders[gltype] = BGLBufferedRender(gltype)
+    return immediate_renders[gltype]
 
-    glSetOptions('poly', opts)
-    bgl.glBegin(bgl.GL_TRIANGLES)
-    render(1, 1, 1)
-    bgl.glEnd()
-    bgl.glDisable(bgl.GL_LINE_STIPPLE)
-
-    if mx or my or mz:
-        glSetOptions('poly mirror', opts)
-        bgl.glBegin(bgl.GL_TRIANGLES)
-        if mx:
-            render(-1,  1,  1)
-        if my:
-            render(1, -1,  1)
-        if mz:
-            render(1,  1, -1)
-        if mx and my:
-            render(-1, -1,  1)
-        if mx and mz:
-            render(-1,  1, -1)
-        if my and mz:
-            render(1, -1, -1)
-        if mx and my and mz:
-            render(-1, -1, -1)
-        bgl.glEnd()
-        bgl.glDisable(bgl.GL_LINE_STIPPLE)
 
-    if enableShader:
-        bmeshShader.disable()
+@profiler.profile
+def glDrawSimpleFaces(lsf, opts=None, enableShader=True):
+    pos, norm, sel = simplefaces_to_arrays(lsf)
+    glDrawBuffered(bgl.GL_TRIANGLES, pos, norm, sel, opts=opts, enableShader=enableShader)
 
 
 def glDrawBMFaceEdges(bmf, opts=None, enableShader=True):
@@ -608,65 +985,8 @@ def glDrawBMEdges(lbme, opts=None, enableShader=True):
     opts_ = opts or {}
     if opts_.get('line width', 1.0) <= 0.0:
         return
-    nosel = opts_.get('no selection', False)
-    mx = opts_.get('mirror x', False)
-    my = opts_.get('mirror y', False)
-    mz = opts_.get('mirror z', False)
-    dn = opts_.get('normal', 0.0)
-    vdict = opts_.get('vertex dict', {})
-
-    bmeshShader.assign('use_selection', 0.0 if nosel else 1.0)
-
-    @profiler.profile
-    def render(sx, sy, sz):
-        bmeshShader.assign('vert_scale', (sx, sy, sz))
-        for bme in lbme:
-            bmeshShader.assign('selected', 1.0 if bme.select else 0.0)
-            v0, v1 = bme.verts
-            if v0 not in vdict:
-                vdict[v0] = (v0.co, v0.normal)
-            if v1 not in vdict:
-                vdict[v1] = (v1.co, v1.normal)
-            (c0, n0), (c1, n1) = vdict[v0], vdict[v1]
-            c0, c1 = c0+n0*dn, c1+n1*dn
-            bmeshShader.assign('vert_norm', n0)
-            bmeshShader.assign('vert_pos',  c0)
-            # bgl.glVertex3f(0,0,0)
-            bmeshShader.assign('vert_norm', n1)
-            bmeshShader.assign('vert_pos',  c1)
-            # bgl.glVertex3f(0,0,0)
-
-    if enableShader:
-        bmeshShader.enable()
-
-    glSetOptions('line', opts)
-    bgl.glBegin(bgl.GL_LINES)
-    render(1, 1, 1)
-    bgl.glEnd()
-    bgl.glDisable(bgl.GL_LINE_STIPPLE)
-
-    if mx or my or mz:
-        glSetOptions('line mirror', opts)
-        bgl.glBegin(bgl.GL_LINES)
-        if mx:
-            render(-1,  1,  1)
-        if my:
-            render(1, -1,  1)
-        if mz:
-            render(1,  1, -1)
-        if mx and my:
-            render(-1, -1,  1)
-        if mx and mz:
-            render(-1,  1, -1)
-        if my and mz:
-            render(1, -1, -1)
-        if mx and my and mz:
-            render(-1, -1, -1)
-        bgl.glEnd()
-        bgl.glDisable(bgl.GL_LINE_STIPPLE)
-
-    if enableShader:
-        bmeshShader.disable()
+    pos, norm, sel = bmedges_to_arrays(lbme, dn=opts_.get('normal', 0.0), vdict=opts_.get('vertex dict', None))
+    glDrawBuffered(bgl.GL_LINES, pos, norm, sel, opts=opts_, enableShader=enableShader)
 
 
 def glDrawBMEdgeVerts(bme, opts=None, enableShader=True):
@@ -682,70 +1002,34 @@ def glDrawBMVerts(lbmv, opts=None, enableShader=True):
     opts_ = opts or {}
     if opts_.get('point size', 1.0) <= 0.0:
         return
-    nosel = opts_.get('no selection', False)
-    mx = opts_.get('mirror x', False)
-    my = opts_.get('mirror y', False)
-    mz = opts_.get('mirror z', False)
-    dn = opts_.get('normal', 0.0)
-    vdict = opts_.get('vertex dict', {})
-
-    if enableShader:
-        bmeshShader.enable()
-    bmeshShader.assign('use_selection', 0.0 if nosel else 1.0)
+    pos, norm, sel = bmverts_to_arrays(lbmv, dn=opts_.get('normal', 0.0), vdict=opts_.get('vertex dict', None))
+    glDrawBuffered(bgl.GL_POINTS, pos, norm, sel, opts=opts_, enableShader=enableShader)
 
-    @profiler.profile
-    def render(sx, sy, sz):
-        bmeshShader.assign('vert_scale', Vector((sx, sy, sz)))
-        for bmv in lbmv:
-            bmeshShader.assign('selected', 1.0 if bmv.select else 0.0)
-            if bmv not in vdict:
-                vdict[bmv] = (bmv.co, bmv.normal)
-            c, n = vdict[bmv]
-            c = c + dn * n
-            bmeshShader.assign('vert_norm', n)
-            bmeshShader.assign('vert_pos',  c)
-            # bgl.glNormal3f(*n)
-            # bgl.glVertex3f(*c)
-
-    glSetOptions('point', opts)
-    bgl.glBegin(bgl.GL_POINTS)
-    glCheckError('something broke before rendering bmverts')
-    render(1, 1, 1)
-    glCheckError('something broke after rendering bmverts')
-    bgl.glEnd()
-    glCheckError('something broke after glEnd')
-    bgl.glDisable(bgl.GL_LINE_STIPPLE)
-    glCheckError('something broke after glDisable(bgl.GL_LINE_STIPPLE')
-
-    if mx or my or mz:
-        glSetOptions('point mirror', opts)
-        bgl.glBegin(bgl.GL_POINTS)
-        if mx:
-            render(-1,  1,  1)
-        if my:
-            render(1, -1,  1)
-        if mz:
-            render(1,  1, -1)
-        if mx and my:
-            render(-1, -1,  1)
-        if mx and mz:
-            render(-1,  1, -1)
-        if my and mz:
-            render(1, -1, -1)
-        if mx and my and mz:
-            render(-1, -1, -1)
-        bgl.glEnd()
-        bgl.glDisable(bgl.GL_LINE_STIPPLE)
 
-    if enableShader:
-        glCheckError('before disabling shader')
-        bmeshShader.disable()
+def get_view(xform):
+    ''' returns (model-view-projection matrix, viewport size) of the region for geometry under xform '''
+    drawing = Drawing.get_instance()
+    if not drawing.r3d or not drawing.rgn:
+        return (None, None)
+    mvp = drawing.get_mvp_matrix() * xform.mx_p
+    return (mvp, (drawing.rgn.width, drawing.rgn.height))
 
 
 class BMeshRender():
+    '''
+    draws a bmesh from three BGLBufferedRenders (faces, edges, verts).
+    the buffered geometry does not depend on the draw options, so changing
+    options (colors, sizes, mirroring, normal offset, ...) only changes
+    uniforms and GL state; geometry is rebuilt only when dirty.
+    large meshes are split into spatial chunks that are culled to the view.
+    '''
+
+    # approximate number of primitives per chunk
+    CHUNK_SIZE = 8192
+
     @profiler.profile
-    def __init__(self, obj, xform=None):
-        self.calllist = None
+    def __init__(self, obj, xform=None, tricache=None):
+        self.buf_faces = None
         if type(obj) is bpy.types.Object:
             print('Creating BMeshRender for ' + obj.name)
             self.bme = bmesh.new()
@@ -757,44 +1041,96 @@ class BMeshRender():
         else:
             assert False, 'Unhandled type: ' + str(type(obj))
 
+        self.tricache = tricache or BMeshTriangulationCache()
+        self.triangles_only = False
+
         self.buf_matrix_model = self.xform.to_bglMatrix_Model()
         self.buf_matrix_normal = self.xform.to_bglMatrix_Normal()
 
         self.is_dirty = True
-        self.calllist = bgl.glGenLists(1)
+        self.buf_faces = BGLBufferedRender(bgl.GL_TRIANGLES)
+        self.buf_edges = BGLBufferedRender(bgl.GL_LINES)
+        self.buf_verts = BGLBufferedRender(bgl.GL_POINTS)
 
     def replace_bmesh(self, bme):
         self.bme = bme
+        self.tricache.dirty()
         self.is_dirty = True
 
     def __del__(self):
-        if not self.calllist: return
-        bgl.glDeleteLists(self.calllist, 1)
-        self.calllist = None
+        if not self.buf_faces: return
+        del self.buf_faces, self.buf_edges, self.buf_verts
+        self.buf_faces = None
 
     def dirty(self):
         self.is_dirty = True
 
     @profiler.profile
     def clean(self, opts=None):
+        triangles_only = (opts or {}).get('triangles only', False)
+        if triangles_only != self.triangles_only:
+            self.triangles_only = triangles_only
+            self.is_dirty = True
         if not self.is_dirty: return
 
-        # make not dirty first in case bad things happen while drawing
+        # make not dirty first in case bad things happen while buffering
         self.is_dirty = False
 
-        bgl.glNewList(self.calllist, bgl.GL_COMPILE)
-        # do not change attribs if they're not set
-        glSetDefaultOptions(opts=opts)
-        glDrawBMFaces(self.bme.faces, opts=opts, enableShader=False)
-        glDrawBMEdges(self.bme.edges, opts=opts, enableShader=False)
-        glDrawBMVerts(self.bme.verts, opts=opts, enableShader=False)
-        bgl.glDepthRange(0, 1)
-        bgl.glEndList()
+        keys, elem_indices = [], []
+        pos, norm, sel = bmfaces_to_arrays(
+            self.bme.faces, tricache=self.tricache,
+            triangles_only=self.triangles_only, keys=keys, elem_indices=elem_indices,
+        )
+        self.buf_faces.buffer(
+            pos, norm, sel, None, keys=keys,
+            chunk_size=self.CHUNK_SIZE, elem_indices=elem_indices,
+        )
+
+        keys, elem_indices = [], []
+        pos, norm, sel = bmedges_to_arrays(self.bme.edges, keys=keys, elem_indices=elem_indices)
+        self.buf_edges.buffer(
+            pos, norm, sel, None, keys=keys,
+            chunk_size=self.CHUNK_SIZE, elem_indices=elem_indices,
+        )
+
+        lbmv = self.bme.verts
+        pos, norm, sel = bmverts_to_arrays(lbmv)
+        self.buf_verts.buffer(
+            pos, norm, sel, None, keys=list(lbmv),
+            chunk_size=self.CHUNK_SIZE, elem_indices=np.arange(len(lbmv)),
+        )
+
+    @profiler.profile
+    def update_selection(self):
+        '''
+        uploads only the selection of faces, edges, and verts whose select
+        state changed (ex: after box select).  geometry is not rebuilt
+        '''
+        if self.is_dirty: return
+        self.buf_faces.update_element_selection(get_select_bytes(self.bme.faces))
+        self.buf_edges.update_element_selection(get_select_bytes(self.bme.edges))
+        self.buf_verts.update_element_selection(get_select_bytes(self.bme.verts))
+
+    @profiler.profile
+    def update_verts_co(self, lbmv):
+        '''
+        uploads new positions of the given (moved) verts only.
+        normals are not updated; call dirty() to rebuild everything
+        '''
+        if self.is_dirty: return
+        for bmv in lbmv:
+            co = bmv.co
+            self.buf_faces.update_key(bmv, pos=co)
+            self.buf_edges.update_key(bmv, pos=co)
+            self.buf_verts.update_key(bmv, pos=co)
 
     @profiler.profile
     def draw(self, opts=None):
         try:
+            opts = opts or {}
             self.clean(opts=opts)
+            mvp, viewport = get_view(self.xform)
+            bmeshShader.select(get_bmeshShader_defines(opts))
             bmeshShader.enable()
             #bmeshShader.assign('matrix_m',  self.buf_matrix_model)
             #bmeshShader.assign('matrix_mn', self.buf_matrix_normal)
@@ -804,8 +1140,234 @@ class BMeshRender():
             #bmeshShader.assign('matrix_vn', buf_matrix_view_invtrans)
             #bmeshShader.assign('matrix_p', buf_matrix_proj)
             #bmeshShader.assign('dir_forward', view_forward)
-            bgl.glCallList(self.calllist)
+            # do not change attribs if they're not set
+            glstate.reset()
+            glSetDefaultOptions(opts=opts)
+            self.buf_faces.draw(opts, mvp=mvp, viewport=viewport)
+            glstate.disable(bgl.GL_LINE_STIPPLE)
+            # edges and verts are pushed along normal in the shader
+            opts_offset = dict(opts)
+            if 'normal' in opts:
+                opts_offset['normal offset'] = opts['normal']
+            self.buf_edges.draw(opts_offset, mvp=mvp, viewport=viewport)
+            glstate.disable(bgl.GL_LINE_STIPPLE)
+            self.buf_verts.draw(opts_offset, mvp=mvp, viewport=viewport)
+            glstate.depth_range(0, 1)
         except:
-            pass
+            # headless runs (bgl_stub) are tests and benchmarks; do not hide errors there
+            if getattr(bgl, 'IS_STUB', False): raise
         finally:
             bmeshShader.disable()
+
+
+class BMeshPicker():
+    '''
+    picks the bmesh vert, edge, or face under the mouse using an id buffer,
+    rather than testing every element on the CPU.
+
+    element ids are rendered into an offscreen buffer whenever the view or
+    the geometry changes, and a pick reads back only the pixels around the
+    mouse.  faces are always rendered, so occluded elements are not picked.
+    if offscreen rendering is not available (or use_gpu is False), the id
+    buffer around the mouse is rasterized in software instead, using the
+    same sizes, depth bias, and depth test.
+    '''
+
+    # size in pixels of verts and edges in the id buffer
+    POINT_SIZE = 5.0
+    LINE_WIDTH = 3.0
+    # pulls verts and edges in front of the faces they lie on
+    DEPTH_BIAS = 0.00005
+
+    has_offscreen = hasattr(gpu, 'offscreen')
+
+    def __init__(self, bme, xform=None, tricache=None, use_gpu=None):
+        self.bme = bme
+        self.xform = xform or XForm()
+        self.tricache = tricache or BMeshTriangulationCache()
+        self.use_gpu = self.has_offscreen if use_gpu is None else use_gpu
+        self.offscreen = None
+        self.vbos = None
+        self.rendered = None        # (kind, view) of rendered id buffer
+        self.projected = None       # (view, projected coords) for software picking
+        self.dirty()
+
+    def __del__(self):
+        self._free_gpu()
+
+    def _free_gpu(self):
+        if self.offscreen:
+            self.offscreen.free()
+            self.offscreen = None
+        if self.vbos:
+            bgl.glDeleteBuffers(6, self.vbos)
+            self.vbos = None
+
+    def dirty(self):
+        ''' call when geometry changes '''
+        self.is_dirty = True
+        self.rendered = None
+        self.projected = None
+
+    @profiler.profile
+    def clean(self):
+        if not self.is_dirty: return
+        self.is_dirty = False
+
+        lbmf, lbme, lbmv = list(self.bme.faces), list(self.bme.edges), list(self.bme.verts)
+        self.elems = {'face': lbmf, 'edge': lbme, 'vert': lbmv}
+
+        # ids are indices into self.elems + 1; 0 means "no element"
+        fpos, fids = [], []
+        for i, bmf in enumerate(lbmf, 1):
+            for tri in self.tricache.iter_triangles(bmf):
+                fpos += [bmv.co for bmv in tri]
+                fids.append(i)
+        epos = [bmv.co for bme in lbme for bmv in bme.verts]
+        vpos = [bmv.co for bmv in lbmv]
+        self.coords = {
+            'face': as_float32_array(fpos).reshape(-1, 3),
+            'edge': as_float32_array(epos).reshape(-1, 3),
+            'vert': as_float32_array(vpos).reshape(-1, 3),
+        }
+        self.ids = {
+            'face': np.array(fids, dtype=np.float32),
+            'edge': np.arange(1, len(lbme) + 1, dtype=np.float32),
+            'vert': np.arange(1, len(lbmv) + 1, dtype=np.float32),
+        }
+        if self.use_gpu:
+            self._buffer()
+
+    def _layers(self, kind):
+        '''
+        returns list of (gltype, prim, prim size, use ids, size, depth bias)
+        to render for picking kind.  prims without ids only occlude
+        '''
+        layers = [(bgl.GL_TRIANGLES, 'face', 3, kind == 'face', 0.0, 0.0)]
+        if kind == 'edge':
+            layers += [(bgl.GL_LINES, 'edge', 2, True, self.LINE_WIDTH, self.DEPTH_BIAS)]
+        elif kind == 'vert':
+            layers += [(bgl.GL_POINTS, 'vert', 1, True, self.POINT_SIZE, self.DEPTH_BIAS)]
+        return layers
+
+    def _buffer(self):
+        if not self.vbos:
+            self.vbos = bgl.Buffer(bgl.GL_INT, 6)
+            bgl.glGenBuffers(6, self.vbos)
+        for i, (prim, prim_size) in enumerate([('face', 3), ('edge', 2), ('vert', 1)]):
+            # each buffered vertex gets the id of its primitive
+            vids = np.repeat(self.ids[prim], prim_size)
+            for vbo, array in [(self.vbos[2*i], self.coords[prim]), (self.vbos[2*i+1], vids)]:
+                if not len(array): continue
+                bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, vbo)
+                bgl.glBufferData(bgl.GL_ARRAY_BUFFER, array.nbytes, np_array_as_bgl_Buffer(array), bgl.GL_STATIC_DRAW)
+                profiler.count('BMeshPicker upload bytes', array.nbytes)
+        bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, 0)
+
+    @profiler.profile
+    def _render(self, kind, mvp, viewport):
+        w, h = viewport
+        if not self.offscreen or (self.offscreen.width, self.offscreen.height) != (w, h):
+            if self.offscreen: self.offscreen.free()
+            self.offscreen = gpu.offscreen.new(w, h)
+
+        self.offscreen.bind(True)
+        bgl.glPushAttrib(bgl.GL_ALL_ATTRIB_BITS)
+        try:
+            bgl.glViewport(0, 0, w, h)
+            bgl.glClearColor(0, 0, 0, 0)
+            bgl.glClearDepth(1.0)
+            bgl.glClear(bgl.GL_COLOR_BUFFER_BIT | bgl.GL_DEPTH_BUFFER_BIT)
+            # ids must not be blended or smoothed
+            for cap in [bgl.GL_BLEND, bgl.GL_DITHER, bgl.GL_MULTISAMPLE, bgl.GL_LINE_SMOOTH, bgl.GL_POINT_SMOOTH]:
+                bgl.glDisable(cap)
+            bgl.glEnable(bgl.GL_DEPTH_TEST)
+            bgl.glDepthFunc(bgl.GL_LESS)
+            bgl.glDepthMask(bgl.GL_TRUE)
+
+            pickShader.enable()
+            pickShader.assign('matrix_mvp', bgl.Buffer(bgl.GL_FLOAT, [4, 4], mvp))
+            for gltype, prim, prim_size, use_ids, size, bias in self._layers(kind):
+                count = len(self.coords[prim])
+                if not count: continue
+                i = ['face', 'edge', 'vert'].index(prim)
+                pickShader.assign('depth_bias', bias)
+                pickShader.vertexAttribPointer(self.vbos[2*i], 'vert_pos', 3, bgl.GL_FLOAT)
+                if use_ids:
+                    pickShader.vertexAttribPointer(self.vbos[2*i+1], 'vert_id', 1, bgl.GL_FLOAT)
+                else:
+                    pickShader.disableVertexAttribArray('vert_id')
+                    pickShader.assign('vert_id', 0.0)
+                if gltype == bgl.GL_LINES: bgl.glLineWidth(size)
+                if gltype == bgl.GL_POINTS: bgl.glPointSize(size)
+                bgl.glDrawArrays(gltype, 0, count)
+                profiler.count('BMeshPicker draw calls')
+            pickShader.disableVertexAttribArray('vert_pos')
+            pickShader.disableVertexAttribArray('vert_id')
+            pickShader.disable()
+        finally:
+            bgl.glPopAttrib()
+            self.offscreen.unbind(True)
+
+    def _read_ids(self, window):
+        x, y, w, h = window
+        buf = np.zeros((h, w, 4), dtype=np.uint8)
+        self.offscreen.bind(True)
+        try:
+            bgl.glReadPixels(x, y, w, h, bgl.GL_RGBA, bgl.GL_UNSIGNED_BYTE, np_array_as_bgl_Buffer(buf))
+        finally:
+            self.offscreen.unbind(True)
+        rgb = buf[..., :3].astype(np.int64)
+        return rgb[..., 0] | (rgb[..., 1] << 8) | (rgb[..., 2] << 16)
+
+    def _rasterize_ids(self, kind, window, mvp, viewport):
+        view = (tuple(tuple(r) for r in mvp), tuple(viewport))
+        if not self.projected or self.projected[0] != view:
+            coords = {prim: project_to_window(co, mvp, viewport) for (prim, co) in self.coords.items()}
+            self.projected = (view, coords)
+        ids_buf, depth_buf = None, None
+        for _, prim, prim_size, use_ids, size, bias in self._layers(kind):
+            win, valid = self.projected[1][prim]
+            # drop primitives with vertices behind the camera
+            valid = valid.reshape(-1, prim_size).all(axis=1)
+            ids = self.ids[prim] if use_ids else np.zeros(len(self.ids[prim]))
+            ids_buf, depth_buf = rasterize_ids(
+                window, win.reshape(-1, prim_size, 3)[valid], prim_size,
+                ids[valid].astype(np.int64), size=size, depth_bias=bias,
+                ids_buf=ids_buf, depth_buf=depth_buf,
+            )
+        return ids_buf
+
+    @profiler.profile
+    def pick(self, xy, kind='vert', radius=10, mvp=None, viewport=None):
+        '''
+        returns the element of kind ('vert', 'edge', 'face') under region
+        pixel xy (or nearest to xy within radius pixels), or None.
+        mvp and viewport default to the current region (see get_view)
+        '''
+        assert kind in {'vert', 'edge', 'face'}, 'Unhandled kind %s' % kind
+        if mvp is None:
+            mvp, viewport = get_view(self.xform)
+            if mvp is None: return None
+        self.clean()
+        if not self.elems[kind]: return None
+
+        # window of pixels around xy, clamped to viewport
+        r = int(math.ceil(radius))
+        cx, cy = int(xy[0]), int(xy[1])
+        x0, y0 = max(0, cx - r), max(0, cy - r)
+        x1, y1 = min(viewport[0], cx + r + 1), min(viewport[1], cy + r + 1)
+        if x1 <= x0 or y1 <= y0: return None
+        window = (x0, y0, x1 - x0, y1 - y0)
+
+        if self.use_gpu:
+            view = (kind, tuple(tuple(r) for r in mvp), tuple(viewport))
+            if self.rendered != view:
+                self._render(kind, mvp, viewport)
+                self.rendered = view
+            ids_buf = self._read_ids(window)
+        else:
+            ids_buf = self._rasterize_ids(kind, window, mvp, viewport)
+
+        i = nearest_id(ids_buf, (cx - x0, cy - y0), radius)
+        return self.elems[kind][i - 1] if i else None
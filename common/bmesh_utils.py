@@ -19,6 +19,8 @@ Created by Jonathan Denning and Jonathan Williamson
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 '''
 
+import numpy as np
+
 
 class BMeshState:
     def __init__(self, bmesh, property, default_value=False):
@@ -53,3 +55,107 @@ class BMeshHideState(BMeshState):
         super().__init__(bmesh, 'hide')
 
 
+
+
+def get_select_bytes(elems):
+    '''
+    returns uint8 array with select state (0 or 1) of each bmesh element
+    (verts, edges, or faces) in a single pass
+    '''
+    return np.fromiter((e.select for e in elems), dtype=np.uint8, count=len(elems))
+
+
+def triangulate_polygon(coords):
+    '''
+    triangulates a simple (possibly concave) polygon using ear clipping.
+    coords is a list of 3D positions in order around the polygon.
+    returns flat tuple of indices into coords, 3 per triangle.
+    convex polygons are fanned, since that is the common case.
+    '''
+    l = len(coords)
+    if l < 3: return ()
+    if l == 3: return (0, 1, 2)
+
+    # newell normal, then project onto plane of largest normal component
+    nx, ny, nz = 0.0, 0.0, 0.0
+    for (x0, y0, z0), (x1, y1, z1) in zip(coords, coords[1:] + coords[:1]):
+        nx += (y0 - y1) * (z0 + z1)
+        ny += (z0 - z1) * (x0 + x1)
+        nz += (x0 - x1) * (y0 + y1)
+    n = (nx, ny, nz)
+    ax = max(range(3), key=lambda i: abs(n[i]))
+    u, v = (ax + 1) % 3, (ax + 2) % 3
+    if n[ax] < 0: u, v = v, u
+    pts = [(co[u], co[v]) for co in coords]
+
+    def cross(i0, i1, i2):
+        (x0, y0), (x1, y1), (x2, y2) = pts[i0], pts[i1], pts[i2]
+        return (x1 - x0) * (y2 - y0) - (y1 - y0) * (x2 - x0)
+
+    if all(cross(i - 1, i, (i + 1) % l) >= 0 for i in range(l)):
+        return tuple(i for i1 in range(1, l - 1) for i in (0, i1, i1 + 1))
+
+    def inside(i, i0, i1, i2):
+        return cross(i0, i1, i) >= 0 and cross(i1, i2, i) >= 0 and cross(i2, i0, i) >= 0
+
+    idx = list(range(l))
+    tris = []
+    while len(idx) > 3:
+        c = len(idx)
+        for k in range(c):
+            i0, i1, i2 = idx[k - 1], idx[k], idx[(k + 1) % c]
+            if cross(i0, i1, i2) <= 0: continue
+            if any(inside(i, i0, i1, i2) for i in idx if i not in (i0, i1, i2)): continue
+            tris += [i0, i1, i2]
+            del idx[k]
+            break
+        else:
+            # degenerate polygon (no ear found); fan what remains
+            break
+    tris += [i for i1, i2 in zip(idx[1:-1], idx[2:]) for i in (idx[0], i1, i2)]
+    return tuple(tris)
+
+
+class BMeshTriangulationCache:
+    '''
+    Caches triangulations of BMFaces as flat tuples of indices into
+    bmf.verts, so rendering and picking do not re-triangulate every face
+    on every use.  An entry is recomputed when the verts of its face
+    change (topology change) or when they move, as moving can turn a
+    convex face (fanned) concave or change which ears are clipped.
+    '''
+    tri_indices = (0, 1, 2)
+
+    def __init__(self):
+        self._cache = {}
+
+    def dirty(self, bmf=None):
+        if bmf is None: self._cache.clear()
+        else: self._cache.pop(bmf, None)
+
+    def clean_invalid(self):
+        self._cache = { bmf:entry for (bmf, entry) in self._cache.items() if bmf.is_valid }
+
+    def get_indices(self, bmf, verts=None):
+        ''' returns flat tuple of indices into bmf.verts, 3 per triangle '''
+        verts = tuple(bmf.verts) if verts is None else verts
+        if len(verts) == 3: return self.tri_indices
+        coords = [tuple(bmv.co) for bmv in verts]
+        entry = self._cache.get(bmf)
+        if entry is None or entry[0] != verts or entry[1] != coords:
+            entry = (verts, coords, triangulate_polygon(coords))
+            self._cache[bmf] = entry
+        return entry[2]
+
+    def iter_indices(self, bmf):
+        ''' yields (i0, i1, i2) triangles as indices into bmf.verts '''
+        inds = self.get_indices(bmf)
+        for i in range(0, len(inds), 3):
+            yield inds[i:i+3]
+
+    def iter_triangles(self, bmf):
+        ''' yields (bmv0, bmv1, bmv2) triangles of bmf '''
+        verts = tuple(bmf.verts)
+        inds = self.get_indices(bmf, verts=verts)
+        for i in range(0, len(inds), 3):
+            yield (verts[inds[i]], verts[inds[i+1]], verts[inds[i+2]])
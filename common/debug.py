@@ -54,6 +54,7 @@ from mathutils.geometry import (
 from .globals import set_global, get_global
 from .blender import show_blender_popup
 from .hasher import Hasher
+from .kernels import sort_by_angles
 
 
 class Debugger:
@@ -430,9 +431,7 @@ def vector_angle_between_near_parallel(v0, v1, vcross):
 
 def sort_objects_by_angles(vec_about, l_objs, l_vecs):
     if len(l_objs) <= 1:  return l_objs
-    o0,v0 = l_objs[0],l_vecs[0]
-    l_angles = [0] + [vector_angle_between(v0,v1,vec_about) for v1 in l_vecs[1:]]
-    l_inds = sorted(range(len(l_objs)), key=lambda i: l_angles[i])
+    l_inds = sort_by_angles(vec_about, l_vecs)
     return [l_objs[i] for i in l_inds]
 
 
@@ -26,12 +26,15 @@ import time
 import random
 import traceback
 import functools
+import threading
 import urllib.request
 from itertools import chain
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
 
 import bpy
 import bgl
+import numpy as np
 # import blf
 from bpy.types import BoolProperty
 from mathutils import Matrix
@@ -39,14 +42,65 @@ from bpy_extras.view3d_utils import location_3d_to_region_2d, region_2d_to_vecto
 from bpy_extras.view3d_utils import region_2d_to_location_3d, region_2d_to_origin_3d
 
 from .decorators import blender_version_wrapper
-from .fontmanager import FontManager as fm
+from .fontmanager import FontManager as fm, FontAdvanceTable
 from .maths import Point2D, Vec2D, Point, Ray, Direction, clamp, mid
 from .profiler import profiler
 from .debug import dprint
 
+from ..ext.bgl_ext import np_array_as_bgl_Buffer, VoidBufValue
+
+
+class LRUCache:
+    '''
+    dict-like cache that holds at most capacity entries, evicting the least
+    recently used entry when full.  hits, misses, and evictions are counted
+    with the profiler (ex: "text size cache hits")
+    '''
+
+    def __init__(self, name, capacity):
+        self.name = name
+        self.capacity = capacity
+        self._data = OrderedDict()
+        self._keys = {k: '%s %s' % (name, k) for k in ['hits', 'misses', 'evictions']}
+
+    def set_capacity(self, capacity):
+        self.capacity = capacity
+        self._evict()
+
+    def _evict(self):
+        while len(self._data) > self.capacity:
+            self._data.popitem(last=False)
+            profiler.count(self._keys['evictions'])
+
+    def get(self, key, default=None):
+        if key not in self._data:
+            profiler.count(self._keys['misses'])
+            return default
+        profiler.count(self._keys['hits'])
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        self._evict()
+        return value
+
+    def clear(self): self._data.clear()
+    def __contains__(self, key): return key in self._data
+    def __len__(self): return len(self._data)
+
 
 class Drawing:
     _instance = None
+
+    # max number of entries kept in the text caches (see LRUCache).
+    # change before first Drawing.get_instance(), or use set_capacity
+    text_cache_capacity = 4096
+
+    # text widths are summed from FontAdvanceTable.  when True, each width is
+    # also measured with blf.dimensions, which is used instead if they differ
+    verify_text_width = False
     _dpi = 72
     _dpi_mult = 1
 
@@ -92,9 +146,18 @@ class Drawing:
         # self.font_id = 0
         self.fontsize = None
         self.fontsize_scaled = None
-        self.line_cache = {}
-        self.size_cache = {}
+        self.line_cache = LRUCache('text line cache', 64)
+        self.size_cache = LRUCache('text size cache', self.text_cache_capacity)
+        self.width_cache = LRUCache('text width cache', self.text_cache_capacity)
+        self.run_cache = LRUCache('text run cache', self.text_cache_capacity)
+        self.advance_tables = LRUCache('text advance tables', 64)
         self.set_font_size(12)
+        # matrix buffers are shared by all shaders, and refilled only when
+        # the view changes (see _update_matrix_buffers)
+        self._matrix_buffers_version = None
+        self._view_matrix_buffer = bgl.Buffer(bgl.GL_FLOAT, [4,4])
+        self._pixel_matrix_buffer = bgl.Buffer(bgl.GL_FLOAT, [4,4])
+        self.batch2d = Batch2D()
 
     def set_region(self, space, rgn, r3d, window):
         self.space = space
@@ -131,17 +194,17 @@ class Drawing:
 
         # cache away useful details about font (line height, line base)
         key = (self.fontsize_scaled)
-        if key not in self.line_cache:
+        info = self.line_cache.get(key)
+        if info is None:
             dprint('Caching new scaled font size:', key)
             all_chars = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!@#$%^&*()`~[}{]/?=+\\|-_\'",<.>'
             all_caps = all_chars.upper()
-            self.line_cache[key] = {
+            info = self.line_cache.put(key, {
                 'line height': round(fm.dimensions(all_chars, fontid=fontid)[1] + self.scale(4)),
                 'line base': round(fm.dimensions(all_caps, fontid=fontid)[1]),
                 # 'line height': round(blf.dimensions(self.font_id, all_chars)[1] + self.scale(4)),
                 # 'line base': round(blf.dimensions(self.font_id, all_caps)[1]),
-            }
-        info = self.line_cache[key]
+            })
         self.line_height = info['line height']
         self.line_base = info['line base']
 
@@ -157,23 +220,50 @@ class Drawing:
         fontid = fm.load(fontid)
         key = (text, self.fontsize_scaled, fontid)
         # key = (text, self.fontsize_scaled, self.font_id)
-        if key not in self.size_cache:
+        d = self.size_cache.get(key)
+        if d is None:
             d = {}
             if not text:
                 d['width'] = 0
                 d['height'] = 0
                 d['line height'] = self.line_height
             else:
-                get_width = lambda t: math.ceil(fm.dimensions(t, fontid=fontid)[0])
                 get_height = lambda t: math.ceil(fm.dimensions(t, fontid=fontid)[1])
-                # get_width = lambda t: math.ceil(blf.dimensions(self.font_id, t)[0])
                 # get_height = lambda t: math.ceil(blf.dimensions(self.font_id, t)[1])
-                d['width'] = max(get_width(l) for l in lines)
+                d['width'] = max(self._get_line_width(l, fontid) for l in lines)
                 d['height'] = get_height(text)
                 d['line height'] = self.line_height * len(lines)
-            self.size_cache[key] = d
+            self.size_cache.put(key, d)
         if fontsize: self.set_font_size(size_prev, fontid=fontid)
-        return self.size_cache[key][item]
+        return d[item]
+
+    def _get_line_width(self, line, fontid):
+        # widths are cached per line, so multiline text reuses entries of its lines
+        key = (line, self.fontsize_scaled, fontid)
+        width = self.width_cache.get(key)
+        if width is None:
+            width = self.width_cache.put(key, self.measure_line_width(line, fontid=fontid))
+        return width
+
+    def measure_line_width(self, line, fontid=None):
+        '''
+        width of single line of text at current font size, summed from glyph
+        advances.  not cached, so use for transient strings (ex: text wrapping)
+        '''
+        fontid = fm.load(fontid)
+        key = (fontid, self.fontsize_scaled)
+        table = self.advance_tables.get(key)
+        if table is None:
+            table = self.advance_tables.put(key, FontAdvanceTable(fontid))
+        width = math.ceil(table.width(line))
+        if self.verify_text_width:
+            actual = math.ceil(fm.dimensions(line, fontid=fontid)[0])
+            # width = math.ceil(blf.dimensions(self.font_id, line)[0])
+            if actual != width:
+                profiler.count('text width mismatches')
+                dprint('Text width mismatch: %d (summed) != %d (blf) for "%s"' % (width, actual, line))
+                width = actual
+        return width
 
     def get_text_width(self, text, fontsize=None):
         return self.get_text_size_info(text, 'width', fontsize=fontsize)
@@ -202,24 +292,41 @@ class Drawing:
         if enable: self.enable_stipple()
         else: self.disable_stipple()
 
-    def text_draw2D(self, text, pos:Point2D, color, dropshadow=None, fontsize=None, fontid=None):
+    def get_text_run(self, text, fontid=None):
+        '''
+        returns laid out text (for current font size) as list of (line, x, y),
+        where (x,y) is offset of line from top-left corner of text.  empty
+        lines are skipped, as they draw nothing.  text can be str or list of
+        lines.  runs are cached, so unchanged text is not laid out every frame
+        '''
+        fontid = fm.load(fontid)
+        lines = tuple(text) if type(text) is list else tuple(str(text).splitlines())
+        key = (lines, self.fontsize_scaled, fontid, self._dpi_mult)
+        run = self.run_cache.get(key)
+        if run is None:
+            lh,lb = self.line_height,self.line_base
+            run = self.run_cache.put(key, [(line, 0, -(i * lh + lb)) for (i,line) in enumerate(lines) if line])
+        return run
+
+    def text_draw2D(self, text, pos:Point2D, color, dropshadow=None, fontsize=None, fontid=None, dropshadow_offset=(1,-1)):
+        self.batch2d.flush()    # text must be drawn over batched primitives
         if fontsize: size_prev = self.set_font_size(fontsize, fontid=fontid)
 
-        lines = str(text).splitlines()
+        run = self.get_text_run(text, fontid=fontid)
         l,t = round(pos[0]),round(pos[1])
-        lh = self.line_height
-        lb = self.line_base
-
-        if dropshadow: self.text_draw2D(text, (l+1,t-1), dropshadow, fontsize=fontsize)
 
         bgl.glEnable(bgl.GL_BLEND)
+        if dropshadow:
+            sl,st = l + dropshadow_offset[0],t + dropshadow_offset[1]
+            bgl.glColor4f(*dropshadow)
+            for (line,x,y) in run:
+                fm.draw(line, xyz=(sl+x, st+y, 0), fontid=fontid)
         bgl.glColor4f(*color)
-        for line in lines:
-            th = self.get_text_height(line)
-            fm.draw(line, xyz=(l, t-lb, 0), fontid=fontid)
-            # blf.position(self.font_id, l, t - lb, 0)
+        for (line,x,y) in run:
+            fm.draw(line, xyz=(l+x, t+y, 0), fontid=fontid)
+            # blf.position(self.font_id, l+x, t+y, 0)
             # blf.draw(self.font_id, line)
-            t -= lh
+        profiler.count('text_draw2D lines', len(run) * (2 if dropshadow else 1))
 
         if fontsize: self.set_font_size(size_prev, fontid=fontid)
 
@@ -262,8 +369,10 @@ class Drawing:
         return Matrix(self.get_pixel_matrix_list()) if self.r3d else None
 
     def get_pixel_matrix_buffer(self):
+        ''' returns shared buffer (do not modify); contents change with view '''
         if not self.r3d: return None
-        return bgl.Buffer(bgl.GL_FLOAT, [4,4], self.get_pixel_matrix_list())
+        self._update_matrix_buffers()
+        return self._pixel_matrix_buffer
 
     def get_view_matrix_list(self):
         return list(self.get_view_matrix()) if self.r3d else None
@@ -272,12 +381,28 @@ class Drawing:
         return self.r3d.perspective_matrix if self.r3d else None
 
     def get_view_version(self):
-        m = self.r3d.view_matrix
-        return [v for r in m for v in r] + [self.space.lens]
+        # changes whenever the view matrix or pixel matrix changes.
+        # perspective_matrix covers view, lens, zoom, offset, and clip range
+        m = self.r3d.perspective_matrix
+        return tuple(v for r in m for v in r) + (self.rgn.width, self.rgn.height)
 
     def get_view_matrix_buffer(self):
+        ''' returns shared buffer (do not modify); contents change with view '''
         if not self.r3d: return None
-        return bgl.Buffer(bgl.GL_FLOAT, [4,4], self.get_view_matrix_list())
+        self._update_matrix_buffers()
+        return self._view_matrix_buffer
+
+    def _update_matrix_buffers(self):
+        version = self.get_view_version()
+        if version == self._matrix_buffers_version:
+            profiler.count('Drawing matrix buffers reused')
+            return
+        self._matrix_buffers_version = version
+        for i,row in enumerate(self.get_view_matrix()):
+            self._view_matrix_buffer[i] = list(row)
+        for i,row in enumerate(self.get_pixel_matrix_list()):
+            self._pixel_matrix_buffer[i] = row
+        profiler.count('Drawing matrix buffers refilled')
 
     def textbox_draw2D(self, text, pos:Point2D, padding=5, textbox_position=7, fontid=None):
         '''
@@ -290,6 +415,7 @@ class Drawing:
                     |1 2 3|
                     +-----+
         '''
+        self.batch2d.flush()
         lh = self.line_height
 
         # TODO: wrap text!
@@ -334,8 +460,10 @@ class Drawing:
             # blf.draw(self.font_id, line)
 
     def glCheckError(self, title):
+        # title can be a function, so it is only formatted when there is an error
         err = bgl.glGetError()
         if err == bgl.GL_NO_ERROR: return
+        if callable(title): title = title()
 
         derrs = {
             bgl.GL_INVALID_ENUM: 'invalid enum',
@@ -461,3 +589,406 @@ class ScissorStack:
         assert ScissorStack.stack, 'Attempting to pop a scissor from empty stack!'
         ScissorStack.stack.pop()
         ScissorStack._set_scissor()
+
+
+class ImageAtlas:
+    '''
+    packs RGBA images (ex: UI icons) into a few shared atlas textures (pages),
+    so images from different UI elements can be drawn with one texture bind.
+    images are placed with simple shelf packing: left to right along shelves
+    that are stacked top to bottom.  the space of a removed image is not
+    reused, but a page whose images are all removed is released (see remove
+    and clear), so only add images that are reused (files, not per-frame data).
+    images that are shared by several holders can be reference counted (see
+    acquire and release), so they are removed once the last holder is gone.
+    clear increments generation, so holders can tell their texture ids are stale.
+
+    pages are uploaded to GL lazily (see upload).  the first upload of a page
+    allocates its texture; later uploads only send the rectangle covering
+    the images added since the previous upload
+    '''
+
+    PAGE_SIZE = 1024
+    PADDING = 1         # transparent pixels around each image to prevent bleeding
+
+    _pages = []         # dicts with: data, texture, allocated, shelves, keys, dirty
+    _entries = {}       # key -> (page index, (u0,v0,u1,v1), width, height)
+    _refs = {}          # key -> number of holders (see acquire)
+    _released = []      # (key, generation) released by holders, but not yet removed
+    _released_lock = threading.Lock()
+    generation = 0      # incremented by clear
+
+    @staticmethod
+    def get_size(key):
+        ''' returns (width, height) of image, or None if key is not in atlas.  does not touch GL '''
+        entry = ImageAtlas._entries.get(key, None)
+        if entry is None: return None
+        return entry[2:]
+
+    @staticmethod
+    def has(key):
+        return key in ImageAtlas._entries
+
+    @staticmethod
+    def get(key):
+        ''' returns (texture id, uvs, width, height), or None if key is not in atlas '''
+        entry = ImageAtlas._entries.get(key, None)
+        if entry is None: return None
+        idx,uvs,w,h = entry
+        return (ImageAtlas._get_texture(idx), uvs, w, h)
+
+    @staticmethod
+    def add(key, image):
+        ''' image is an array-like of shape (height, width, 4) with uint8 RGBA values, top row first '''
+        if key in ImageAtlas._entries: return ImageAtlas.get(key)
+        image = np.asarray(image, dtype=np.uint8)
+        assert image.ndim == 3 and image.shape[2] == 4, 'ImageAtlas expects RGBA images'
+        h,w = image.shape[:2]
+        idx,x,y = ImageAtlas._place(w + 2*ImageAtlas.PADDING, h + 2*ImageAtlas.PADDING)
+        page = ImageAtlas._pages[idx]
+        x,y = x + ImageAtlas.PADDING, y + ImageAtlas.PADDING
+        page['data'][y:y+h, x:x+w] = image
+        page['keys'].add(key)
+        d = page['dirty'] or (x, y, x+w, y+h)
+        page['dirty'] = (min(d[0], x), min(d[1], y), max(d[2], x+w), max(d[3], y+h))
+        ph,pw = page['data'].shape[:2]
+        ImageAtlas._entries[key] = (idx, (x/pw, y/ph, (x+w)/pw, (y+h)/ph), w, h)
+        return ImageAtlas.get(key)
+
+    @staticmethod
+    def remove(key):
+        '''
+        removes image from atlas.  once all images of a page are removed, its
+        texture is deleted and the page is reused (or dropped, if last).
+        texture ids and uvs returned for key must not be used afterwards
+        '''
+        entry = ImageAtlas._entries.pop(key, None)
+        if entry is None: return
+        page = ImageAtlas._pages[entry[0]]
+        page['keys'].discard(key)
+        if page['keys']: return
+        ImageAtlas._release_page(page)
+        # trailing empty pages can be dropped without changing page indices of entries
+        while ImageAtlas._pages and not ImageAtlas._pages[-1]['keys']:
+            ImageAtlas._pages.pop()
+
+    @staticmethod
+    def acquire(key):
+        ''' counts a holder of key, which is removed once every holder has released it '''
+        ImageAtlas._refs[key] = ImageAtlas._refs.get(key, 0) + 1
+
+    @staticmethod
+    def release(key, generation):
+        '''
+        releases a holder of key, acquired while atlas was at generation.
+        safe to call from any thread (ex: __del__), as removal is deferred to
+        the next upload.  releases from before the last clear are ignored
+        '''
+        with ImageAtlas._released_lock:
+            ImageAtlas._released.append((key, generation))
+
+    @staticmethod
+    def _remove_released():
+        with ImageAtlas._released_lock:
+            released,ImageAtlas._released = ImageAtlas._released,[]
+        for key,generation in released:
+            if generation != ImageAtlas.generation: continue
+            count = ImageAtlas._refs.get(key, 0) - 1
+            if count > 0:
+                ImageAtlas._refs[key] = count
+            else:
+                ImageAtlas._refs.pop(key, None)
+                ImageAtlas.remove(key)
+
+    @staticmethod
+    def clear():
+        ''' removes all images and deletes all atlas textures '''
+        for page in ImageAtlas._pages:
+            ImageAtlas._release_page(page)
+        ImageAtlas._pages.clear()
+        ImageAtlas._entries.clear()
+        ImageAtlas._refs.clear()
+        with ImageAtlas._released_lock:
+            ImageAtlas._released.clear()
+        ImageAtlas.generation += 1
+
+    @staticmethod
+    def _new_page(w, h):
+        size = ImageAtlas.PAGE_SIZE
+        return {
+            'data': np.zeros((max(size, h), max(size, w), 4), dtype=np.uint8),
+            'texture': None,
+            'allocated': False,     # texture storage was allocated (glTexImage2D)
+            'shelves': [],          # [top, height, next x]
+            'keys': set(),
+            'dirty': None,          # (x0,y0,x1,y1) rect of data not yet uploaded
+        }
+
+    @staticmethod
+    def _release_page(page):
+        if page['texture'] is not None:
+            bgl.glDeleteTextures(1, bgl.Buffer(bgl.GL_INT, [1], [page['texture']]))
+            profiler.count('ImageAtlas textures deleted')
+        page.update(ImageAtlas._new_page(0, 0))
+
+    @staticmethod
+    def _place(w, h):
+        for idx,page in enumerate(ImageAtlas._pages):
+            pos = ImageAtlas._place_in_page(page, w, h)
+            if pos: return (idx,) + pos
+        # new page.  images larger than PAGE_SIZE get a page of their own
+        ImageAtlas._pages.append(ImageAtlas._new_page(w, h))
+        idx = len(ImageAtlas._pages) - 1
+        return (idx,) + ImageAtlas._place_in_page(ImageAtlas._pages[idx], w, h)
+
+    @staticmethod
+    def _place_in_page(page, w, h):
+        ph,pw = page['data'].shape[:2]
+        if w > pw: return None
+        # use the shortest shelf that fits
+        best = None
+        for shelf in page['shelves']:
+            top,height,x = shelf
+            if height < h or x + w > pw: continue
+            if best is None or height < best[1]: best = shelf
+        if best is None:
+            top = sum(height for (_,height,_) in page['shelves'])
+            if top + h > ph: return None
+            best = [top, h, 0]
+            page['shelves'].append(best)
+        pos = (best[2], best[0])
+        best[2] += w
+        return pos
+
+    @staticmethod
+    def _get_texture(idx):
+        page = ImageAtlas._pages[idx]
+        if page['texture'] is None:
+            texbuffer = bgl.Buffer(bgl.GL_INT, [1])
+            bgl.glGenTextures(1, texbuffer)
+            page['texture'] = texbuffer[0]
+        return page['texture']
+
+    @staticmethod
+    @profiler.profile
+    def upload():
+        ''' uploads newly added images of each page.  called by Batch2D before drawing '''
+        ImageAtlas._remove_released()
+        for idx,page in enumerate(ImageAtlas._pages):
+            if not page['dirty']: continue
+            bgl.glBindTexture(bgl.GL_TEXTURE_2D, ImageAtlas._get_texture(idx))
+            if not page['allocated']:
+                ph,pw = page['data'].shape[:2]
+                bgl.glTexParameterf(bgl.GL_TEXTURE_2D, bgl.GL_TEXTURE_MAG_FILTER, bgl.GL_NEAREST)
+                bgl.glTexParameterf(bgl.GL_TEXTURE_2D, bgl.GL_TEXTURE_MIN_FILTER, bgl.GL_LINEAR)
+                bgl.glTexImage2D(bgl.GL_TEXTURE_2D, 0, bgl.GL_RGBA, pw, ph, 0, bgl.GL_RGBA, bgl.GL_UNSIGNED_BYTE, np_array_as_bgl_Buffer(page['data']))
+                page['allocated'] = True
+                profiler.count('ImageAtlas page uploads')
+            else:
+                x0,y0,x1,y1 = page['dirty']
+                rect = np.ascontiguousarray(page['data'][y0:y1, x0:x1])
+                bgl.glTexSubImage2D(bgl.GL_TEXTURE_2D, 0, x0, y0, x1-x0, y1-y0, bgl.GL_RGBA, bgl.GL_UNSIGNED_BYTE, np_array_as_bgl_Buffer(rect))
+                profiler.count('ImageAtlas partial uploads')
+            bgl.glBindTexture(bgl.GL_TEXTURE_2D, 0)
+            page['dirty'] = None
+
+
+class Batch2D:
+    '''
+    collects 2D primitives (colored quads, triangles, lines, and textured
+    quads) in region pixel coordinates, and draws them with one vertex
+    buffer and a few draw calls when flushed.  primitives are drawn in the
+    order they were added.  consecutive primitives with the same GL type,
+    line width, texture, and ScissorStack clip share a draw call.
+
+    anything that is drawn directly (ex: text) must flush the batch first,
+    so it is drawn on top of the primitives added before it
+    '''
+
+    # per vertex: x, y, r, g, b, a, u, v, texture weight
+    VERTEX_SIZE = 9
+
+    def __init__(self):
+        self.data = []
+        self.calls = []         # [(gltype, line width, texture, scissor), first, count]
+        self.shader = None
+        self.vbo = None
+        self.matrix_size = None
+        self.matrix_buffer = bgl.Buffer(bgl.GL_FLOAT, [4,4])
+
+    def _add(self, gltype, verts, width=1.0, texture=0):
+        ''' verts: list of (x, y, color, uv) where uv is None for untextured '''
+        scissor = ScissorStack.stack[-1] if ScissorStack.started else None
+        key = (gltype, width, texture, scissor)
+        if self.calls and self.calls[-1][0] == key:
+            self.calls[-1][2] += len(verts)
+        else:
+            self.calls.append([key, len(self.data) // self.VERTEX_SIZE, len(verts)])
+        for (x,y,c,uv) in verts:
+            self.data.extend((x, y, c[0], c[1], c[2], c[3]))
+            self.data.extend((0.0, 0.0, 0.0) if uv is None else (uv[0], uv[1], 1.0))
+
+    def triangle(self, p0, p1, p2, color):
+        self._add(bgl.GL_TRIANGLES, [(p0[0],p0[1],color,None), (p1[0],p1[1],color,None), (p2[0],p2[1],color,None)])
+
+    def quad(self, p0, p1, p2, p3, colors):
+        ''' quad with corners p0..p3 (in order around quad), colors is one color or one per corner '''
+        if len(colors) != 4 or not hasattr(colors[0], '__len__'): colors = [colors] * 4
+        v = [(p[0],p[1],c,None) for (p,c) in zip((p0,p1,p2,p3), colors)]
+        self._add(bgl.GL_TRIANGLES, [v[0], v[1], v[2], v[0], v[2], v[3]])
+
+    def rect(self, l, t, w, h, color):
+        ''' filled rectangle with top-left corner (l,t) '''
+        self.quad((l,t), (l,t-h), (l+w,t-h), (l+w,t), color)
+
+    def image(self, l, t, w, h, texture, uvs=(0,0,1,1), color=(1,1,1,1)):
+        ''' textured rectangle.  uvs are texture coordinates (u0,v0,u1,v1) of top-left and bottom-right corners '''
+        u0,v0,u1,v1 = uvs
+        v = [(l,t,color,(u0,v0)), (l,t-h,color,(u0,v1)), (l+w,t-h,color,(u1,v1)), (l+w,t,color,(u1,v0))]
+        self._add(bgl.GL_TRIANGLES, [v[0], v[1], v[2], v[0], v[2], v[3]], texture=texture)
+
+    def line_strip(self, points, color, width=1.0):
+        ''' connected lines through points.  width is unscaled (see Drawing.line_width) '''
+        width = max(1, Drawing.get_instance().scale(width))
+        verts = []
+        for (p0,p1) in zip(points[:-1], points[1:]):
+            verts += [(p0[0],p0[1],color,None), (p1[0],p1[1],color,None)]
+        self._add(bgl.GL_LINES, verts, width=width)
+
+    def line(self, p0, p1, color, width=1.0):
+        self.line_strip([p0, p1], color, width=width)
+
+    def rect_outline(self, l, t, w, h, color, width=1.0):
+        self.line_strip([(l,t), (l,t-h), (l+w,t-h), (l+w,t), (l,t)], color, width=width)
+
+    def _get_matrix(self):
+        # maps region pixels to clip space (same as Drawing.get_pixel_matrix_list)
+        rgn = bpy.context.region
+        size = (rgn.width, rgn.height)
+        if self.matrix_size != size:
+            w,h = size
+            for i,row in enumerate([[2/w,0,0,-1], [0,2/h,0,-1], [0,0,1,0], [0,0,0,1]]):
+                self.matrix_buffer[i] = row
+            self.matrix_size = size
+        return self.matrix_buffer
+
+    def _init_gl(self):
+        from .shaders import Shader     # shaders imports this module
+        self.shader = Shader.load_from_file('ui2dShader', 'ui2d.glsl', checkErrors=False)
+        vbo = bgl.Buffer(bgl.GL_INT, 1)
+        bgl.glGenBuffers(1, vbo)
+        self.vbo = vbo[0]
+        self.ptrs = [VoidBufValue(0), VoidBufValue(2*4), VoidBufValue(6*4)]
+
+    @profiler.profile
+    def flush(self):
+        if not self.calls: return
+        if self.shader is None: self._init_gl()
+        calls,data = self.calls,np.array(self.data, dtype=np.float32)
+        self.calls,self.data = [],[]
+
+        ImageAtlas.upload()
+
+        shader,stride = self.shader,self.VERTEX_SIZE * 4
+        bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, self.vbo)
+        bgl.glBufferData(bgl.GL_ARRAY_BUFFER, data.nbytes, np_array_as_bgl_Buffer(data), bgl.GL_STREAM_DRAW)
+        bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, 0)
+
+        # 2D overlay: blended, and never hidden by depth of 3D drawing (ex: draw_darken)
+        bgl.glPushAttrib(bgl.GL_ENABLE_BIT)
+        bgl.glEnable(bgl.GL_BLEND)
+        bgl.glDisable(bgl.GL_DEPTH_TEST)
+        shader.enable()
+        shader.assign('matrix_pixel', self._get_matrix())
+        shader.vertexAttribPointer(self.vbo, 'vert_pos',   2, bgl.GL_FLOAT, stride=stride, buf=self.ptrs[0].buf)
+        shader.vertexAttribPointer(self.vbo, 'vert_color', 4, bgl.GL_FLOAT, stride=stride, buf=self.ptrs[1].buf)
+        shader.vertexAttribPointer(self.vbo, 'vert_tex',   3, bgl.GL_FLOAT, stride=stride, buf=self.ptrs[2].buf)
+        # scissor test is set for each call, as calls added outside ScissorStack (scissor None) are not clipped
+        cur_scissor,cur_width,cur_texture = False,None,0
+        for ((gltype, width, texture, scissor), first, count) in calls:
+            if scissor != cur_scissor:
+                if scissor is None:
+                    bgl.glDisable(bgl.GL_SCISSOR_TEST)
+                else:
+                    if not cur_scissor: bgl.glEnable(bgl.GL_SCISSOR_TEST)
+                    bgl.glScissor(*scissor)
+                cur_scissor = scissor
+            if gltype == bgl.GL_LINES and width != cur_width:
+                bgl.glLineWidth(width)
+                cur_width = width
+            if texture != cur_texture:
+                bgl.glBindTexture(bgl.GL_TEXTURE_2D, texture)
+                cur_texture = texture
+            bgl.glDrawArrays(gltype, first, count)
+        if cur_texture: bgl.glBindTexture(bgl.GL_TEXTURE_2D, 0)
+        shader.disableVertexAttribArray('vert_pos')
+        shader.disableVertexAttribArray('vert_color')
+        shader.disableVertexAttribArray('vert_tex')
+        shader.disable()
+        bgl.glPopAttrib()       # restores scissor test state
+        if ScissorStack.started and any(key[3] for (key,_,_) in calls): ScissorStack._set_scissor()
+
+        profiler.count('Batch2D draw calls', len(calls))
+        profiler.count('Batch2D vertices', len(data) // self.VERTEX_SIZE)
+
+
+def benchmark_text_width(paths=None, fontsize=12, wrap_width=600, fontid=None):
+    '''
+    wraps the paragraphs of Markdown files (default: help pages of add-on)
+    like UI_WrappedLabel.predraw, once measuring each candidate line with
+    blf.dimensions and once with FontAdvanceTable.  prints blf.dimensions
+    calls, time, and lines that wrap differently.  run inside Blender
+    '''
+    if paths is None:
+        # help folder of the add-on that addon_common is nested in
+        path_help = os.path.join(os.path.dirname(__file__), '..', '..', 'help')
+        paths = [os.path.join(path_help, fn) for fn in sorted(os.listdir(path_help)) if fn.endswith('.md')]
+    drawing = Drawing.get_instance()
+    size_prev = drawing.set_font_size(fontsize, fontid=fontid)
+    mwidth = drawing.scale(wrap_width)
+
+    paras = []
+    for path in paths:
+        text = open(path, 'rt').read()
+        paras += [re.sub(r'\s*\n\s*', ' ', p.strip()) for p in re.split(r'\n\s*\n', text) if p.strip()]
+
+    def wrap(para, width):
+        lines,line = [],[]
+        for word in para.split(' '):
+            nline = line + [word]
+            if line and width(' '.join(nline)) >= mwidth:
+                lines.append(' '.join(line))
+                line = [word]
+            else:
+                line = nline
+        lines.append(' '.join(line))
+        return lines
+
+    # count calls to blf.dimensions (FontAdvanceTable measures through fm.dimensions)
+    calls = [0]
+    fm_dimensions = fm.dimensions
+    def counted_dimensions(*args, **kwargs):
+        calls[0] += 1
+        return fm_dimensions(*args, **kwargs)
+
+    methods = [
+        ('blf.dimensions', lambda t: math.ceil(fm.dimensions(t, fontid=fontid)[0])),
+        ('advance table', lambda t: drawing.measure_line_width(t, fontid=fontid)),
+    ]
+    results = {}
+    fm.dimensions = staticmethod(counted_dimensions)
+    try:
+        drawing.advance_tables.clear()
+        for name,width in methods:
+            calls[0] = 0
+            tstart = time.time()
+            results[name] = [wrap(p, width) for p in paras]
+            print('%-16s %8.2fms  %6d blf.dimensions calls' % (name, (time.time() - tstart) * 1000, calls[0]))
+    finally:
+        fm.dimensions = fm_dimensions
+        drawing.set_font_size(size_prev, fontid=fontid)
+
+    a,b = results['blf.dimensions'],results['advance table']
+    diff = sum(1 for (la,lb) in zip(a,b) if la != lb)
+    print('%d paragraphs, %d lines, %d paragraphs wrap differently' % (len(paras), sum(len(l) for l in a), diff))
+    return results
@@ -30,6 +30,7 @@ from .debug import dprint
 class FontManager:
     _cache = {}
     _last_fontid = 0
+    _kerning = set()    # fontids with KERNING_DEFAULT enabled (blf cannot be queried)
     _prefs = bpy.context.user_preferences
 
     @staticmethod
@@ -92,7 +93,9 @@ class FontManager:
 
     @staticmethod
     def disable(option, fontid=None):
-        return blf.disable(FontManager.load(fontid), option)
+        fontid = FontManager.load(fontid)
+        if option == blf.KERNING_DEFAULT: FontManager._kerning.discard(fontid)
+        return blf.disable(fontid, option)
 
     @staticmethod
     def disable_rotation(fontid=None):
@@ -109,7 +112,7 @@ class FontManager:
     @staticmethod
     def disable_kerning_default(fontid=None):
         # note: not a listed option in docs for `blf.disable`, but see `blf.word_wrap`
-        return blf.disable(FontManager.load(fontid), blf.KERNING_DEFAULT)
+        return FontManager.disable(blf.KERNING_DEFAULT, fontid=fontid)
 
     @staticmethod
     def disable_word_wrap(fontid=None):
@@ -124,7 +127,9 @@ class FontManager:
 
     @staticmethod
     def enable(option, fontid=None):
-        return blf.enable(FontManager.load(fontid), option)
+        fontid = FontManager.load(fontid)
+        if option == blf.KERNING_DEFAULT: FontManager._kerning.add(fontid)
+        return blf.enable(fontid, option)
 
     @staticmethod
     def enable_rotation(fontid=None):
@@ -140,7 +145,11 @@ class FontManager:
 
     @staticmethod
     def enable_kerning_default(fontid=None):
-        return blf.enable(FontManager.load(fontid), blf.KERNING_DEFAULT)
+        return FontManager.enable(blf.KERNING_DEFAULT, fontid=fontid)
+
+    @staticmethod
+    def is_kerning_default(fontid=None):
+        return FontManager.load(fontid) in FontManager._kerning
 
     @staticmethod
     def enable_word_wrap(fontid=None):
@@ -173,3 +182,57 @@ class FontManager:
         return blf.word_wrap(FontManager.load(fontid), wrap_width)
 
 
+class FontAdvanceTable:
+    '''
+    advance widths of glyphs (and kerning pairs, if kerning is enabled) of a
+    font at one size, so the width of a string can be computed by summing
+    instead of calling blf.dimensions on it.
+
+    blf does not expose glyph metrics, so they are measured once with
+    blf.dimensions by placing each glyph between two 'x' glyphs.  blf must be
+    set to the size of this table whenever a glyph or pair is first measured
+    '''
+
+    # measured when table is created; other glyphs are measured when first seen
+    prefill = ''.join(chr(c) for c in range(32, 127))
+
+    def __init__(self, fontid=None):
+        self.fontid = FontManager.load(fontid)
+        self.kerning = FontManager.is_kerning_default(self.fontid)
+        self.advances = {}      # glyph -> advance width
+        self.rights = {}        # glyph -> right ink edge, relative to pen
+        self.lefts = {}         # glyph -> left ink edge, relative to pen
+        self.kerns = {}         # pair of glyphs -> kerning adjustment
+        dim = lambda t: FontManager.dimensions(t, fontid=self.fontid)[0]
+        self._dim = dim
+        self._xx = dim('xx')
+        self._x = dim('x')
+        self._x_advance = dim('xxx') - self._xx
+        for c in self.prefill: self._measure(c)
+
+    def _measure(self, c):
+        dim = self._dim
+        advance = dim('x%sx' % c) - self._xx
+        self.advances[c] = advance
+        self.rights[c] = dim('x%s' % c) - self._x_advance
+        self.lefts[c] = advance + self._x - dim('%sx' % c)
+
+    def _kern(self, pair):
+        k = self.kerns.get(pair, None)
+        if k is None:
+            a,b = pair
+            k = self._dim('x%sx' % pair) - self._xx - self.advances[a] - self.advances[b]
+            self.kerns[pair] = k
+        return k
+
+    def width(self, text):
+        ''' width of single line of text, matching blf.dimensions (leading and trailing spaces have no ink) '''
+        text = text.strip(' ')
+        if not text: return 0
+        advances = self.advances
+        for c in text:
+            if c not in advances: self._measure(c)
+        w = sum(advances[c] for c in text[:-1]) + self.rights[text[-1]] - self.lefts[text[0]]
+        if self.kerning:
+            w += sum(self._kern(text[i:i+2]) for i in range(len(text) - 1))
+        return w
@@ -0,0 +1,744 @@
+'''
+Copyright (C) 2018 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import numpy as np
+
+from .profiler import profiler
+
+
+'''
+Array-native versions of the geometry routines found in maths.py and
+debug.py, shared by maths, bezier and xmesh.
+
+Each kernel works on whole NumPy arrays at once rather than one primitive
+at a time, so it can be called on every vertex / triangle / segment of a
+mesh without looping in Python.  The scalar versions in maths.py remain
+the reference implementations.
+'''
+
+
+def float_dtype(a):
+    '''
+    returns the float dtype a kernel should compute in for input a.
+    float32 inputs stay float32 (ex: data pulled from bgl buffers or
+    foreach_get), everything else is computed in float64.
+    '''
+    return np.float32 if getattr(a, 'dtype', None) == np.float32 else np.float64
+
+
+def as_array(points, dims=None, dtype=None):
+    '''
+    converts a list of Vectors / tuples (or an existing array) into an
+    array of shape (..., dims).  if dtype is not given, the dtype is chosen
+    by float_dtype.  existing arrays of the right dtype are not copied.
+    '''
+    a = np.asarray(points, dtype=dtype or float_dtype(points))
+    if dims is not None and a.shape[-1] != dims:
+        a = a[..., :dims]
+    return a
+
+
+def as_vectors(a, cls):
+    ''' converts rows of array a into instances of cls (ex: Point) '''
+    return [cls(row) for row in a.tolist()]
+
+
+###############################################################################
+# scalar helpers
+
+
+def clamp(v, min_v, max_v):
+    ''' element-wise version of maths.clamp '''
+    return np.minimum(max_v, np.maximum(min_v, v))
+
+
+def mid(v0, v1, v2):
+    ''' element-wise version of maths.mid (median of three values) '''
+    return np.maximum(np.minimum(v0, v1), np.minimum(np.maximum(v0, v1), v2))
+
+
+def index_runs(indices, gap=0):
+    '''
+    coalesces sorted, unique indices into half-open (start, end) runs.
+    runs separated by at most gap missing indices are merged into one.
+    '''
+    indices = np.asarray(indices, dtype=np.int64)
+    if len(indices) == 0:
+        return []
+    breaks = np.nonzero(np.diff(indices) > gap + 1)[0]
+    starts = np.concatenate((indices[:1], indices[breaks + 1]))
+    ends = np.concatenate((indices[breaks] + 1, indices[-1:] + 1))
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+###############################################################################
+# points and paths
+
+
+def transform_points(mx, coords):
+    ''' applies 4x4 matrix mx to (N,3) coords '''
+    coords = as_array(coords, dims=3)
+    mx = np.asarray(mx, dtype=coords.dtype)
+    return coords @ mx[:3, :3].T + mx[:3, 3]
+
+
+def distances(coords, point):
+    ''' returns (N,) distances from each of coords to point '''
+    coords = as_array(coords)
+    return np.linalg.norm(coords - np.asarray(point, dtype=coords.dtype), axis=-1)
+
+
+def path_segment_lengths(verts, cyclic=False):
+    ''' returns lengths of each segment of path verts (N,D) '''
+    verts = as_array(verts)
+    if len(verts) < 2:
+        return np.zeros(0, dtype=verts.dtype)
+    if cyclic:
+        verts = np.concatenate((verts, verts[:1]))
+    return np.linalg.norm(np.diff(verts, axis=0), axis=1)
+
+
+def path_cumulative_lengths(verts, cyclic=False):
+    ''' returns cumulative lengths along path verts, starting with 0 '''
+    lengths = path_segment_lengths(verts, cyclic=cyclic)
+    return np.concatenate((np.zeros(1, dtype=lengths.dtype), np.cumsum(lengths)))
+
+
+def get_path_length(verts, cyclic=False):
+    ''' batched version of maths.get_path_length '''
+    return float(path_segment_lengths(verts, cyclic=cyclic).sum())
+
+
+def closest_t_and_distance_points_to_segments(points, p0, p1):
+    '''
+    batched version of debug.closest_t_and_distance_point_to_line_segment.
+    points, p0, p1 broadcast against each other (ex: (N,3) points against a
+    single segment, or (N,3) points against (N,3) segments).
+    returns ((N,) t in [0,1], (N,) distances)
+    '''
+    points = as_array(points)
+    p0 = np.asarray(p0, dtype=points.dtype)
+    p1 = np.asarray(p1, dtype=points.dtype)
+    v01, v0p = p1 - p0, points - p0
+    l2 = np.sum(v01 * v01, axis=-1)
+    safe = np.where(l2 > 0, l2, 1)
+    t = np.where(l2 > 0, np.clip(np.sum(v0p * v01, axis=-1) / safe, 0, 1), 0)
+    closest = p0 + v01 * t[..., None]
+    return t, np.linalg.norm(points - closest, axis=-1)
+
+
+def triangles_area(tris):
+    ''' returns (N,) areas of (N,3,3) triangles (batched maths.triangle2D_area for 3D) '''
+    tris = as_array(tris)
+    if tris.shape[-1] == 2:
+        return triangles2D_area(tris)
+    c = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    return np.linalg.norm(c, axis=1) / 2
+
+
+###############################################################################
+# angles
+
+
+def vector_angles_between(v0, vecs, vcross):
+    '''
+    batched version of debug.vector_angle_between.
+    returns (N,) angles in [0, 2pi) from v0 to each of (N,3) vecs about vcross
+    '''
+    vecs = as_array(vecs, dims=3)
+    v0 = np.asarray(v0, dtype=vecs.dtype)
+    vcross = np.asarray(vcross, dtype=vecs.dtype)
+    lens = np.linalg.norm(vecs, axis=1) * np.linalg.norm(v0)
+    cos = np.clip((vecs @ v0) / np.where(lens > 0, lens, 1), -1, 1)
+    a = np.arccos(cos)
+    d = np.cross(v0, vecs) @ vcross
+    return np.where(d < 0, a, 2 * np.pi - a)
+
+
+def _angle_frame(vec_about, v0):
+    '''
+    builds orthonormal (x, y) spanning the plane perpendicular to vec_about,
+    with x along v0 projected into that plane.  y is oriented so angles
+    increase in the same direction as debug.vector_angle_between.
+    '''
+    axis = vec_about / max(np.linalg.norm(vec_about), 0.00000001)
+    x = v0 - axis * np.dot(v0, axis)
+    lx = np.linalg.norm(x)
+    if lx < 0.00000001:
+        # v0 is parallel to axis; any perpendicular direction will do
+        x = np.cross(axis, (1, 0, 0) if abs(axis[0]) < 0.9 else (0, 1, 0))
+        lx = np.linalg.norm(x)
+    x = x / lx
+    return x, np.cross(x, axis)
+
+
+def angles_about(vec_about, vecs):
+    '''
+    returns (N,) angles of (N,3) vecs around vec_about, measured from
+    vecs[0].  vecs are projected into the plane perpendicular to vec_about
+    and the angles are computed with arctan2 in that frame.
+    like debug.vector_angle_between, vecs (other than vecs[0]) pointing
+    along vecs[0] are at 2pi, not 0, so angles are in (0, 2pi] after vecs[0]
+    '''
+    vecs = as_array(vecs, dims=3)
+    if not len(vecs):
+        return np.zeros(0, dtype=vecs.dtype)
+    x, y = _angle_frame(np.asarray(vec_about, dtype=vecs.dtype), vecs[0])
+    angles = np.mod(np.arctan2(vecs @ y, vecs @ x), 2 * np.pi)
+    angles[angles < 0.00000001] = 2 * np.pi
+    angles[0] = 0
+    return angles
+
+
+def delta_angles(vec_about, vecs):
+    '''
+    batched version of maths.delta_angles.
+    returns forward differences of the angles of (N,3) vecs about vec_about,
+    with the last entry wrapping back around to the first (sums to 2pi)
+    '''
+    angles = angles_about(vec_about, vecs)
+    if not len(angles):
+        return angles
+    return np.append(np.diff(angles), 2 * np.pi - angles[-1])
+
+
+def sort_by_angles(vec_about, vecs):
+    '''
+    returns indices that order (N,3) vecs by angle around vec_about,
+    starting with vecs[0] (see debug.sort_objects_by_angles)
+    '''
+    return np.argsort(angles_about(vec_about, vecs), kind='stable')
+
+
+###############################################################################
+# curves
+
+
+def cubic_bezier_points(p0, p1, p2, p3, ts):
+    ''' evaluates cubic bezier with control points p0..p3 at each of ts '''
+    cps = [as_array(p) for p in (p0, p1, p2, p3)]
+    ts = np.asarray(ts, dtype=cps[0].dtype)[:, None]
+    t0, t1 = ts, 1 - ts
+    return (
+        cps[0] * t1**3 + cps[1] * (3 * t0 * t1**2) +
+        cps[2] * (3 * t0**2 * t1) + cps[3] * t0**3
+    )
+
+
+###############################################################################
+# broad-phase
+
+
+def _aabb_overlap_candidates(mins, maxs, max_candidates=1 << 22):
+    '''
+    sweep-and-prune over the x-axis.  yields blocks of (i, j) index arrays
+    (into the x-sorted order) of boxes whose x extents overlap, with i < j.
+    blocks are limited to roughly max_candidates pairs to bound memory.
+    '''
+    n = len(mins)
+    sx = mins[:, 0]
+    ends = np.searchsorted(sx, maxs[:, 0], side='right')
+    starts = np.arange(1, n + 1)
+    counts = np.maximum(ends - starts, 0)
+    cumul = np.cumsum(counts)
+    i0 = 0
+    while i0 < n:
+        base = cumul[i0 - 1] if i0 else 0
+        i1 = int(np.searchsorted(cumul, base + max_candidates, side='right'))
+        i1 = max(i0 + 1, min(n, i1))
+        c = counts[i0:i1]
+        total = int(c.sum())
+        if total:
+            ii = np.repeat(np.arange(i0, i1), c)
+            offsets = np.arange(total) - np.repeat(np.cumsum(c) - c, c)
+            jj = starts[ii] + offsets
+            yield ii, jj
+        i0 = i1
+
+
+@profiler.profile
+def aabb2D_overlap_pairs(mins, maxs):
+    '''
+    returns (M,2) array of index pairs (i < j) whose 2D axis-aligned
+    bounding boxes overlap (touching counts as overlapping)
+    '''
+    mins, maxs = np.asarray(mins), np.asarray(maxs)
+    order = np.argsort(mins[:, 0], kind='stable')
+    smins, smaxs = mins[order], maxs[order]
+    found = []
+    for ii, jj in _aabb_overlap_candidates(smins, smaxs):
+        keep = (smins[jj, 1] <= smaxs[ii, 1]) & (smins[ii, 1] <= smaxs[jj, 1])
+        oi, oj = order[ii[keep]], order[jj[keep]]
+        found.append(np.stack((np.minimum(oi, oj), np.maximum(oi, oj)), axis=1))
+    if not found:
+        return np.zeros((0, 2), dtype=np.intp)
+    return np.concatenate(found)
+
+
+def _drop_pairs_sharing_indices(pairs, indices):
+    if indices is None or not len(pairs):
+        return pairs
+    indices = np.asarray(indices)
+    ia, ib = indices[pairs[:, 0]], indices[pairs[:, 1]]
+    shared = np.any(ia[:, :, None] == ib[:, None, :], axis=(1, 2))
+    return pairs[~shared]
+
+
+###############################################################################
+# triangles
+
+
+def triangles2D_det(p0, p1, p2):
+    ''' batched version of maths.triangle2D_det over arrays of shape (..., 2) '''
+    return (
+        p0[..., 0] * (p1[..., 1] - p2[..., 1]) +
+        p1[..., 0] * (p2[..., 1] - p0[..., 1]) +
+        p2[..., 0] * (p0[..., 1] - p1[..., 1])
+    )
+
+
+def triangles2D_area(tris):
+    ''' returns (N,) unsigned areas of (N,3,2) triangles '''
+    tris = as_array(tris, dims=2)
+    return np.abs(triangles2D_det(tris[:, 0], tris[:, 1], tris[:, 2])) / 2
+
+
+def _triangles2D_separated(tris0, tris1, eps):
+    sep = np.zeros(len(tris0), dtype=bool)
+    for i0, i1 in ((0, 1), (1, 2), (2, 0)):
+        e0, e1 = tris0[:, None, i0], tris0[:, None, i1]
+        sep |= np.all(triangles2D_det(e0, e1, tris1) <= eps, axis=1)
+    return sep
+
+
+def triangles2D_overlap(tris0, tris1, eps=0.0):
+    '''
+    element-wise batched version of maths.triangle2D_overlap.
+    tris0 and tris1 are (N,3,2) arrays of counter-clockwise triangles.
+    returns (N,) bool array, True where tris0[i] overlaps tris1[i].
+    '''
+    tris0, tris1 = as_array(tris0, dims=2), as_array(tris1, dims=2)
+    h0 = _triangles2D_separated(tris0, tris1, eps)
+    h1 = _triangles2D_separated(tris1, tris0, eps)
+    return ~(h0 | h1)
+
+
+@profiler.profile
+def triangles2D_overlap_pairs(tris, eps=0.0, indices=None):
+    '''
+    finds all pairs of overlapping triangles among (N,3,2) tris in one call.
+    if indices ((N,3) vertex indices) is given, pairs of triangles that
+    share a vertex are ignored (ex: neighboring faces of a patch).
+    returns (M,2) array of triangle index pairs (i < j).
+    '''
+    tris = as_array(tris, dims=2)
+    if len(tris) < 2:
+        return np.zeros((0, 2), dtype=np.intp)
+    pairs = aabb2D_overlap_pairs(tris.min(axis=1), tris.max(axis=1))
+    pairs = _drop_pairs_sharing_indices(pairs, indices)
+    if not len(pairs):
+        return pairs
+    hit = triangles2D_overlap(tris[pairs[:, 0]], tris[pairs[:, 1]], eps=eps)
+    return pairs[hit]
+
+
+###############################################################################
+# segments
+
+
+def segments2D_intersection(a0, a1, b0, b1, eps=0.0000001):
+    '''
+    element-wise intersection of 2D segments a0-a1 and b0-b1, each (N,2).
+    unlike maths.segment2D_intersection, the intersection must lie on both
+    segments.  returns ((N,2) points, (N,) bool mask); points where mask is
+    False are undefined.
+    '''
+    a0, a1 = as_array(a0, dims=2), as_array(a1, dims=2)
+    b0, b1 = as_array(b0, dims=2), as_array(b1, dims=2)
+    da, db, dab = a1 - a0, b1 - b0, b0 - a0
+    denom = da[:, 0] * db[:, 1] - da[:, 1] * db[:, 0]
+    good = np.abs(denom) > eps
+    safe = np.where(good, denom, 1.0)
+    t = (dab[:, 0] * db[:, 1] - dab[:, 1] * db[:, 0]) / safe
+    u = (dab[:, 0] * da[:, 1] - dab[:, 1] * da[:, 0]) / safe
+    mask = good & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    return a0 + da * t[:, None], mask
+
+
+@profiler.profile
+def segments2D_intersection_pairs(segs, indices=None):
+    '''
+    finds all pairs of intersecting segments among (N,2,2) segs in one call.
+    if indices ((N,2) vertex indices) is given, pairs of segments that share
+    a vertex are ignored (ex: consecutive edges of a loop).
+    returns ((M,2) segment index pairs (i < j), (M,2) intersection points).
+    '''
+    segs = as_array(segs, dims=2)
+    if len(segs) < 2:
+        return np.zeros((0, 2), dtype=np.intp), np.zeros((0, 2))
+    pairs = aabb2D_overlap_pairs(segs.min(axis=1), segs.max(axis=1))
+    pairs = _drop_pairs_sharing_indices(pairs, indices)
+    sa, sb = segs[pairs[:, 0]], segs[pairs[:, 1]]
+    points, hit = segments2D_intersection(sa[:, 0], sa[:, 1], sb[:, 0], sb[:, 1])
+    return pairs[hit], points[hit]
+
+
+###############################################################################
+# loops
+
+
+def points2D_inside_loop(loop, points):
+    '''
+    batched version of debug.point_inside_loop2d using the even-odd rule.
+    loop is (L,2), points is (N,2).  returns (N,) bool array.
+    '''
+    loop, points = as_array(loop, dims=2), as_array(points, dims=2)
+    inside = np.zeros(len(points), dtype=bool)
+    if len(loop) < 3:
+        return inside
+    px, py = points[:, 0, None], points[:, 1, None]
+    ax, ay = np.roll(loop[:, 0], 1), np.roll(loop[:, 1], 1)
+    bx, by = loop[:, 0], loop[:, 1]
+    straddle = (ay > py) != (by > py)
+    dy = np.where(by == ay, 1.0, by - ay)
+    xcross = ax + (py - ay) * (bx - ax) / dy
+    crossings = np.count_nonzero(straddle & (px < xcross), axis=1)
+    return (crossings % 2) == 1
+
+
+###############################################################################
+# planes
+
+
+@profiler.profile
+def plane_slice_triangles(o, n, coords, tris, eps=0.000001):
+    '''
+    slices a triangle mesh by the plane (o, n).
+    coords is (V,3) vertex positions, tris is (T,3) vertex indices.
+    vertices within eps of the plane are treated as being in front of it,
+    so each crossed triangle contributes exactly one segment.
+
+    returns list of ((K,3) points, cyclic) polylines, ordered along the
+    cross-section.  cyclic is False only where the slice runs off an open
+    boundary of the mesh.
+    '''
+    coords = as_array(coords, dims=3)
+    tris = np.asarray(tris, dtype=np.intp).reshape(-1, 3)
+    if not len(coords) or not len(tris):
+        return []
+    nv = len(coords)
+    o, n = as_array(o, dims=3, dtype=coords.dtype), as_array(n, dims=3, dtype=coords.dtype)
+    dists = (coords - o) @ n
+    front = dists > -eps
+
+    # find all edges that cross the plane, keyed so shared edges match
+    edges = tris[:, [[0, 1], [1, 2], [2, 0]]]
+    crossing = front[edges[..., 0]] != front[edges[..., 1]]
+    if not crossing.any():
+        return []
+    ev = np.sort(edges[crossing], axis=1)
+    keys, segs = np.unique(ev[:, 0] * nv + ev[:, 1], return_inverse=True)
+    segs = segs.reshape(-1, 2)
+
+    # compute crossing point for each unique edge
+    v0, v1 = keys // nv, keys % nv
+    d0, d1 = dists[v0], dists[v1]
+    t = np.clip(d0 / (d0 - d1), 0.0, 1.0)
+    points = coords[v0] + (coords[v1] - coords[v0]) * t[:, None]
+
+    # walk the segments into ordered polylines
+    adj = [[] for _ in range(len(keys))]
+    for s, (a, b) in enumerate(segs.tolist()):
+        adj[a].append((b, s))
+        adj[b].append((a, s))
+    used = [False] * len(segs)
+
+    def walk(cur):
+        path = [cur]
+        while True:
+            for nxt, s in adj[cur]:
+                if not used[s]: break
+            else:
+                return path
+            used[s] = True
+            path.append(nxt)
+            cur = nxt
+
+    polylines = []
+    ends = [i for (i, a) in enumerate(adj) if len(a) == 1]
+    for start in ends + list(range(len(adj))):
+        if all(used[s] for (_, s) in adj[start]): continue
+        path = walk(start)
+        cyclic = len(path) > 2 and path[0] == path[-1]
+        if cyclic: path = path[:-1]
+        polylines.append((points[path], cyclic))
+    return polylines
+
+
+###############################################################################
+# spatial chunking, level of detail, and view culling
+
+
+def grid_partition(points, max_per_cell):
+    '''
+    buckets points into a uniform grid over their bounds, sized so that
+    cells hold about max_per_cell points on average.
+    returns (order, starts, ends): points[order] are sorted by cell, and
+    the i-th non-empty cell holds points[order][starts[i]:ends[i]]
+    '''
+    points = as_array(points, dims=3)
+    n = len(points)
+    if n == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty, empty
+    mn = points.min(axis=0)
+    ext = points.max(axis=0) - mn
+    ncells = int(np.ceil(n / max(1, max_per_cell)))
+    used = ext > 0
+    divs = np.ones(3, dtype=np.int64)
+    if ncells > 1 and used.any():
+        size = (np.prod(ext[used]) / ncells) ** (1.0 / used.sum())
+        divs[used] = np.maximum(1, np.ceil(ext[used] / size))
+    cell = ((points - mn) / np.where(used, ext, 1) * divs).astype(np.int64)
+    cell = np.minimum(cell, divs - 1)
+    cids = (cell[:, 0] * divs[1] + cell[:, 1]) * divs[2] + cell[:, 2]
+    order = np.argsort(cids, kind='stable')
+    cids = cids[order]
+    starts = np.flatnonzero(np.r_[True, cids[1:] != cids[:-1]])
+    ends = np.r_[starts[1:], n]
+    return order, starts, ends
+
+
+@profiler.profile
+def cluster_decimate(coords, prim_size, starts, ends, resolution=8):
+    '''
+    decimates primitives (prim_size 1, 2, 3: points, lines, triangles) by
+    vertex clustering, independently for each chunk of primitives
+    [starts[i], ends[i]).  coords holds prim_size vertices per primitive.
+
+    vertices are snapped to a resolution^3 grid over their chunk's bounds,
+    and each occupied grid cell is represented by its first vertex.
+    primitives that collapse or that duplicate another are dropped.
+
+    returns (indices, lod_starts, lod_ends): indices are vertex indices
+    into coords, and chunk i uses indices[lod_starts[i]:lod_ends[i]]
+    '''
+    coords = as_array(coords, dims=3)
+    starts, ends = np.asarray(starts), np.asarray(ends)
+    nchunks = len(starts)
+    if nchunks == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty, empty
+    vchunk = np.repeat(np.arange(nchunks), (ends - starts) * prim_size)
+    vstarts = starts * prim_size
+    cmins = np.minimum.reduceat(coords, vstarts)[vchunk]
+    cexts = np.maximum.reduceat(coords, vstarts)[vchunk] - cmins
+    cell = (coords - cmins) / np.where(cexts > 0, cexts, 1) * resolution
+    cell = np.minimum(cell.astype(np.int64), resolution - 1)
+    keys = ((vchunk * resolution + cell[:, 0]) * resolution + cell[:, 1]) * resolution + cell[:, 2]
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    prims = first[inverse.ravel()].reshape(-1, prim_size)
+
+    keep = np.ones(len(prims), dtype=bool)
+    for i in range(prim_size):
+        for j in range(i + 1, prim_size):
+            keep &= prims[:, i] != prims[:, j]
+    kept = np.flatnonzero(keep)
+    _, unique = np.unique(np.sort(prims[kept], axis=1), axis=0, return_index=True)
+    kept = np.sort(kept[unique])
+
+    counts = np.bincount(vchunk[kept * prim_size], minlength=nchunks) * prim_size
+    lod_ends = np.cumsum(counts)
+    return prims[kept].ravel(), lod_ends - counts, lod_ends
+
+
+def aabbs_view_bounds(mins, maxs, mvp, viewport):
+    '''
+    tests axis-aligned boxes against the view frustum of the clip-space
+    matrix mvp (4x4).  returns (visible, pixels):
+    - visible[i] is False only if box i is entirely outside one frustum plane
+    - pixels[i] is the larger side of box i's screen-space bounds in
+      pixels (viewport is (width, height)), or inf if box i crosses the
+      camera plane
+    '''
+    mins, maxs = np.asarray(mins), np.asarray(maxs)
+    mvp = np.asarray(mvp, dtype=np.float64)
+    corner = np.array([[(i >> a) & 1 for a in range(3)] for i in range(8)], dtype=bool)
+    corners = np.where(corner[None], maxs[:, None, :], mins[:, None, :])
+    clip = corners @ mvp[:, :3].T + mvp[:, 3]
+    x, y, z, w = clip[..., 0], clip[..., 1], clip[..., 2], clip[..., 3]
+    outside = (
+        (x < -w).all(axis=1) | (x > w).all(axis=1) |
+        (y < -w).all(axis=1) | (y > w).all(axis=1) |
+        (z < -w).all(axis=1) | (z > w).all(axis=1)
+    )
+    infront = (w > 1e-8).all(axis=1)
+    ndc = clip[..., :2] / np.where(infront[:, None], w, 1.0)[..., None]
+    size = (ndc.max(axis=1) - ndc.min(axis=1)) * (np.asarray(viewport) * 0.5)
+    pixels = np.where(infront, size.max(axis=1), np.inf)
+    return ~outside, pixels
+
+
+###############################################################################
+# id buffers (picking)
+
+
+def project_to_window(coords, mvp, viewport):
+    '''
+    projects (N,3) coords by the clip-space matrix mvp (4x4) into window
+    space: x and y in pixels of viewport (width, height), z is depth in
+    [0, 1].  returns (window coords, valid) where valid is False for
+    coords at or behind the camera plane
+    '''
+    coords = as_array(coords, dims=3, dtype=np.float64)
+    mvp = np.asarray(mvp, dtype=np.float64)
+    clip = coords @ mvp[:, :3].T + mvp[:, 3]
+    w = clip[:, 3]
+    valid = w > 1e-8
+    ndc = clip[:, :3] / np.where(valid, w, 1.0)[:, None]
+    win = np.empty_like(ndc)
+    win[:, :2] = (ndc[:, :2] + 1.0) * 0.5 * np.asarray(viewport, dtype=np.float64)
+    win[:, 2] = (ndc[:, 2] + 1.0) * 0.5
+    return win, valid
+
+
+def _raster_coverage(px, py, p, prim_size, size):
+    '''
+    returns (covered, depth) arrays of shape (pixels, prims) for pixel
+    centers (px, py) and window-space primitives p of shape (prims, prim_size, 3).
+    points and lines follow GL's rules for non-antialiased points and wide
+    lines (size is rounded to a whole number of pixels)
+    '''
+    px, py = px[:, None], py[:, None]
+    size = max(1.0, np.floor(size + 0.5))
+
+    def span(p, c):
+        # True where pixel center p is one of the size pixels nearest to c
+        start = np.floor(c - size * 0.5 + 0.5)
+        return (p - 0.5 >= start) & (p - 0.5 < start + size)
+
+    if prim_size == 1:
+        # size x size pixels centered on the point
+        x, y, z = p[:, 0, 0], p[:, 0, 1], p[:, 0, 2]
+        covered = span(px, x) & span(py, y)
+        return covered, np.broadcast_to(z, covered.shape)
+    if prim_size == 2:
+        # parallelogram: each pixel column (row for y-major lines) between
+        # the endpoints gets the size pixels nearest the line, so ends are
+        # cut off square rather than rounded.  the end is half-open, like
+        # GL's diamond-exit rule, so lines sharing an endpoint do not overlap
+        a, b = p[:, 0], p[:, 1]
+        d = b[:, :2] - a[:, :2]
+        xmajor = np.abs(d[:, 0]) >= np.abs(d[:, 1])
+        major_p, minor_p = np.where(xmajor, px, py), np.where(xmajor, py, px)
+        major_a, minor_a = np.where(xmajor, a[:, 0], a[:, 1]), np.where(xmajor, a[:, 1], a[:, 0])
+        major_d, minor_d = np.where(xmajor, d[:, 0], d[:, 1]), np.where(xmajor, d[:, 1], d[:, 0])
+        t = (major_p - major_a) / np.where(major_d != 0, major_d, 1.0)
+        covered = (major_d != 0) & (t >= 0.0) & (t < 1.0) & span(minor_p, minor_a + minor_d * t)
+        return covered, a[:, 2] + (b[:, 2] - a[:, 2]) * np.clip(t, 0.0, 1.0)
+    # triangles: edge functions with a top-left fill rule, so pixels on an
+    # edge shared by two triangles are covered by only one of them
+    area = triangles2D_det(p[:, 0, :2], p[:, 1, :2], p[:, 2, :2])
+    flip = area < 0
+    p = np.where(flip[:, None, None], p[:, [0, 2, 1]], p)
+    area = np.abs(area)
+    covered = area[None, :] > 0
+    depth = 0.0
+    for i in range(3):
+        a, b = p[:, (i + 1) % 3], p[:, (i + 2) % 3]
+        e = b - a
+        w = e[:, 0] * (py - a[:, 1]) - e[:, 1] * (px - a[:, 0])
+        topleft = (e[:, 1] < 0) | ((e[:, 1] == 0) & (e[:, 0] < 0))
+        covered = covered & ((w > 0) | ((w == 0) & topleft))
+        depth = depth + w * p[:, i, 2]
+    return covered, depth / np.where(area > 0, area, 1.0)
+
+
+@profiler.profile
+def rasterize_ids(window, coords, prim_size, ids, size=1.0, depth_bias=0.0,
+                  ids_buf=None, depth_buf=None, max_elements=1 << 22):
+    '''
+    software rasterizes primitives into an id buffer covering the pixels of
+    window = (x, y, width, height).  mirrors what the GPU does when drawing
+    ids with depth test GL_LESS: pixels are sampled at their centers,
+    fragments outside depth [0, 1] are clipped, and earlier primitives win
+    depth ties.  primitives are square points (prim_size 1) of size size,
+    wide lines (prim_size 2) of width size, or triangles (prim_size 3).
+    points and wide lines are rasterized like GL does without smoothing
+    (see _raster_coverage).  results can still differ from the GPU by a
+    pixel at line ends, where GL's diamond-exit rule is approximated.
+
+    coords are (N*prim_size, 3) window-space coords (see project_to_window),
+    ids are the N primitive ids.  depth_bias is subtracted from depth.
+    pass the returned buffers back in to rasterize more primitives on top.
+    returns (ids_buf, depth_buf) with shape (height, width)
+    '''
+    x0, y0, w, h = window
+    if ids_buf is None:
+        ids_buf = np.zeros((h, w), dtype=np.int64)
+        depth_buf = np.ones((h, w), dtype=np.float64)
+    coords = as_array(coords, dims=3, dtype=np.float64)
+    ids = np.asarray(ids)
+    if not len(ids):
+        return ids_buf, depth_buf
+    p = coords.reshape(-1, prim_size, 3)
+
+    # only consider primitives that overlap the window
+    pad = size * 0.5 + 1.0 if prim_size < 3 else 0.0
+    pmin, pmax = p[..., :2].min(axis=1) - pad, p[..., :2].max(axis=1) + pad
+    near = (pmax[:, 0] >= x0) & (pmin[:, 0] <= x0 + w) & (pmax[:, 1] >= y0) & (pmin[:, 1] <= y0 + h)
+    cand = np.flatnonzero(near)
+    if not len(cand):
+        return ids_buf, depth_buf
+
+    gy, gx = np.mgrid[0:h, 0:w]
+    px, py = (gx + x0 + 0.5).ravel(), (gy + y0 + 0.5).ravel()
+    best_depth = depth_buf.ravel().copy()
+    best_ids = ids_buf.ravel().copy()
+    block = max(1, max_elements // len(px))
+    for i in range(0, len(cand), block):
+        c = cand[i:i + block]
+        covered, depth = _raster_coverage(px, py, p[c], prim_size, size)
+        depth = depth - depth_bias
+        covered = covered & (depth >= 0.0) & (depth <= 1.0)
+        depth = np.where(covered, depth, np.inf)
+        j = np.argmin(depth, axis=1)
+        d = depth[np.arange(len(px)), j]
+        win = d < best_depth
+        best_depth[win] = d[win]
+        best_ids[win] = ids[c[j[win]]]
+    return best_ids.reshape(h, w), best_depth.reshape(h, w)
+
+
+def nearest_id(ids_buf, center, radius):
+    '''
+    returns the id at the pixel of ids_buf (nonzero ids only) nearest to
+    center = (column, row), if within radius; otherwise 0.
+    ties are broken by pixel order (row-major)
+    '''
+    rows, cols = np.nonzero(ids_buf)
+    if not len(rows):
+        return 0
+    d2 = (cols - center[0]) ** 2 + (rows - center[1]) ** 2
+    i = int(np.argmin(d2))
+    if d2[i] > radius * radius:
+        return 0
+    return int(ids_buf[rows[i], cols[i]])
@@ -29,6 +29,8 @@ from mathutils.geometry import intersect_line_plane, intersect_point_tri
 
 from .decorators import stats_wrapper
 from .profiler import profiler
+from .kernels import plane_slice_triangles
+from .kernels import delta_angles as kernels_delta_angles
 
 
 '''
@@ -519,6 +521,20 @@ class Plane(Entity3D):
         p0, p1 = points
         return self.side(p0) == 0 and self.side(p1) == 0
 
+    @profiler.profile
+    def slice_mesh(self, coords, tris):
+        '''
+        slices entire triangle mesh by plane in one pass.
+        coords: (V,3) array (or list) of vertex positions
+        tris:   (T,3) array (or list) of vertex indices
+        returns list of (points, cyclic), where points is the ordered list of
+        Points along each cross-section polyline
+        '''
+        return [
+            ([Point(p) for p in points], cyclic)
+            for (points, cyclic) in plane_slice_triangles(self.o, self.n, coords, tris)
+        ]
+
 
 class Frame:
     @staticmethod
@@ -1306,14 +1322,7 @@ def delta_angles(vec_about, l_vecs):
 
     deltas should add up to 2*pi
     '''
-
-    v0 = l_vecs[0]
-    l_angles = [0] + [vector_angle_between(v0,v1,vec_about) for v1 in l_vecs[1:]]
-
-    L = len(l_angles)
-
-    deltas = [l_angles[n + 1] - l_angles[n] for n in range(0, L-1)] + [2*math.pi - l_angles[-1]]
-    return deltas
+    return kernels_delta_angles(vec_about, l_vecs).tolist()
 
 
 # https://rosettacode.org/wiki/Determine_if_two_triangles_overlap#C.2B.2B
@@ -126,6 +126,7 @@ class Profiler:
         self.d_maxs = {}
         self.d_last = {}
         self.d_count = {}
+        self.d_counters = {}
         self.stack = []
         self.last_profile_out = 0
         self.clear_time = time.time()
@@ -154,6 +155,18 @@ class Profiler:
         # self.printout()
         pass
 
+    def count(self, key, n=1):
+        '''
+        adds n to the named counter (ex: draw calls, cache hits).
+        counters are reported after the timings in strout
+        '''
+        if not Profiler._enabled:
+            return
+        self.d_counters[key] = self.d_counters.get(key, 0) + n
+
+    def get_count(self, key):
+        return self.d_counters.get(key, 0)
+
     def profile(self, fn):
         frame = inspect.currentframe().f_back
         f_locals = frame.f_locals
@@ -215,6 +228,14 @@ class Profiler:
             fps = ' 1k+ ' if fps >= 1000 else '%5.1f' % fps
             s += ['  %6.2f / %7d = %6.4f, %6.4f, %6.4f, %6.4f, (%s) - %6.2f - %s' % (
                 tottime, totcount, last, mint, avgt, maxt, fps, deltime, t)]
+        if self.d_counters:
+            s += [
+                '----------------------------------------------------------------------------------------------',
+                '     count - counter                                                                          ',
+                '----------------------------------------------------------------------------------------------',
+            ]
+            for key in sorted(self.d_counters):
+                s += ['  %8d - %s' % (self.d_counters[key], key)]
         s += ['run: %6.2fsecs' % (time.time() - self.clear_time)]
         return '\n'.join(s)
 
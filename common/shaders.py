@@ -20,9 +20,12 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
 import re
+import json
+import time
 import bpy
 import bgl
 import ctypes
+from hashlib import md5
 
 from .ui import Drawing
 from .debug import dprint
@@ -64,25 +67,100 @@ class Shader():
         assert not log and 'was successfully compiled' not in log, 'ERROR WHILE COMPILING SHADER %s: %s' % (name,log)
         return log
 
+    # preprocessed sources, keyed on md5 of shader file (with includes) and
+    # defines, so edited files are preprocessed again.  kept across sessions in
+    # Blender's user cache folder (see get_source_cache_path)
+    source_cache = None
+    source_cache_filename = 'addon_common_shader_sources.json'
+
     @staticmethod
-    def load_from_file(name, filename, *args, **kwargs):
-        # https://www.blender.org/api/blender_python_api_2_77_1/bgl.html
-        # https://en.wikibooks.org/wiki/GLSL_Programming/Blender/Shading_in_View_Space
-        # https://www.khronos.org/opengl/wiki/Built-in_Variable_(GLSL)
+    def get_source_cache_path():
+        ''' returns path of source cache file in user-writable folder, or None '''
+        for resource in ['CACHE', 'CONFIG']:
+            try:
+                path = bpy.utils.user_resource(resource, create=True)
+            except Exception:
+                continue        # ex: Blender 2.79 has no CACHE resource
+            if isinstance(path, str) and path:
+                return os.path.join(path, Shader.source_cache_filename)
+        return None
 
-        filename_guess = os.path.join(os.path.dirname(__file__), 'shaders', filename)
-        if os.path.exists(filename):
-            pass
-        elif os.path.exists(filename_guess):
-            filename = filename_guess
-        else:
-            assert False, "Shader file could not be found: %s" % filename
+    @staticmethod
+    def load_source_cache():
+        if Shader.source_cache is None:
+            Shader.source_cache = {}
+            path = Shader.get_source_cache_path()
+            try:
+                if path and os.path.exists(path):
+                    Shader.source_cache = json.load(open(path, 'rt'))
+            except Exception as e:
+                dprint('Could not read shader source cache: ' + str(e))
+        return Shader.source_cache
 
+    @staticmethod
+    def save_source_cache():
+        path = Shader.get_source_cache_path()
+        if not path: return
+        try:
+            with open(path, 'wt') as f:
+                json.dump(Shader.source_cache, f)
+        except Exception as e:
+            dprint('Could not write shader source cache: ' + str(e))
+
+    @staticmethod
+    def expand_includes(filename, included=None):
+        '''
+        returns source of shader file with `#include "file.glsl"` lines
+        replaced by the contents of file (relative to including file).
+        each file is included only once
+        '''
+        if included is None: included = set()
+        filename = os.path.abspath(filename)
+        if filename in included: return ''
+        included.add(filename)
+        lines = []
+        for line in open(filename,'rt').read().splitlines():
+            m = re.match(r'^\s*#include\s+"(?P<fn>[^"]+)"', line)
+            if m:
+                fn = os.path.join(os.path.dirname(filename), m.group('fn'))
+                assert os.path.exists(fn), 'Shader include could not be found: %s (in %s)' % (fn, filename)
+                lines.append(Shader.expand_includes(fn, included=included))
+            else:
+                lines.append(line)
+        return '\n'.join(lines)
+
+    @staticmethod
+    def preprocess_file(filename, defines=None):
+        '''
+        returns (vertex source, fragment source) for shader file.  results
+        are cached on disk, keyed on a hash of the source (after includes)
+        and defines
+        '''
+        source = Shader.expand_includes(filename)
+        defines = defines or {}
+        key = md5((source + repr(sorted(defines.items()))).encode()).hexdigest()
+        cache = Shader.load_source_cache()
+        if key not in cache:
+            cache[key] = Shader.preprocess(source, defines=defines)
+            Shader.save_source_cache()
+        return tuple(cache[key])
+
+    @staticmethod
+    def preprocess(source, defines=None):
+        '''
+        splits shader file source into vertex and fragment sources.
+        defines (dict of name => value) are added to both sources, after
+        #version and #extension directives.
+        note: uniform, attribute, and varying declarations are hoisted to the
+        top of both sources, so they must not be inside #if blocks
+        '''
+        lines_define = ['#define %s %s' % (k, v) for (k, v) in sorted((defines or {}).items())]
         uniforms, varyings, attributes = [],[],[]
         vertSource, fragSource = [],[]
         vertVersion, fragVersion = '', ''
+        vertExtensions, fragExtensions = [],[]
         mode = None
-        for line in open(filename,'rt').read().splitlines():
+        for line in source.splitlines():
             if line.startswith('uniform '):
                 uniforms.append(line)
             elif line.startswith('attribute '):
@@ -94,6 +172,12 @@ class Shader():
                     vertVersion = line
                 elif mode == 'frag':
                     fragVersion = line
+            elif line.startswith('#extension '):
+                # extension directives must come before any other tokens
+                if mode == 'vert':
+                    vertExtensions.append(line)
+                elif mode == 'frag':
+                    fragExtensions.append(line)
             elif line == '// vertex shader':
                 mode = 'vert'
             elif line == '// fragment shader':
@@ -104,23 +188,55 @@ class Shader():
                     vertSource.append(line)
                 elif mode == 'frag':
                     fragSource.append(line)
-        srcVertex = '\n'.join([vertVersion] + uniforms + attributes + varyings + vertSource)
-        srcFragment = '\n'.join([fragVersion] + uniforms + varyings + fragSource)
+        srcVertex = '\n'.join([vertVersion] + vertExtensions + lines_define + uniforms + attributes + varyings + vertSource)
+        srcFragment = '\n'.join([fragVersion] + fragExtensions + lines_define + uniforms + varyings + fragSource)
+        return (srcVertex, srcFragment)
+
+    @staticmethod
+    def load_from_file(name, filename, *args, defines=None, **kwargs):
+        # https://www.blender.org/api/blender_python_api_2_77_1/bgl.html
+        # https://en.wikibooks.org/wiki/GLSL_Programming/Blender/Shading_in_View_Space
+        # https://www.khronos.org/opengl/wiki/Built-in_Variable_(GLSL)
+
+        filename_guess = os.path.join(os.path.dirname(__file__), 'shaders', filename)
+        if os.path.exists(filename):
+            pass
+        elif os.path.exists(filename_guess):
+            filename = filename_guess
+        else:
+            assert False, "Shader file could not be found: %s" % filename
+
+        srcVertex,srcFragment = Shader.preprocess_file(filename, defines=defines)
         return Shader(name, srcVertex, srcFragment, *args, **kwargs)
 
-    def __init__(self, name, srcVertex, srcFragment, funcStart=None, funcEnd=None, checkErrors=True, bindTo0=None):
+    def __init__(self, name, srcVertex, srcFragment, funcStart=None, funcEnd=None, checkErrors=True, bindTo0=None, deferUniforms=False):
+        ''' shader is compiled when first used (see compile) '''
         self.drawing = Drawing.get_instance()
 
         self.name = name
+        self.srcVertex   = '\n'.join(l.strip() for l in srcVertex.split('\n'))
+        self.srcFragment = '\n'.join(l.strip() for l in srcFragment.split('\n'))
+        self.checkErrors = checkErrors
+        self.bindTo0 = bindTo0
+        self.shaderProg = None
+        self.shaderVars = {}
+
+        self.funcStart = funcStart
+        self.funcEnd = funcEnd
+        self.deferUniforms = deferUniforms
+        self.uniform_values = {}    # last (frozen) value set in GL, by name
+        self.uniform_dirty = {}     # values waiting for flush (deferUniforms)
+        self.mvpmatrix_version = None   # view version of last uMVPMatrix assign
+
+    def compile(self):
+        if self.shaderProg is not None: return
+        tstart = time.time()
+        name,srcVertex,srcFragment = self.name,self.srcVertex,self.srcFragment
+
         self.shaderProg = bgl.glCreateProgram()
         self.shaderVert = bgl.glCreateShader(bgl.GL_VERTEX_SHADER)
         self.shaderFrag = bgl.glCreateShader(bgl.GL_FRAGMENT_SHADER)
 
-        self.checkErrors = checkErrors
-
-        srcVertex   = '\n'.join(l.strip() for l in srcVertex.split('\n'))
-        srcFragment = '\n'.join(l.strip() for l in srcFragment.split('\n'))
-
         bgl.glShaderSource(self.shaderVert, srcVertex)
         bgl.glShaderSource(self.shaderFrag, srcFragment)
 
@@ -135,8 +251,8 @@ class Shader():
         bgl.glAttachShader(self.shaderProg, self.shaderVert)
         bgl.glAttachShader(self.shaderProg, self.shaderFrag)
 
-        if bindTo0:
-            bgl.glBindAttribLocation(self.shaderProg, 0, bindTo0)
+        if self.bindTo0:
+            bgl.glBindAttribLocation(self.shaderProg, 0, self.bindTo0)
 
         bgl.glLinkProgram(self.shaderProg)
 
@@ -150,30 +266,103 @@ class Shader():
             assert m
             m = m.groupdict()
             q,t,n = m['qualifier'],m['type'],m['name']
+            c = 1
+            ma = re.match(r'^(?P<name>[^\[]+)\[(?P<count>\d+)\]$', n)
+            if ma:
+                # uniform array (ex: vec3 vert_scales[8])
+                n,c = ma.group('name'),int(ma.group('count'))
             locate = bgl.glGetAttribLocation if q in {'in','attribute'} else bgl.glGetUniformLocation
             if n in self.shaderVars: continue
             self.shaderVars[n] = {
                 'qualifier': q,
                 'type': t,
+                'count': c,
                 'location': locate(self.shaderProg, n),
                 'reported': False,
                 }
+            self.shaderVars[n]['setter'] = self._create_setter(n, q, t, self.shaderVars[n]['location'], c)
 
         dprint('  attribs: ' + ', '.join((k + ' (%d)'%self.shaderVars[k]['location']) for k in self.shaderVars if self.shaderVars[k]['qualifier'] in {'in','attribute'}))
         dprint('  uniforms: ' + ', '.join((k + ' (%d)'%self.shaderVars[k]['location']) for k in self.shaderVars if self.shaderVars[k]['qualifier'] in {'uniform'}))
-
-        self.funcStart = funcStart
-        self.funcEnd = funcEnd
-        self.mvpmatrix_buffer = bgl.Buffer(bgl.GL_FLOAT, [4,4])
+        dprint('  compiled in %0.2fms' % ((time.time() - tstart) * 1000))
+
+    def delete(self):
+        ''' deletes GL program and shaders.  shader is compiled again when next used '''
+        if self.shaderProg is None: return
+        bgl.glDeleteShader(self.shaderVert)
+        bgl.glDeleteShader(self.shaderFrag)
+        bgl.glDeleteProgram(self.shaderProg)
+        self.shaderProg = None
+        self.shaderVars = {}
+        self.uniform_values = {}
+        self.uniform_dirty = {}
+        self.mvpmatrix_version = None
 
     def __setitem__(self, varName, varValue): self.assign(varName, varValue)
 
     def assign_buffer(self, varName, varValue):
         return self.assign(varName, bgl.Buffer(bgl.GL_FLOAT, [4,4], varValue))
 
+    @staticmethod
+    def freeze_value(value):
+        # comparable copy of value (Vectors, Matrices, Buffers are mutable)
+        if isinstance(value, str):
+            return value
+        try:
+            return tuple(Shader.freeze_value(v) for v in value)
+        except TypeError:
+            return value
+
     # https://www.opengl.org/sdk/docs/man/html/glVertexAttrib.xhtml
     # https://www.khronos.org/opengles/sdk/docs/man/xhtml/glUniform.xml
+    def _create_setter(self, varName, q, t, l, c):
+        '''
+        returns function that issues the GL call to set variable, so assign
+        does not need to branch on qualifier and type each time.
+        values may be frozen (tuples) or the original objects
+        '''
+        if q in {'in','attribute'}:
+            if t in {'float', 'int'}:
+                fn = {'float':bgl.glVertexAttrib1f, 'int':bgl.glVertexAttrib1i}[t]
+                return lambda value: fn(l, value)
+            if t in {'vec2', 'vec3', 'vec4'}:
+                fn = {'vec2':bgl.glVertexAttrib2f, 'vec3':bgl.glVertexAttrib3f, 'vec4':bgl.glVertexAttrib4f}[t]
+                return lambda value: fn(l, *value)
+            return None
+        if q in {'uniform'} and c > 1:
+            # uniform array: value is a list of up to c values
+            size = {'float':1, 'vec2':2, 'vec3':3, 'vec4':4}.get(t, None)
+            if not size: return None
+            fn = {1:bgl.glUniform1fv, 2:bgl.glUniform2fv, 3:bgl.glUniform3fv, 4:bgl.glUniform4fv}[size]
+            def setter(value):
+                n = min(len(value), c)
+                vals = [value[i] for i in range(n)]
+                fn(l, n, bgl.Buffer(bgl.GL_FLOAT, n if size == 1 else [n, size], vals))
+            return setter
+        if q in {'uniform'}:
+            # cannot set bools with BGL! :(
+            if t == 'float':
+                return lambda value: bgl.glUniform1f(l, value)
+            if t in {'vec2', 'vec3', 'vec4'}:
+                fn = {'vec2':bgl.glUniform2f, 'vec3':bgl.glUniform3f, 'vec4':bgl.glUniform4f}[t]
+                return lambda value: fn(l, *value)
+            if t in {'mat3', 'mat4'}:
+                fn,size = {'mat3':(bgl.glUniformMatrix3fv,3), 'mat4':(bgl.glUniformMatrix4fv,4)}[t]
+                def setter(value):
+                    if not isinstance(value, bgl.Buffer):
+                        value = bgl.Buffer(bgl.GL_FLOAT, [size, size], value)
+                    fn(l, 1, bgl.GL_TRUE, value)
+                return setter
+        return None
+
     def assign(self, varName, varValue):
+        '''
+        sets shader variable.  uniforms are skipped if value is unchanged
+        since last assignment (uniform values persist with the program), and
+        are queued until flush if shader was created with deferUniforms.
+        returns True if value was set or queued
+        '''
+        self.compile()
         assert varName in self.shaderVars, 'Variable %s not found' % varName
         try:
             v = self.shaderVars[varName]
@@ -182,48 +371,51 @@ class Shader():
                 if not v['reported']:
                     dprint('ASSIGNING TO UNUSED ATTRIBUTE (%s): %s = %s' % (self.name, varName,str(varValue)))
                     v['reported'] = True
-                return
+                return False
+            setter = v['setter']
+            assert setter, 'Unhandled type %s for %s %s' % (t, q, varName)
             if DEBUG_PRINT:
                 print('%s (%s,%d,%s) = %s' % (varName, q, l, t, str(varValue)))
-            if q in {'in','attribute'}:
-                if t == 'float':
-                    bgl.glVertexAttrib1f(l, varValue)
-                elif t == 'int':
-                    bgl.glVertexAttrib1i(l, varValue)
-                elif t == 'vec2':
-                    bgl.glVertexAttrib2f(l, *varValue)
-                elif t == 'vec3':
-                    bgl.glVertexAttrib3f(l, *varValue)
-                elif t == 'vec4':
-                    bgl.glVertexAttrib4f(l, *varValue)
-                else:
-                    assert False, 'Unhandled type %s for attrib %s' % (t, varName)
-                if self.checkErrors:
-                    self.drawing.glCheckError('assign attrib %s = %s' % (varName, str(varValue)))
-            elif q in {'uniform'}:
-                # cannot set bools with BGL! :(
-                if t == 'float':
-                    bgl.glUniform1f(l, varValue)
-                elif t == 'vec2':
-                    bgl.glUniform2f(l, *varValue)
-                elif t == 'vec3':
-                    bgl.glUniform3f(l, *varValue)
-                elif t == 'vec4':
-                    bgl.glUniform4f(l, *varValue)
-                elif t == 'mat3':
-                    bgl.glUniformMatrix3fv(l, 1, bgl.GL_TRUE, varValue)
-                elif t == 'mat4':
-                    bgl.glUniformMatrix4fv(l, 1, bgl.GL_TRUE, varValue)
-                else:
-                    assert False, 'Unhandled type %s for uniform %s' % (t, varName)
-                if self.checkErrors:
-                    self.drawing.glCheckError('assign uniform %s (%s %d) = %s' % (varName, t, l, str(varValue)))
+            if q in {'uniform'}:
+                value = self.freeze_value(varValue)
+                current = self.uniform_dirty.get(varName, self.uniform_values.get(varName, None))
+                if current == value: return False
+                if self.deferUniforms:
+                    if self.uniform_values.get(varName, None) == value:
+                        # changed back to value already in GL
+                        del self.uniform_dirty[varName]
+                    else:
+                        self.uniform_dirty[varName] = value
+                    return True
+                setter(varValue)
+                self.uniform_values[varName] = value
             else:
-                assert False, 'Unhandled qualifier %s for variable %s' % (q, varName)
+                setter(varValue)
+            if self.checkErrors:
+                self.drawing.glCheckError(lambda: 'assign %s %s (%s %d) = %s' % (q, varName, t, l, str(varValue)))
+            return True
         except Exception as e:
             print('ERROR (assign): ' + str(e))
+            return False
+
+    def flush(self):
+        '''
+        sets the uniforms queued by assign (deferUniforms).
+        call while shader is enabled, right before drawing
+        '''
+        if not self.uniform_dirty: return
+        dirty,self.uniform_dirty = self.uniform_dirty,{}
+        for varName,value in dirty.items():
+            try:
+                self.shaderVars[varName]['setter'](value)
+                self.uniform_values[varName] = value
+            except Exception as e:
+                print('ERROR (flush): %s: %s' % (varName, str(e)))
+        if self.checkErrors:
+            self.drawing.glCheckError(lambda: 'flush uniforms %s' % ', '.join(dirty))
 
     def enableVertexAttribArray(self, varName):
+        self.compile()
         assert varName in self.shaderVars, 'Variable %s not found' % varName
         v = self.shaderVars[varName]
         q,l,t = v['qualifier'],v['location'],v['type']
@@ -246,6 +438,7 @@ class Shader():
         bgl.GL_FLOAT:'float',
     }
     def vertexAttribPointer(self, vbo, varName, size, gltype, normalized=bgl.GL_FALSE, stride=0, buf=buf_zero, enable=True):
+        self.compile()
         assert varName in self.shaderVars, 'Variable %s not found' % varName
         v = self.shaderVars[varName]
         q,l,t = v['qualifier'],v['location'],v['type']
@@ -265,6 +458,7 @@ class Shader():
         bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, 0)
 
     def disableVertexAttribArray(self, varName):
+        self.compile()
         assert varName in self.shaderVars, 'Variable %s not found' % varName
         v = self.shaderVars[varName]
         q,l,t = v['qualifier'],v['location'],v['type']
@@ -281,6 +475,7 @@ class Shader():
 
     def useFor(self,funcCallback):
         try:
+            self.compile()
             bgl.glUseProgram(self.shaderProg)
             if self.funcStart: self.funcStart(self)
             funcCallback(self)
@@ -294,7 +489,8 @@ class Shader():
             if DEBUG_PRINT:
                 print('enabling shader <==================')
                 if self.checkErrors:
-                    self.drawing.glCheckError('something broke before enabling shader program (%s, %d)' % (self.name,self.shaderProg))
+                    self.drawing.glCheckError('something broke before enabling shader program (%s)' % self.name)
+            self.compile()
             bgl.glUseProgram(self.shaderProg)
             if self.checkErrors:
                 self.drawing.glCheckError('something broke after enabling shader program (%s,%d)' % (self.name,self.shaderProg))
@@ -302,9 +498,17 @@ class Shader():
             # special uniforms
             # - uMVPMatrix works around deprecated gl_ModelViewProjectionMatrix
             if 'uMVPMatrix' in self.shaderVars:
-                mvpmatrix = bpy.context.region_data.perspective_matrix
-                mvpmatrix_buffer = bgl.Buffer(bgl.GL_FLOAT, [4,4], mvpmatrix)
-                self.assign('uMVPMatrix', mvpmatrix_buffer)
+                r3d = bpy.context.region_data
+                if r3d == self.drawing.r3d:
+                    # shared buffer, refilled only when view changes.
+                    # skip the assign while the view version is unchanged
+                    version = self.drawing.get_view_version()
+                    if version != self.mvpmatrix_version:
+                        self.assign('uMVPMatrix', self.drawing.get_view_matrix_buffer())
+                        self.mvpmatrix_version = version
+                else:
+                    self.assign('uMVPMatrix', bgl.Buffer(bgl.GL_FLOAT, [4,4], r3d.perspective_matrix))
+                    self.mvpmatrix_version = None
 
             if self.funcStart: self.funcStart(self)
         except Exception as e:
@@ -326,6 +530,79 @@ class Shader():
 
 
 
+class ShaderVariants():
+    '''
+    specialized variants of a shader file, compiled with different
+    compile-time feature defines (ex: {'CULL_BACKFACES': 'true'}).
+    each variant is a (lazily compiled) Shader, cached by its variant key.
+    attribute access is forwarded to the selected variant, so ShaderVariants
+    can be used wherever a Shader is expected.
+
+    uniform values persist per GL program, so values assigned through
+    ShaderVariants (including those set by funcStart) are kept and replayed
+    onto a variant when it is enabled after values were assigned to others
+    '''
+
+    def __init__(self, name, filename, *args, **kwargs):
+        self.name = name
+        self.filename = filename
+        self.args = args
+        funcStart = kwargs.get('funcStart', None)
+        if funcStart:
+            # funcStart assigns through ShaderVariants, so its values are kept
+            kwargs = dict(kwargs, funcStart=lambda shader: funcStart(self))
+        self.kwargs = kwargs
+        self.variants = {}
+        self.uniforms = {}          # (frozen) values assigned through ShaderVariants, by name
+        self.current = set()        # keys of variants that have all values in self.uniforms
+        self.selected_key = self.get_key(None)
+        self.selected = self.get()
+
+    @staticmethod
+    def get_key(defines):
+        return tuple(sorted((k, str(v)) for (k, v) in (defines or {}).items()))
+
+    def get(self, defines=None):
+        key = self.get_key(defines)
+        if key not in self.variants:
+            name = self.name
+            if key: name += '[%s]' % ','.join('%s=%s' % kv for kv in key)
+            self.variants[key] = Shader.load_from_file(name, self.filename, *self.args, defines=dict(key), **self.kwargs)
+        return self.variants[key]
+
+    def select(self, defines=None):
+        ''' selects variant for defines; call before enable '''
+        self.selected_key = self.get_key(defines)
+        self.selected = self.get(defines)
+        return self.selected
+
+    def assign(self, varName, varValue):
+        ''' assigns to the selected variant, and keeps value for the other variants '''
+        value = Shader.freeze_value(varValue)
+        if self.uniforms.get(varName, None) != value:
+            self.uniforms[varName] = value
+            # only a variant that had all other values is still current
+            # (ex: funcStart assigns before enable replays to a new variant)
+            self.current = {self.selected_key} if self.selected_key in self.current else set()
+        return self.selected.assign(varName, varValue)
+
+    def enable(self):
+        shader = self.selected
+        shader.enable()
+        if self.selected_key in self.current: return
+        # set values that were assigned while other variants were selected.
+        # unchanged values are skipped by the variant's uniform cache
+        self.current.add(self.selected_key)
+        for varName, varValue in self.uniforms.items():
+            if varName in shader.shaderVars:
+                shader.assign(varName, varValue)
+
+    def __getattr__(self, name):
+        return getattr(self.selected, name)
+
+    def __setitem__(self, varName, varValue): self.assign(varName, varValue)
+
+
 brushStrokeShader = Shader.load_from_file('brushStrokeShader', 'brushstroke.glsl', checkErrors=False, bindTo0='vPos')
 edgeShortenShader = Shader.load_from_file('edgeShortenShader', 'edgeshorten.glsl', checkErrors=False, bindTo0='vPos')
 arrowShader = Shader.load_from_file('arrowShader', 'arrow.glsl', checkErrors=False)
@@ -338,3 +615,37 @@ def circleShaderEnd(shader):
 circleShader = Shader.load_from_file('circleShader', 'circle.glsl', checkErrors=False, funcStart=circleShaderStart, funcEnd=circleShaderEnd)
 
 
+
+
+def benchmark_shader_startup(rounds=5):
+    '''
+    times creating the shaders that are created at import (this module and
+    bmesh_render): lazily (preprocess only; compile on first use, as at
+    import) and eagerly (compile immediately, as before), with a cold and a
+    warm source cache.  prints and returns min time in ms of each.  run
+    inside Blender, with a GL context or under bgl_stub
+    '''
+    files = [
+        ('brushStrokeShader', 'brushstroke.glsl'), ('edgeShortenShader', 'edgeshorten.glsl'),
+        ('arrowShader', 'arrow.glsl'), ('circleShader', 'circle.glsl'),
+        ('bmeshShader', 'bmesh_render.glsl'), ('pickShader', 'bmesh_pick.glsl'),
+    ]
+    source_cache = Shader.load_source_cache()
+    results = {}
+    for compile in [False, True]:
+        for warm in [False, True]:
+            times = []
+            for _ in range(rounds):
+                # cold: in-memory cache is empty (disk cache is rewritten)
+                Shader.source_cache = dict(source_cache) if warm else {}
+                tstart = time.time()
+                shaders = [Shader.load_from_file(name, fn, checkErrors=False) for (name, fn) in files]
+                if compile:
+                    for shader in shaders: shader.compile()
+                times.append(time.time() - tstart)
+                for shader in shaders: shader.delete()
+            key = '%s %s' % ('eager' if compile else 'lazy', 'warm' if warm else 'cold')
+            results[key] = min(times) * 1000
+            print('%-10s %8.2fms  (%d shaders)' % (key, results[key], len(files)))
+    Shader.source_cache = source_cache
+    return results
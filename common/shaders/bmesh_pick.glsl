@@ -0,0 +1,37 @@
+uniform mat4  matrix_mvp;       // model-view-projection matrix
+uniform float depth_bias;       // pulls geometry toward viewer (window depth units)
+
+attribute vec3  vert_pos;       // position wrt model
+attribute float vert_id;        // id of element (0: occluder only)
+
+varying vec4 vColor;            // id encoded as color
+
+
+/////////////////////////////////////////////////////////////////////////
+// vertex shader
+
+#version 120
+
+void main() {
+    vec4 pos = matrix_mvp * vec4(vert_pos, 1.0);
+    pos.z -= 2.0 * depth_bias * pos.w;
+    gl_Position = pos;
+
+    // encode 24-bit id as rgb (8 bits per channel)
+    float id = vert_id;
+    float r = mod(id, 256.0);
+    id = floor(id / 256.0);
+    float g = mod(id, 256.0);
+    id = floor(id / 256.0);
+    vColor = vec4(r, g, id, 255.0) / 255.0;
+}
+
+
+/////////////////////////////////////////////////////////////////////////
+// fragment shader
+
+#version 120
+
+void main() {
+    gl_FragColor = vColor;
+}
@@ -20,6 +20,8 @@ uniform vec3  mirror_z;         // mirroring z-axis wrt world
 
 uniform float hidden;           // affects alpha for geometry below surface. 0=opaque, 1=transparent
 uniform vec3  vert_scale;       // used for mirroring
+uniform vec3  vert_scales[8];   // used for instanced mirroring, indexed by instance id
+uniform float use_instancing;   // 0=scale by vert_scale, 1=scale by vert_scales[instance id]
 uniform float normal_offset;    // how far to push geometry along normal
 
 uniform vec3  dir_forward;      // forward direction
@@ -69,10 +71,16 @@ varying vec4 vColor;            // color of geometry (considers selection)
 // vertex shader
 
 #version 120
+#extension GL_ARB_draw_instanced : enable
 
 void main() {
-    vec4 pos  = vec4((vert_pos + vert_norm * normal_offset) * vert_scale, 1.0);
-    vec3 norm = normalize(vert_norm * vert_scale);
+#ifdef GL_ARB_draw_instanced
+    vec3 scale = (use_instancing > 0.5) ? vert_scales[gl_InstanceIDARB] : vert_scale;
+#else
+    vec3 scale = vert_scale;
+#endif
+    vec4 pos  = vec4((vert_pos + vert_norm * normal_offset) * scale, 1.0);
+    vec3 norm = normalize(vert_norm * scale);
 
     vec4 wpos = matrix_m * pos;
     vec3 wnorm = normalize(matrix_mn * norm);
@@ -117,9 +125,17 @@ void main() {
 
 #version 120
 
-vec3 xyz(vec4 v) { return v.xyz / v.w; }
+#include "functions.glsl"
 
-bool floatnear(float v, float n) { return abs(v-n) < 0.5; }
+// features below are runtime uniforms by default.  specialized variants
+// (see bmesh_render.get_bmeshShader_defines) define them as true / false,
+// so the compiler can drop the unused branches
+#ifndef PERSPECTIVE
+#define PERSPECTIVE floatnear(perspective, 1.0)
+#endif
+#ifndef CULL_BACKFACES
+#define CULL_BACKFACES (cull_backfaces > 0.5)
+#endif
 
 // adjusts color based on mirroring settings and fragment position
 vec4 coloring(vec4 orig) {
@@ -130,7 +146,7 @@ vec4 coloring(vec4 orig) {
         // EDGE VIEW
         float edge_width = 5.0 / screen_size.y;
         vec3 viewdir;
-        if(floatnear(perspective, 1.0)) {
+        if(PERSPECTIVE) {
             viewdir = normalize(xyz(vCPosition));
         } else {
             viewdir = vec3(0,0,1);
@@ -190,14 +206,14 @@ void main() {
     //gl_FragDepth = gl_FragCoord.z * 0.9999;
     //return;
 
-    if(floatnear(perspective, 1.0)) {
+    if(PERSPECTIVE) {
         // perspective projection
         vec3 v = vCPosition.xyz / vCPosition.w;
         float l = length(v);
         float l_clip = (l - clip_start) / clip;
         float d = -dot(vCNormal, v) / l;
         if(d <= 0.0) {
-            if(cull_backfaces > 0.5) {
+            if(CULL_BACKFACES) {
                 alpha = 0.0;
                 discard;
             } else {
@@ -222,7 +238,7 @@ void main() {
         float l_clip = (l - clip_start) / clip;
         float d = dot(vCNormal, v) / l;
         if(d <= 0.0) {
-            if(cull_backfaces > 0.5) {
+            if(CULL_BACKFACES) {
                 alpha = 0.0;
                 discard;
             } else {
@@ -0,0 +1,5 @@
+// helper functions shared by shaders (include with `#include "functions.glsl"`)
+
+vec3 xyz(vec4 v) { return v.xyz / v.w; }
+
+bool floatnear(float v, float n) { return abs(v-n) < 0.5; }
@@ -0,0 +1,33 @@
+uniform mat4  matrix_pixel;     // region pixel coordinates to clip space
+uniform sampler2D image;        // texture of textured quads (unit 0)
+
+attribute vec2  vert_pos;       // position in region pixels
+attribute vec4  vert_color;     // color (multiplies texture)
+attribute vec3  vert_tex;       // texture coordinate (xy) and weight (z; 0=untextured)
+
+varying vec4 vColor;
+varying vec3 vTex;
+
+
+/////////////////////////////////////////////////////////////////////////
+// vertex shader
+
+#version 120
+
+void main() {
+    gl_Position = matrix_pixel * vec4(vert_pos, 0.0, 1.0);
+    vColor      = vert_color;
+    vTex        = vert_tex;
+}
+
+
+/////////////////////////////////////////////////////////////////////////
+// fragment shader
+
+#version 120
+
+void main() {
+    vec4 color = vColor;
+    if(vTex.z > 0.5) color *= texture2D(image, vTex.xy);
+    gl_FragColor = color;
+}
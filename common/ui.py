@@ -32,13 +32,14 @@ from concurrent.futures import ThreadPoolExecutor
 
 import bpy
 import bgl
+import numpy as np
 from bpy.types import BoolProperty
 from mathutils import Matrix
 
 from .decorators import blender_version_wrapper
 from .maths import Point2D, Vec2D, clamp, mid
 from .profiler import profiler
-from .drawing import Drawing, ScissorStack
+from .drawing import Drawing, ScissorStack, ImageAtlas
 
 from ..ext import png
 
@@ -62,13 +63,9 @@ def get_image_path(fn, ext=''):
 
 
 def load_image_png(fn):
-    if not hasattr(load_image_png, 'cache'):
-        load_image_png.cache = {}
-    if not fn in load_image_png.cache:
-        # assuming 4 channels per pixel!
-        w,h,d,m = png.Reader(get_image_path(fn)).read()
-        load_image_png.cache[fn] = [[r[i:i+4] for i in range(0,w*4,4)] for r in d]
-    return load_image_png.cache[fn]
+    ''' returns RGBA pixels of png as array of shape (height, width, 4).  loaded images are kept by ImageAtlas '''
+    w,h,d,m = png.Reader(get_image_path(fn)).asRGBA8()
+    return np.array([list(r) for r in d], dtype=np.uint8).reshape(h, w, 4)
 
 
 class GetSet:
@@ -282,32 +279,11 @@ class UI_Element:
         self.clip = ScissorStack.get_current_view()
 
         if debug_draw:
-            bgl.glEnable(bgl.GL_BLEND)
-            bgl.glBegin(bgl.GL_QUADS)
-            bgl.glColor4f(1,0,0,0.5)
-            bgl.glVertex2f(left, top)
-            bgl.glVertex2f(left, top - height)
-            bgl.glVertex2f(left + ml, top - height + mb)
-            bgl.glVertex2f(left + ml, top - mt)
-
-            bgl.glColor4f(0,1,0,0.5)
-            bgl.glVertex2f(left, top - height)
-            bgl.glVertex2f(left + width, top - height)
-            bgl.glVertex2f(left + width - mr, top - height + mb)
-            bgl.glVertex2f(left + ml, top - height + mb)
-
-            bgl.glColor4f(0,0,1,0.5)
-            bgl.glVertex2f(left + width, top - height)
-            bgl.glVertex2f(left + width, top)
-            bgl.glVertex2f(left + width - mr, top - mt)
-            bgl.glVertex2f(left + width - mr, top - height + mb)
-
-            bgl.glColor4f(1,0,1,0.5)
-            bgl.glVertex2f(left + width, top)
-            bgl.glVertex2f(left, top)
-            bgl.glVertex2f(left + ml, top - mt)
-            bgl.glVertex2f(left + width - mr, top - mt)
-            bgl.glEnd()
+            batch = self.drawing.batch2d
+            batch.quad((left, top), (left, top - height), (left + ml, top - height + mb), (left + ml, top - mt), (1,0,0,0.5))
+            batch.quad((left, top - height), (left + width, top - height), (left + width - mr, top - height + mb), (left + ml, top - height + mb), (0,1,0,0.5))
+            batch.quad((left + width, top - height), (left + width, top), (left + width - mr, top - mt), (left + width - mr, top - height + mb), (0,0,1,0.5))
+            batch.quad((left + width, top), (left, top), (left + ml, top - mt), (left + width - mr, top - mt), (1,0,1,0.5))
 
         ScissorStack.push(self.pos, self.size)
         self.predraw()
@@ -471,53 +447,23 @@ class UI_Background(UI_Element):
         l,t = self.pos
         w,h = self.size
 
-        bgl.glEnable(bgl.GL_BLEND)
+        batch = self.drawing.batch2d
 
         if self.background:
-            bgl.glColor4f(*self.background)
-            bgl.glBegin(bgl.GL_QUADS)
             if self.rounded_background:
-                bgl.glVertex2f(l+1, t)
-                bgl.glVertex2f(l+w-1, t)
-                bgl.glVertex2f(l+w-1, t-h)
-                bgl.glVertex2f(l+1, t-h)
-
-                bgl.glVertex2f(l, t-1)
-                bgl.glVertex2f(l+1, t-1)
-                bgl.glVertex2f(l+1, t-h+1)
-                bgl.glVertex2f(l, t-h+1)
-
-                bgl.glVertex2f(l+w-1, t-1)
-                bgl.glVertex2f(l+w, t-1)
-                bgl.glVertex2f(l+w, t-h+1)
-                bgl.glVertex2f(l+w-1, t-h+1)
+                batch.rect(l+1, t, w-2, h, self.background)
+                batch.rect(l, t-1, 1, h-2, self.background)
+                batch.rect(l+w-1, t-1, 1, h-2, self.background)
             else:
-                bgl.glVertex2f(l, t)
-                bgl.glVertex2f(l+w, t)
-                bgl.glVertex2f(l+w, t-h)
-                bgl.glVertex2f(l, t-h)
-            bgl.glEnd()
+                batch.rect(l, t, w, h, self.background)
         if self.border:
-            bgl.glColor4f(*self.border)
-            self.drawing.line_width(self.border_thickness)
-            bgl.glBegin(bgl.GL_LINE_STRIP)
             if self.rounded_background:
-                bgl.glVertex2f(l+1,t)
-                bgl.glVertex2f(l,t-1)
-                bgl.glVertex2f(l,t-h+1)
-                bgl.glVertex2f(l+1,t-h)
-                bgl.glVertex2f(l+w-1,t-h)
-                bgl.glVertex2f(l+w,t-h+1)
-                bgl.glVertex2f(l+w,t-1)
-                bgl.glVertex2f(l+w-1,t)
-                bgl.glVertex2f(l+1,t)
+                batch.line_strip([
+                    (l+1,t), (l,t-1), (l,t-h+1), (l+1,t-h), (l+w-1,t-h),
+                    (l+w,t-h+1), (l+w,t-1), (l+w-1,t), (l+1,t),
+                ], self.border, width=self.border_thickness)
             else:
-                bgl.glVertex2f(l,t)
-                bgl.glVertex2f(l,t-h)
-                bgl.glVertex2f(l+w,t-h)
-                bgl.glVertex2f(l+w,t)
-                bgl.glVertex2f(l,t)
-            bgl.glEnd()
+                batch.rect_outline(l, t, w, h, self.border, width=self.border_thickness)
 
         self.ui_item.draw(l,t,w,h)
 
@@ -580,23 +526,12 @@ class UI_VScrollable(UI_Padding):
         bar_bot = (self.offset < ah - sh - 1)
         if bars_show and (bar_top or bar_bot):
             s = self.drawing.scale(30)
-            bgl.glEnable(bgl.GL_BLEND)
-            bgl.glBegin(bgl.GL_QUADS)
+            c0,c1 = (0.25, 0.30, 0.35, 1.00),(0.25, 0.30, 0.35, 0.00)
+            batch = self.drawing.batch2d
             if bar_top:
-                bgl.glColor4f(0.25, 0.30, 0.35, 1.00)
-                bgl.glVertex2f(sl+sw, st+1)
-                bgl.glVertex2f(sl, st+1)
-                bgl.glColor4f(0.25, 0.30, 0.35, 0.00)
-                bgl.glVertex2f(sl, st-s)
-                bgl.glVertex2f(sl+sw, st-s)
+                batch.quad((sl+sw, st+1), (sl, st+1), (sl, st-s), (sl+sw, st-s), [c0, c0, c1, c1])
             if bar_bot:
-                bgl.glColor4f(0.25, 0.30, 0.35, 1.00)
-                bgl.glVertex2f(sl, st-sh)
-                bgl.glVertex2f(sl+sw, st-sh)
-                bgl.glColor4f(0.25, 0.30, 0.35, 0.00)
-                bgl.glVertex2f(sl+sw, st-sh+s)
-                bgl.glVertex2f(sl, st-sh+s)
-            bgl.glEnd()
+                batch.quad((sl, st-sh), (sl+sw, st-sh), (sl+sw, st-sh+s), (sl, st-sh+s), [c0, c0, c1, c1])
 
 
 class UI_Spacer(UI_Element):
@@ -645,24 +580,10 @@ class UI_Spacer(UI_Element):
         w,h = self.size
 
         if debug_draw:
-            bgl.glEnable(bgl.GL_BLEND)
-            bgl.glBegin(bgl.GL_QUADS)
-            bgl.glColor4f(0,1,1,0.5)
-            bgl.glVertex2f(l, t)
-            bgl.glVertex2f(l, t - h)
-            bgl.glVertex2f(l + w, t - h)
-            bgl.glVertex2f(l + w, t)
-            bgl.glEnd()
+            self.drawing.batch2d.rect(l, t, w, h, (0,1,1,0.5))
 
         if self.background:
-            bgl.glEnable(bgl.GL_BLEND)
-            bgl.glColor4f(*self.background)
-            bgl.glBegin(bgl.GL_QUADS)
-            bgl.glVertex2f(l, t)
-            bgl.glVertex2f(l+w, t)
-            bgl.glVertex2f(l+w, t-h)
-            bgl.glVertex2f(l, t-h)
-            bgl.glEnd()
+            self.drawing.batch2d.rect(l, t, w, h, self.background)
 
 
 class UI_Rule(UI_Element):
@@ -711,13 +632,10 @@ class UI_Rule(UI_Element):
         width,height = self.size
         t2 = round(self.thickness/2)
         padding = self.padding
-        bgl.glEnable(bgl.GL_BLEND)
-        bgl.glColor4f(*self.color)
-        self.drawing.line_width(self.thickness)
-        bgl.glBegin(bgl.GL_LINES)
-        bgl.glVertex2f(left+padding, top-padding-t2)
-        bgl.glVertex2f(left+width-padding, top-padding-t2)
-        bgl.glEnd()
+        self.drawing.batch2d.line(
+            (left+padding, top-padding-t2), (left+width-padding, top-padding-t2),
+            self.color, width=self.thickness,
+        )
 
 
 class UI_Container(UI_Element):
@@ -815,30 +733,13 @@ class UI_Container(UI_Element):
         sep = self.drawing.scale(self.separation)
 
         if self.background:
-            bgl.glEnable(bgl.GL_BLEND)
-            bgl.glColor4f(*self.background)
-            bgl.glBegin(bgl.GL_QUADS)
+            batch = self.drawing.batch2d
             if self.rounded_background:
-                bgl.glVertex2f(l+1, t)
-                bgl.glVertex2f(l+w-1, t)
-                bgl.glVertex2f(l+w-1, t-h)
-                bgl.glVertex2f(l+1, t-h)
-
-                bgl.glVertex2f(l, t-1)
-                bgl.glVertex2f(l+1, t-1)
-                bgl.glVertex2f(l+1, t-h+1)
-                bgl.glVertex2f(l, t-h+1)
-
-                bgl.glVertex2f(l+w-1, t-1)
-                bgl.glVertex2f(l+w, t-1)
-                bgl.glVertex2f(l+w, t-h+1)
-                bgl.glVertex2f(l+w-1, t-h+1)
+                batch.rect(l+1, t, w-2, h, self.background)
+                batch.rect(l, t-1, 1, h-2, self.background)
+                batch.rect(l+w-1, t-1, 1, h-2, self.background)
             else:
-                bgl.glVertex2f(l, t)
-                bgl.glVertex2f(l+w, t)
-                bgl.glVertex2f(l+w, t-h)
-                bgl.glVertex2f(l, t-h)
-            bgl.glEnd()
+                batch.rect(l, t, w, h, self.background)
 
         if self.vertical:
             pr = profiler.start('vertical')
@@ -848,14 +749,7 @@ class UI_Container(UI_Element):
             for i,ui in enumerate(ui_items):
                 eh = ui.get_height() if i < last else h
                 if debug_draw and 0 < i < last:
-                    bgl.glEnable(bgl.GL_BLEND)
-                    bgl.glBegin(bgl.GL_QUADS)
-                    bgl.glColor4f(1,1,1,0.5)
-                    bgl.glVertex2f(l,y+sep)
-                    bgl.glVertex2f(l,y)
-                    bgl.glVertex2f(l+w,y)
-                    bgl.glVertex2f(l+w,y+sep)
-                    bgl.glEnd()
+                    self.drawing.batch2d.rect(l, y+sep, w, sep, (1,1,1,0.5))
                 ui.draw(l,y,w,eh)
                 y -= eh + sep
                 h -= eh + sep
@@ -973,14 +867,7 @@ class UI_Label(UI_Element):
         w,h = self.size
 
         if self.bgcolor:
-            bgl.glEnable(bgl.GL_BLEND)
-            bgl.glColor4f(*self.bgcolor)
-            bgl.glBegin(bgl.GL_QUADS)
-            bgl.glVertex2f(l,t)
-            bgl.glVertex2f(l,t-h)
-            bgl.glVertex2f(l+w,t-h)
-            bgl.glVertex2f(l+w,t)
-            bgl.glEnd()
+            self.drawing.batch2d.rect(l, t, w, h, self.bgcolor)
 
         if self.align < 0: loc_x = l
         elif self.align > 0: loc_x = l + w - self.text_width
@@ -992,10 +879,7 @@ class UI_Label(UI_Element):
 
         size_prev = self.drawing.set_font_size(self.fontsize)
 
-        if self.shadowcolor:
-            self.drawing.text_draw2D(self.text, Point2D((loc_x+2, loc_y-2)), self.shadowcolor)
-
-        self.drawing.text_draw2D(self.text, Point2D((loc_x, loc_y)), self.color)
+        self.drawing.text_draw2D(self.text, Point2D((loc_x, loc_y)), self.color, dropshadow=self.shadowcolor, dropshadow_offset=(2,-2))
 
         if self.cursor_pos is not None and self.cursor_symbol:
             pre = self.drawing.get_text_width(self.text[:self.cursor_pos])
@@ -1060,7 +944,7 @@ class UI_WrappedLabel(UI_Element):
         size_prev = self.drawing.set_font_size(self.fontsize)
         mwidth = self.size.x
         twidth = self.drawing.get_text_width
-        swidth = twidth(' ')
+        lwidth = self.drawing.measure_line_width   # candidate lines are transient, so not cached
         wrapped = []
         def wrap(t):
             words = t.split(' ')
@@ -1070,7 +954,7 @@ class UI_WrappedLabel(UI_Element):
             while words:
                 word = words.pop()
                 nline = line + [word]
-                if line and twidth(' '.join(nline)) >= mwidth:
+                if line and lwidth(' '.join(nline)) >= mwidth:
                     lines.append(' '.join(line))
                     line = [word]
                 else:
@@ -1092,30 +976,15 @@ class UI_WrappedLabel(UI_Element):
     @profiler.profile
     def _draw(self):
         size_prev = self.drawing.set_font_size(self.fontsize)
-        line_height = self.drawing.get_line_height()
 
         l,t = self.pos
         w,h = self.size
-        twidth = self.drawing.get_text_width
-        theight = self.drawing.get_text_height
 
         if self.bgcolor:
-            bgl.glEnable(bgl.GL_BLEND)
-            bgl.glColor4f(*self.bgcolor)
-            bgl.glBegin(bgl.GL_QUADS)
-            bgl.glVertex2f(l,t)
-            bgl.glVertex2f(l,t-h)
-            bgl.glVertex2f(l+w,t-h)
-            bgl.glVertex2f(l+w,t)
-            bgl.glEnd()
-
-        y = t
-        for line in self.wrapped_lines:
-            lheight = theight(line)
-            if self.shadowcolor:
-                self.drawing.text_draw2D(line, Point2D((l+2, y-2)), self.shadowcolor)
-            self.drawing.text_draw2D(line, Point2D((l, y)), self.color)
-            y -= self.drawing.get_line_height(line) #line_height #lheight
+            self.drawing.batch2d.rect(l, t, w, h, self.bgcolor)
+
+        # all wrapped lines are drawn as one cached text run
+        self.drawing.text_draw2D(self.wrapped_lines, Point2D((l, t)), self.color, dropshadow=self.shadowcolor, dropshadow_offset=(2,-2))
 
         self.drawing.set_font_size(size_prev)
 
@@ -1250,8 +1119,7 @@ class UI_Button(UI_Container):
     def _draw(self):
         l,t = self.pos
         w,h = self.size
-        bgl.glEnable(bgl.GL_BLEND)
-        self.drawing.line_width(1)
+        batch = self.drawing.batch2d
 
         if self.hovering:
             bgcolor = self.hovercolor or self.bgcolor
@@ -1259,32 +1127,13 @@ class UI_Button(UI_Container):
             bgcolor = self.bgcolor
 
         if bgcolor:
-            bgl.glColor4f(*bgcolor)
-            bgl.glBegin(bgl.GL_QUADS)
-            bgl.glVertex2f(l,t)
-            bgl.glVertex2f(l,t-h)
-            bgl.glVertex2f(l+w,t-h)
-            bgl.glVertex2f(l+w,t)
-            bgl.glEnd()
+            batch.rect(l, t, w, h, bgcolor)
 
         if self.pressed and self.presscolor:
-            bgl.glColor4f(*self.presscolor)
-            bgl.glBegin(bgl.GL_QUADS)
-            bgl.glVertex2f(l,t)
-            bgl.glVertex2f(l,t-h)
-            bgl.glVertex2f(l+w,t-h)
-            bgl.glVertex2f(l+w,t)
-            bgl.glEnd()
+            batch.rect(l, t, w, h, self.presscolor)
 
         if self.bordercolor:
-            bgl.glColor4f(*self.bordercolor)
-            bgl.glBegin(bgl.GL_LINE_STRIP)
-            bgl.glVertex2f(l,t)
-            bgl.glVertex2f(l,t-h)
-            bgl.glVertex2f(l+w,t-h)
-            bgl.glVertex2f(l+w,t)
-            bgl.glVertex2f(l,t)
-            bgl.glEnd()
+            batch.rect_outline(l, t, w, h, self.bordercolor, width=1)
 
         super()._draw()
 
@@ -1401,16 +1250,7 @@ class UI_Options(UI_Container):
     def _draw(self):
         l,t = self.pos
         w,h = self.size
-        bgl.glEnable(bgl.GL_BLEND)
-        self.drawing.line_width(1)
-        bgl.glColor4f(0,0,0,0.2)
-        bgl.glBegin(bgl.GL_LINE_STRIP)
-        bgl.glVertex2f(l,t)
-        bgl.glVertex2f(l,t-h)
-        bgl.glVertex2f(l+w,t-h)
-        bgl.glVertex2f(l+w,t)
-        bgl.glVertex2f(l,t)
-        bgl.glEnd()
+        self.drawing.batch2d.rect_outline(l, t, w, h, (0,0,0,0.2), width=1)
         super()._draw()
 
 
@@ -1427,46 +1267,60 @@ class UI_Image(UI_Element):
         self.size_set = (width is not None) or (height is not None)
         self.loaded = False
         self.buffered = False
-        self.deleted = False
         self.margin = margin
 
-        self.texbuffer = bgl.Buffer(bgl.GL_INT, [1])
-        bgl.glGenTextures(1, self.texbuffer)
-        self.texture_id = self.texbuffer[0]
-
-        if async_load: self.executor.submit(self.load_image)
+        # images are packed into shared ImageAtlas textures.  files are keyed
+        # by filename and pixel data by content, so each is packed only once.
+        # files are kept in atlas for reuse; pixel data is released in __del__
+        self.atlas_key = image_data if type(image_data) is str else None
+        self.atlas_generation = None
+        self.texture_id,self.uvs = 0,None
+        self.image_pixels = None
+
+        size = ImageAtlas.get_size(self.atlas_key) if self.atlas_key else None
+        if size:
+            # file is already packed; no need to load it again
+            self.image_width,self.image_height = size
+            self.loaded = True
+        elif async_load: self.executor.submit(self.load_image)
         else: self.load_image()
         self.defer_recalc = False
 
+    def __del__(self):
+        if self.buffered and type(self.image_data) is not str:
+            ImageAtlas.release(self.atlas_key, self.atlas_generation)
+
     def load_image(self):
+        # may run on executor thread, so only loads pixels.  ImageAtlas is
+        # only touched in buffer_image
         image_data = self.image_data
         if type(image_data) is str: image_data = load_image_png(image_data)
-        self.image_height,self.image_width,self.image_depth = len(image_data),len(image_data[0]),len(image_data[0][0])
+        self.image_pixels = np.array(image_data, dtype=np.uint8)
+        self.image_height,self.image_width,self.image_depth = self.image_pixels.shape
         assert self.image_depth == 4
-        self.image_flat = [d for r in image_data for c in r for d in c]
         self.loaded = True
         self.dirty()
 
     def buffer_image(self):
+        # adding to atlas touches GL state, so it is done while drawing (main thread)
         if not self.loaded: return
-        if self.buffered: return
-        if self.deleted: return
-        bgl.glBindTexture(bgl.GL_TEXTURE_2D, self.texture_id)
-        bgl.glTexEnvf(bgl.GL_TEXTURE_ENV, bgl.GL_TEXTURE_ENV_MODE, bgl.GL_MODULATE)
-        bgl.glTexParameterf(bgl.GL_TEXTURE_2D, bgl.GL_TEXTURE_MAG_FILTER, bgl.GL_NEAREST)
-        bgl.glTexParameterf(bgl.GL_TEXTURE_2D, bgl.GL_TEXTURE_MIN_FILTER, bgl.GL_LINEAR)
-        # texbuffer = bgl.Buffer(bgl.GL_BYTE, [self.width,self.height,self.depth], image_data)
-        image_size = self.image_width*self.image_height*self.image_depth
-        texbuffer = bgl.Buffer(bgl.GL_BYTE, [image_size], self.image_flat)
-        bgl.glTexImage2D(bgl.GL_TEXTURE_2D, 0, bgl.GL_RGBA, self.image_width, self.image_height, 0, bgl.GL_RGBA, bgl.GL_UNSIGNED_BYTE, texbuffer)
-        del texbuffer
-        bgl.glBindTexture(bgl.GL_TEXTURE_2D, 0)
+        if self.buffered:
+            if self.atlas_generation == ImageAtlas.generation: return
+            # atlas was cleared since image was buffered
+            self.buffered = False
+        if not ImageAtlas.has(self.atlas_key):
+            if self.image_pixels is None: self.load_image()
+            if type(self.image_data) is not str:
+                self.atlas_key = ('pixels', self.image_pixels.shape, hash(self.image_pixels.tobytes()))
+        if ImageAtlas.has(self.atlas_key):
+            self.texture_id,self.uvs,_,_ = ImageAtlas.get(self.atlas_key)
+        else:
+            self.texture_id,self.uvs,_,_ = ImageAtlas.add(self.atlas_key, self.image_pixels)
+        if type(self.image_data) is not str: ImageAtlas.acquire(self.atlas_key)
+        self.atlas_generation = ImageAtlas.generation
+        self.image_pixels = None
         self.buffered = True
 
-    def __del__(self):
-        self.deleted = True
-        bgl.glDeleteTextures(1, self.texbuffer)
-
     def _recalc_size(self):
         self._width_inner = self.drawing.scale(self.width if self.size_set else self.image_width)
         self._height_inner = self.drawing.scale(self.height if self.size_set else self.image_height)
@@ -1487,17 +1341,7 @@ class UI_Image(UI_Element):
         iw,ih = self.get_image_width(),self.get_image_height()
         il,it = cx-iw/2, cy+ih/2
 
-        bgl.glColor4f(1,1,1,1)
-        bgl.glEnable(bgl.GL_BLEND)
-        bgl.glEnable(bgl.GL_TEXTURE_2D)
-        bgl.glBindTexture(bgl.GL_TEXTURE_2D, self.texture_id)
-        bgl.glBegin(bgl.GL_QUADS)
-        bgl.glTexCoord2f(0,0);  bgl.glVertex2f(il,it)
-        bgl.glTexCoord2f(0,1);  bgl.glVertex2f(il,it-ih)
-        bgl.glTexCoord2f(1,1);  bgl.glVertex2f(il+iw,it-ih)
-        bgl.glTexCoord2f(1,0);  bgl.glVertex2f(il+iw,it)
-        bgl.glEnd()
-        bgl.glBindTexture(bgl.GL_TEXTURE_2D, 0)
+        self.drawing.batch2d.image(il, it, iw, ih, self.texture_id, uvs=self.uvs)
 
 
 class UI_Graphic(UI_Element):
@@ -1548,91 +1392,32 @@ class UI_Graphic(UI_Element):
         w,h = self.drawing.scale(self.width),self.drawing.scale(self.height)
         l,t = cx-w/2, cy+h/2
 
-        self.drawing.line_width(1.0)
-        bgl.glEnable(bgl.GL_BLEND)
+        batch = self.drawing.batch2d
+        white = (1,1,1,1)
 
         if self._graphic == 'box unchecked':
-            bgl.glColor4f(1,1,1,0.25)
-            bgl.glBegin(bgl.GL_LINE_STRIP)
-            bgl.glVertex2f(l,t)
-            bgl.glVertex2f(l,t-h)
-            bgl.glVertex2f(l+w,t-h)
-            bgl.glVertex2f(l+w,t)
-            bgl.glVertex2f(l,t)
-            bgl.glEnd()
+            batch.rect_outline(l, t, w, h, (1,1,1,0.25))
 
         elif self._graphic == 'box checked':
-            bgl.glColor4f(0.27,0.50,0.72,0.90)
-            bgl.glBegin(bgl.GL_QUADS)
-            bgl.glVertex2f(l,t)
-            bgl.glVertex2f(l,t-h)
-            bgl.glVertex2f(l+w,t-h)
-            bgl.glVertex2f(l+w,t)
-            bgl.glEnd()
-            bgl.glColor4f(1,1,1,1)
-            if False:
-                # outline
-                bgl.glBegin(bgl.GL_LINE_STRIP)
-                bgl.glVertex2f(l,t)
-                bgl.glVertex2f(l,t-h)
-                bgl.glVertex2f(l+w,t-h)
-                bgl.glVertex2f(l+w,t)
-                bgl.glVertex2f(l,t)
-                bgl.glEnd()
+            batch.rect(l, t, w, h, (0.27,0.50,0.72,0.90))
             # check
-            bgl.glBegin(bgl.GL_LINE_STRIP)
-            bgl.glVertex2f(l+2,cy)
-            bgl.glVertex2f(cx,t-h+2)
-            bgl.glVertex2f(l+w-2,t-2)
-            bgl.glEnd()
+            batch.line_strip([(l+2,cy), (cx,t-h+2), (l+w-2,t-2)], white)
 
         elif self._graphic == 'triangle right':
-            bgl.glColor4f(1,1,1,1)
-            bgl.glBegin(bgl.GL_TRIANGLES)
-            bgl.glVertex2f(l+2,t-2)
-            bgl.glVertex2f(l+2,t-h+2)
-            bgl.glVertex2f(l+w-2,cy)
-            bgl.glEnd()
+            batch.triangle((l+2,t-2), (l+2,t-h+2), (l+w-2,cy), white)
 
         elif self._graphic == 'triangle down':
-            bgl.glColor4f(1,1,1,1)
-            bgl.glBegin(bgl.GL_TRIANGLES)
-            bgl.glVertex2f(l+2,t-2)
-            bgl.glVertex2f(cx,t-h+2)
-            bgl.glVertex2f(l+w-2,t-2)
-            bgl.glEnd()
+            batch.triangle((l+2,t-2), (cx,t-h+2), (l+w-2,t-2), white)
 
         elif self._graphic == 'dash':
-            bgl.glColor4f(1,1,1,1)
-            bgl.glBegin(bgl.GL_QUADS)
-            bgl.glVertex2f(l+2,cy-2)
-            bgl.glVertex2f(l+w-2,cy-2)
-            bgl.glVertex2f(l+w-2,cy+2)
-            bgl.glVertex2f(l+2,cy+2)
-            bgl.glEnd()
+            batch.quad((l+2,cy-2), (l+w-2,cy-2), (l+w-2,cy+2), (l+2,cy+2), white)
 
         elif self._graphic == 'plus':
-            bgl.glColor4f(1,1,1,1)
-            bgl.glBegin(bgl.GL_QUADS)
-            bgl.glVertex2f(l+2,cy-2)
-            bgl.glVertex2f(l+w-2,cy-2)
-            bgl.glVertex2f(l+w-2,cy+2)
-            bgl.glVertex2f(l+2,cy+2)
-
-            bgl.glVertex2f(cx-2,t-2)
-            bgl.glVertex2f(cx-2,t-h+2)
-            bgl.glVertex2f(cx+2,t-h+2)
-            bgl.glVertex2f(cx+2,t-2)
-            bgl.glEnd()
+            batch.quad((l+2,cy-2), (l+w-2,cy-2), (l+w-2,cy+2), (l+2,cy+2), white)
+            batch.quad((cx-2,t-2), (cx-2,t-h+2), (cx+2,t-h+2), (cx+2,t-2), white)
 
         elif self._graphic == 'minus':
-            bgl.glColor4f(1,1,1,1)
-            bgl.glBegin(bgl.GL_QUADS)
-            bgl.glVertex2f(l+2,cy-2)
-            bgl.glVertex2f(l+w-2,cy-2)
-            bgl.glVertex2f(l+w-2,cy+2)
-            bgl.glVertex2f(l+2,cy+2)
-            bgl.glEnd()
+            batch.quad((l+2,cy-2), (l+w-2,cy-2), (l+w-2,cy+2), (l+2,cy+2), white)
 
 
 class UI_Checkbox(UI_Container):
@@ -1817,8 +1602,7 @@ class UI_Number(UI_Container):
         r,g,b,a = (0,0,0,0.1) if not (self.downed or self.captured) else (0.8,0.8,0.8,0.5)
         l,t = self.pos
         w,h = self.size
-        bgl.glEnable(bgl.GL_BLEND)
-        self.drawing.line_width(1)
+        batch = self.drawing.batch2d
 
         if self.hovering:
             bgcolor = self.hovercolor or self.bgcolor
@@ -1826,22 +1610,9 @@ class UI_Number(UI_Container):
             bgcolor = self.bgcolor
 
         if bgcolor:
-            bgl.glColor4f(*bgcolor)
-            bgl.glBegin(bgl.GL_QUADS)
-            bgl.glVertex2f(l,t)
-            bgl.glVertex2f(l,t-h)
-            bgl.glVertex2f(l+w,t-h)
-            bgl.glVertex2f(l+w,t)
-            bgl.glEnd()
-
-        bgl.glColor4f(r,g,b,a)
-        bgl.glBegin(bgl.GL_LINE_STRIP)
-        bgl.glVertex2f(l,t)
-        bgl.glVertex2f(l,t-h)
-        bgl.glVertex2f(l+w,t-h)
-        bgl.glVertex2f(l+w,t)
-        bgl.glVertex2f(l,t)
-        bgl.glEnd()
+            batch.rect(l, t, w, h, bgcolor)
+
+        batch.rect_outline(l, t, w, h, (r,g,b,a), width=1)
         super()._draw()
 
     def capture_start(self):
@@ -1968,8 +1739,7 @@ class UI_Textbox(UI_Container):
         r,g,b,a = (0,0,0,0.1) if not (self.downed or self.captured) else (0.8,0.8,0.8,0.5)
         l,t = self.pos
         w,h = self.size
-        bgl.glEnable(bgl.GL_BLEND)
-        self.drawing.line_width(1)
+        batch = self.drawing.batch2d
 
         if self.hovering:
             bgcolor = self.hovercolor or self.bgcolor
@@ -1977,22 +1747,9 @@ class UI_Textbox(UI_Container):
             bgcolor = self.bgcolor
 
         if bgcolor:
-            bgl.glColor4f(*bgcolor)
-            bgl.glBegin(bgl.GL_QUADS)
-            bgl.glVertex2f(l,t)
-            bgl.glVertex2f(l,t-h)
-            bgl.glVertex2f(l+w,t-h)
-            bgl.glVertex2f(l+w,t)
-            bgl.glEnd()
-
-        bgl.glColor4f(r,g,b,a)
-        bgl.glBegin(bgl.GL_LINE_STRIP)
-        bgl.glVertex2f(l,t)
-        bgl.glVertex2f(l,t-h)
-        bgl.glVertex2f(l+w,t-h)
-        bgl.glVertex2f(l+w,t)
-        bgl.glVertex2f(l,t)
-        bgl.glEnd()
+            batch.rect(l, t, w, h, bgcolor)
+
+        batch.rect_outline(l, t, w, h, (r,g,b,a), width=1)
         super()._draw()
 
     def capture_start(self):
@@ -2373,26 +2130,10 @@ class UI_Window(UI_Padding):
         l,t = self.pos
         w,h = self.size
 
-        bgl.glEnable(bgl.GL_BLEND)
-
         # draw background
-        bgl.glColor4f(*self.bgcolor)
-        bgl.glBegin(bgl.GL_QUADS)
-        bgl.glVertex2f(l,t)
-        bgl.glVertex2f(l,t-h)
-        bgl.glVertex2f(l+w,t-h)
-        bgl.glVertex2f(l+w,t)
-        bgl.glEnd()
-
-        self.drawing.line_width(1.0)
-        bgl.glColor4f(0,0,0,0.5)
-        bgl.glBegin(bgl.GL_LINE_STRIP)
-        bgl.glVertex2f(l,t)
-        bgl.glVertex2f(l,t-h)
-        bgl.glVertex2f(l+w,t-h)
-        bgl.glVertex2f(l+w,t)
-        bgl.glVertex2f(l,t)
-        bgl.glEnd()
+        batch = self.drawing.batch2d
+        batch.rect(l, t, w, h, self.bgcolor)
+        batch.rect_outline(l, t, w, h, (0,0,0,0.5), width=1)
 
         pr = profiler.start('UI_Window: drawing contents')
         self.draw(l, t, w, h)
@@ -2574,21 +2315,10 @@ class UI_WindowManager:
         self.focus = None
 
     def draw_darken(self):
-        bgl.glPushAttrib(bgl.GL_ALL_ATTRIB_BITS)
-        bgl.glMatrixMode(bgl.GL_PROJECTION)
-        bgl.glPushMatrix()
-        bgl.glLoadIdentity()
-        bgl.glColor4f(0,0,0,0.25)    # TODO: use window background color??
-        bgl.glEnable(bgl.GL_BLEND)
-        bgl.glDisable(bgl.GL_DEPTH_TEST)
-        bgl.glBegin(bgl.GL_QUADS)   # TODO: not use immediate mode
-        bgl.glVertex2f(-1, -1)
-        bgl.glVertex2f( 1, -1)
-        bgl.glVertex2f( 1,  1)
-        bgl.glVertex2f(-1,  1)
-        bgl.glEnd()
-        bgl.glPopMatrix()
-        bgl.glPopAttrib()
+        # covers whole region (ScissorStack is at its base here)
+        rgn = bpy.context.region
+        color = (0,0,0,0.25)    # TODO: use window background color??
+        self.drawing.batch2d.rect(0, rgn.height, rgn.width, rgn.height, color)
 
     def draw_postpixel(self, context):
         ScissorStack.start(context)
@@ -2603,6 +2333,7 @@ class UI_WindowManager:
             for win in self.windows:
                 win.draw_postpixel()
         self.tooltip_window.draw_postpixel()
+        self.drawing.batch2d.flush()
         ScissorStack.end()
 
     def register_interval_callback(self, fn_callback, interval):
@@ -1,6 +1,8 @@
 import time
 import math
 
+import numpy as np
+
 import bpy
 import bmesh
 import bgl
@@ -9,10 +11,12 @@ from typing import List, Callable
 
 from mathutils import Vector, Matrix, Color, kdtree
 from mathutils.bvhtree import BVHTree
-from mathutils.geometry import intersect_point_line, intersect_line_plane
+from mathutils.geometry import intersect_point_line, intersect_line_plane, intersect_point_tri_2d
 from bpy_extras import view3d_utils
 
 from .maths import Point, Normal, XForm, Ray, Vector, Point2D
+from .kernels import transform_points, distances, closest_t_and_distance_points_to_segments
+from .bmesh_utils import BMeshTriangulationCache
 
 
 
@@ -24,6 +28,7 @@ class XMesh:
         eme.update()
         self.bme = bmesh.new()
         self.bme.from_mesh(eme)
+        self.tricache = BMeshTriangulationCache()
         if triangulate: self.triangulate()
         self.dirty()
 
@@ -57,6 +62,7 @@ class XMesh:
         faces = [face for face in self.bme.faces if len(face.verts) != 3]
         #print('%d non-triangles' % len(faces))
         bmesh.ops.triangulate(self.bme, faces=faces)
+        self.tricache.dirty()
         self.dirty()
 
 
@@ -123,13 +129,14 @@ class XMesh:
         return (self._wrap_bmvert(bv),(point-bmv_world).length)
 
     def nearest_bmverts_Point(self, point:Point, dist3d:float):
-        nearest = []
-        for bmv in self.bme.verts:
-            bmv_world = self.xform.l2w_point(bmv.co)
-            d3d = (bmv_world - point).length
-            if d3d > dist3d: continue
-            nearest += [(self._wrap_bmvert(bmv), d3d)]
-        return nearest
+        verts = list(self.bme.verts)
+        if not verts: return []
+        coords = transform_points(self.xform.mx_p, [bmv.co for bmv in verts])
+        dists = distances(coords, point)
+        return [
+            (self._wrap_bmvert(verts[i]), float(dists[i]))
+            for i in np.flatnonzero(dists <= dist3d)
+        ]
 
     def nearest_bmedge_Point(self, point:Point, edges=None):
         if edges is None:
@@ -150,18 +157,16 @@ class XMesh:
         return (self._wrap_bmedge(be), (point-self.xform.l2w_point(bpp)).length)
 
     def nearest_bmedges_Point(self, point:Point, dist3d:float):
-        l2w_point = self.xform.l2w_point
-        nearest = []
-        for bme in self.bme.edges:
-            bmv0,bmv1 = l2w_point(bme.verts[0].co), l2w_point(bme.verts[1].co)
-            diff = bmv1 - bmv0
-            l = diff.length
-            d = diff / l
-            pp = bmv0 + d * max(0, min(l, (point - bmv0).dot(d)))
-            dist = (point - pp).length
-            if dist > dist3d: continue
-            nearest += [(self._wrap_bmedge(bme), dist)]
-        return nearest
+        edges = list(self.bme.edges)
+        if not edges: return []
+        mx = self.xform.mx_p
+        co0 = transform_points(mx, [bme.verts[0].co for bme in edges])
+        co1 = transform_points(mx, [bme.verts[1].co for bme in edges])
+        _,dists = closest_t_and_distance_points_to_segments(point, co0, co1)
+        return [
+            (self._wrap_bmedge(edges[i]), float(dists[i]))
+            for i in np.flatnonzero(dists <= dist3d)
+        ]
 
     def nearest2D_bmverts_Point2D(self, xy:Point2D, dist2D:float, Point_to_Point2D, verts=None):
         # TODO: compute distance from camera to point
@@ -255,12 +260,9 @@ class XMesh:
         nearest = []
         for bmf in faces:
             pts = [Point_to_Point2D(self.xform.l2w_point(bmv.co)) for bmv in bmf.verts]
-            pts = [pt for pt in pts if pt]
-            pt0 = pts[0]
             # TODO: Get dist?
-            for pt1,pt2 in zip(pts[1:-1],pts[2:]):
-                if intersect_point_tri(xy, pt0, pt1, pt2):
-                    nearest += [(self._wrap_bmface(bmf), dist)]
+            if self._point_in_face2D(xy, bmf, pts):
+                nearest += [(self._wrap_bmface(bmf), 0)]
             #p2d = Point_to_Point2D(self.xform.l2w_point(bmv.co))
             #d2d = (xy - p2d).length
             #if p2d is None: continue
@@ -279,11 +281,8 @@ class XMesh:
         bv,bd = None,None
         for bmf in faces:
             pts = [Point_to_Point2D(self.xform.l2w_point(bmv.co)) for bmv in bmf.verts]
-            pts = [pt for pt in pts if pt]
-            pt0 = pts[0]
-            for pt1,pt2 in zip(pts[1:-1],pts[2:]):
-                if intersect_point_tri(xy, pt0, pt1, pt2):
-                    return self._wrap_bmface(bmf)
+            if self._point_in_face2D(xy, bmf, pts):
+                return self._wrap_bmface(bmf)
             #p2d = Point_to_Point2D(self.xform.l2w_point(bmv.co))
             #d2d = (xy - p2d).length
             #if p2d is None: continue
@@ -293,6 +292,15 @@ class XMesh:
         return None
 
 
+    def _point_in_face2D(self, xy:Point2D, bmf, pts):
+        # pts are the projected bmf.verts; triangles with unprojectable verts are skipped
+        for i0,i1,i2 in self.tricache.iter_indices(bmf):
+            p0,p1,p2 = pts[i0],pts[i1],pts[i2]
+            if p0 is None or p1 is None or p2 is None: continue
+            if intersect_point_tri_2d(xy, p0, p1, p2): return True
+        return False
+
+
     ##########################################################
 
     def _visible_verts(self, is_visible:Callable[[Point,Normal], bool]):
@@ -23,7 +23,7 @@ import bpy
 import bgl
 
 from ..common.debug import debugger
-from ..common.drawing import Drawing
+from ..common.drawing import Drawing, ImageAtlas
 from ..common.ui import UI_WindowManager
 
 
@@ -98,6 +98,8 @@ class CookieCutter_UI:
         self._space.draw_handler_remove(self._handle_preview, 'WINDOW')
         self._space.draw_handler_remove(self._handle_postview, 'WINDOW')
         self._space.draw_handler_remove(self._handle_postpixel, 'WINDOW')
+        # release atlas textures of UI images (reloaded on next start)
+        ImageAtlas.clear()
         self._area.tag_redraw()
 
     ####################################################################
@@ -29,8 +29,7 @@ import bgl
 import ctypes
 import numpy as np
 
-# figure out size of _Py_ssize_t
-_Py_ssize_t = ctypes.c_int64 if hasattr(ctypes.pythonapi, 'Py_InitModule4_64') else ctypes.c_int
+_Py_ssize_t = ctypes.c_ssize_t
 
 class _PyObject(ctypes.Structure): pass
 _PyObject._fields_ = [                      # cannot define inside _PyObject,
@@ -62,48 +61,88 @@ class C_Buffer(_PyVarObject):
         ("buf", ctypes.c_void_p),
     ]
 
-assert ctypes.sizeof(C_Buffer) == bgl.Buffer.__basicsize__
+# headless stub (common/bgl_stub.py) backs its Buffers with NumPy arrays, so no ctypes tricks needed
+_is_stub = getattr(bgl, 'IS_STUB', False)
 
+assert _is_stub or ctypes.sizeof(C_Buffer) == bgl.Buffer.__basicsize__
 
-class VoidBufValue():
-    def __init__(self, value):
-        self.buf = bgl.Buffer(bgl.GL_BYTE, 1)
 
-        self._buf_addr = ctypes.pointer(ctypes.c_void_p.from_address(id(self.buf) + C_Buffer.buf.offset))
-        self._allocated_buf = self._buf_addr[0]
-        self._buf_addr[0] = value
+_decref = ctypes.pythonapi.Py_DecRef
+_incref = ctypes.pythonapi.Py_IncRef
+_decref.argtypes = _incref.argtypes = [ctypes.py_object]
+_decref.restype = _incref.restype = None
 
-    def __del__(self):
-        self._buf_addr[0] = self._allocated_buf
-        #del self._allocated_buf
-        #del self._buf_addr
-        del self.buf
 
+def _make_Buffer(ndimensions, parent, address):
+    '''
+    returns bgl.Buffer with ndimensions (each 1) whose data is at address.
+    the Buffer holds a reference to parent instead of owning its data, so
+    Blender never frees address (see Buffer_dealloc in bgl.c)
+    '''
+    if _is_stub:
+        # stub Buffers have no C struct; a pointer Buffer keeps address as its offset
+        buf = bgl.Buffer.pointer(address)
+        buf.parent = parent
+        return buf,None
+    # a Buffer from indexing another Buffer has its own dimensions array
+    buf = bgl.Buffer(bgl.GL_BYTE, (1,) * (ndimensions + 1))[0]
+    c_buf = C_Buffer.from_address(id(buf))
+    _decref(c_buf.parent)   # releases the Buffer we indexed
+    _incref(parent)
+    c_buf.parent = parent
+    c_buf.buf = address
+    return buf,c_buf
 
-def np_array_as_bgl_Buffer(array):
-    type = array.dtype
-    if   type == np.int8:    type = bgl.GL_BYTE
-    elif type == np.int16:   type = bgl.GL_SHORT
-    elif type == np.int32:   type = bgl.GL_INT
-    elif type == np.float32: type = bgl.GL_FLOAT
-    elif type == np.float64: type = bgl.GL_DOUBLE
-    else: raise
 
-    _decref = ctypes.pythonapi.Py_DecRef
-    _incref = ctypes.pythonapi.Py_IncRef
+class VoidBufValue():
+    '''
+    bgl.Buffer (self.buf) whose data pointer is value, for passing offsets
+    into bound GL buffers (ex: glVertexAttribPointer, glDrawElements).
+    self.buf does not depend on this object, so it can be kept on its own
+    '''
+    def __init__(self, value):
+        self.buf,_ = _make_Buffer(1, None, value)
 
-    _decref.argtypes = _incref.argtypes = [ctypes.py_object]
-    _decref.restype = _incref.restype = None
 
-    buf = bgl.Buffer(bgl.GL_BYTE, (1, *array.shape))[0]
-    c_buf = C_Buffer.from_address(id(buf))
+# bgl.Buffer only knows signed types; unsigned arrays use the signed type of
+# the same size (the bytes are the same, and GL is told the type separately)
+_np_dtype_to_gl = {
+    np.dtype(np.int8):    'GL_BYTE',
+    np.dtype(np.uint8):   'GL_BYTE',
+    np.dtype(np.int16):   'GL_SHORT',
+    np.dtype(np.uint16):  'GL_SHORT',
+    np.dtype(np.int32):   'GL_INT',
+    np.dtype(np.uint32):  'GL_INT',
+    np.dtype(np.float32): 'GL_FLOAT',
+    np.dtype(np.float64): 'GL_DOUBLE',
+}
 
-    _decref(c_buf.parent)
-    _incref(array)
 
-    c_buf.parent = array # Prevents MEM_freeN
-    c_buf.type = type
-    c_buf.buf = array.ctypes.data
+def np_array_as_bgl_Buffer(array):
+    '''
+    returns bgl.Buffer that shares memory with array (no copy).  array can be
+    a NumPy array or any object with the buffer protocol (bytes, memoryview,
+    array.array, ...).  the Buffer holds a reference to array, so the memory
+    stays valid for as long as the Buffer is alive.
+    raises TypeError for unsupported dtypes, and ValueError if array is not
+    C-contiguous and aligned (use np.ascontiguousarray)
+    '''
+    if not isinstance(array, np.ndarray):
+        array = np.asarray(memoryview(array))
+    if array.dtype not in _np_dtype_to_gl:
+        raise TypeError('np_array_as_bgl_Buffer: unsupported dtype %s' % str(array.dtype))
+    if not array.flags['C_CONTIGUOUS'] or not array.flags['ALIGNED']:
+        raise ValueError('np_array_as_bgl_Buffer: array must be C-contiguous and aligned')
+    if _is_stub:
+        buf = bgl.Buffer.from_array(array)
+        buf.type = getattr(bgl, _np_dtype_to_gl[array.dtype])
+        return buf
+
+    shape = array.shape or (1,)
+    buf,c_buf = _make_Buffer(len(shape), array, array.ctypes.data)
+    c_buf.type = getattr(bgl, _np_dtype_to_gl[array.dtype])
+    for i,v in enumerate(shape):
+        c_buf.dimensions[i] = v
     return buf
 
 
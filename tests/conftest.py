@@ -0,0 +1,156 @@
+'''
+Copyright (C) 2018 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import os
+import sys
+import time
+import importlib.util
+import contextlib
+from unittest import mock
+
+import pytest
+
+
+'''
+addon_common is a package nested in the add-on (its modules use relative
+imports, ex: `from ..ext.bgl_ext import ...`), so tests import its modules
+through the folder name of this checkout:
+
+    kernels = import_module('common.kernels')
+
+modules that only need numpy (kernels, bmesh_utils, bgl_stub, ext.bgl_ext
+under the stub) run with plain pytest.  code that does not use Blender, but
+lives in modules that import it (ex: BGLBufferedRender in bmesh_render),
+runs with plain pytest through the blender_stubs fixture.  tests that need
+bpy, bmesh, or mathutils are skipped unless run inside Blender.
+'''
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(ROOT)
+if os.path.dirname(ROOT) not in sys.path:
+    sys.path.insert(0, os.path.dirname(ROOT))
+
+
+def import_module(name):
+    return importlib.import_module('%s.%s' % (PACKAGE, name))
+
+
+@contextlib.contextmanager
+def installed_bgl(install):
+    '''
+    calls install to put a module in sys.modules as bgl, and yields it.
+    modules that were imported with another bgl (or that cache whether bgl
+    is the stub, like ext.bgl_ext) are reimported inside the block and
+    dropped afterwards
+    '''
+    prefix = PACKAGE + '.'
+    saved = {n: m for (n, m) in sys.modules.items() if n == 'bgl' or n.startswith(prefix)}
+    for name, module in saved.items():
+        if name == 'bgl' or hasattr(module, 'bgl'):
+            del sys.modules[name]
+    try:
+        yield install()
+    finally:
+        for name in [n for n in sys.modules if n == 'bgl' or n.startswith(prefix)]:
+            del sys.modules[name]
+        sys.modules.update(saved)
+
+
+@pytest.fixture
+def stub():
+    ''' installs bgl_stub as bgl for the duration of the test (see installed_bgl) '''
+    bgl_stub = import_module('common.bgl_stub')
+    with installed_bgl(lambda: bgl_stub.install(raster_size=(64, 64))) as stub:
+        yield stub
+
+
+BLENDER_MODULES = [
+    'bpy', 'bpy.types', 'bpy.props', 'bpy.app', 'bpy.app.handlers',
+    'bpy_extras', 'bpy_extras.view3d_utils', 'bmesh', 'bmesh.types', 'blf', 'gpu',
+    'mathutils', 'mathutils.bvhtree', 'mathutils.geometry', 'mathutils.kdtree', 'mathutils.interpolate',
+]
+
+
+@pytest.fixture
+def blender_stubs(monkeypatch):
+    '''
+    outside Blender, puts MagicMock stand-ins for the Blender modules in
+    sys.modules for the duration of the test, so modules that import them
+    can be imported.  only code that does not use them can be tested this
+    way.  mathutils types are empty classes, as maths subclasses them.
+    request before stub, so modules are imported with both
+    '''
+    if 'bpy' in sys.modules or importlib.util.find_spec('bpy'): return
+    for name in BLENDER_MODULES:
+        monkeypatch.setitem(sys.modules, name, mock.MagicMock(name=name))
+    sys.modules['bpy'].app.version = (2, 79, 0)
+    for name in ['Vector', 'Matrix', 'Quaternion', 'Color', 'Euler']:
+        setattr(sys.modules['mathutils'], name, type(name, (), {}))
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'blender: needs bpy/bmesh/mathutils (run inside Blender)')
+
+
+try:
+    import pytest_benchmark
+except ImportError:
+    pytest_benchmark = None
+
+if pytest_benchmark is None:
+    class Benchmark:
+        '''
+        minimal stand-in for the benchmark fixture of pytest-benchmark, so
+        the benchmark tests still run (and report timings with -s) when the
+        plugin is not installed
+        '''
+        rounds = 3
+
+        def __init__(self, name):
+            self.name = name
+            self.group = None
+            self.extra_info = {}
+            self.times = []
+
+        def __call__(self, fn, *args, **kwargs):
+            return self.pedantic(fn, args=args, kwargs=kwargs, rounds=self.rounds)
+
+        def pedantic(self, fn, args=(), kwargs=None, setup=None, rounds=1, iterations=1, warmup_rounds=0):
+            kwargs = kwargs or {}
+            for _ in range(warmup_rounds):
+                fn(*args, **kwargs)
+            for _ in range(rounds):
+                if setup:
+                    args, kwargs = setup() or (args, kwargs)
+                tstart = time.perf_counter()
+                for _ in range(iterations):
+                    result = fn(*args, **kwargs)
+                self.times.append((time.perf_counter() - tstart) / iterations)
+            print('\n%s%s: min %0.3fms over %d rounds %s' % (
+                ('[%s] ' % self.group) if self.group else '', self.name,
+                min(self.times) * 1000, len(self.times),
+                ' '.join('%s=%s' % kv for kv in sorted(self.extra_info.items())),
+            ))
+            return result
+
+    @pytest.fixture
+    def benchmark(request):
+        return Benchmark(request.node.name)
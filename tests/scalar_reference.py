@@ -0,0 +1,140 @@
+'''
+Copyright (C) 2018 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import math
+
+
+'''
+Line-for-line ports of the scalar routines in maths.py and debug.py that
+common/kernels.py vectorizes, written on plain tuples so they run without
+mathutils.  The kernel tests compare against these; inside Blender the
+tests also compare against maths.py and debug.py directly.
+'''
+
+
+def _sub(a, b): return tuple(x - y for (x, y) in zip(a, b))
+def _add(a, b): return tuple(x + y for (x, y) in zip(a, b))
+def _mul(a, s): return tuple(x * s for x in a)
+def _dot(a, b): return sum(x * y for (x, y) in zip(a, b))
+def _length(a): return math.sqrt(_dot(a, a))
+
+
+def triangle2D_det(p0, p1, p2):
+    return p0[0] * (p1[1] - p2[1]) + p1[0] * (p2[1] - p0[1]) + p2[0] * (p0[1] - p1[1])
+
+
+def triangle2D_overlap(triangle0, triangle1, eps=0.0):
+    ''' maths.triangle2D_overlap '''
+    def chk(e0, e1, p0, p1, p2):
+        return all(triangle2D_det(e0, e1, p) <= eps for p in (p0, p1, p2))
+
+    def chk_edges(a0, a1, a2, b0, b1, b2):
+        return chk(a0, a1, b0, b1, b2) or chk(a1, a2, b0, b1, b2) or chk(a2, a0, b0, b1, b2)
+
+    a0, a1, a2 = triangle0
+    b0, b1, b2 = triangle1
+    return not (chk_edges(a0, a1, a2, b0, b1, b2) or chk_edges(b0, b1, b2, a0, a1, a2))
+
+
+def triangle2D_area(p0, p1, p2):
+    ''' maths.triangle2D_area '''
+    return abs((p1[0] - p0[0]) * (p2[1] - p0[1]) - (p1[1] - p0[1]) * (p2[0] - p0[0])) / 2
+
+
+def _intersect_line_line_2d(a0, a1, b0, b1):
+    ''' mathutils.geometry.intersect_line_line_2d (segments) '''
+    da, db, dab = _sub(a1, a0), _sub(b1, b0), _sub(b0, a0)
+    denom = da[0] * db[1] - da[1] * db[0]
+    if denom == 0:
+        return None
+    t = (dab[0] * db[1] - dab[1] * db[0]) / denom
+    u = (dab[0] * da[1] - dab[1] * da[0]) / denom
+    if 0 <= t <= 1 and 0 <= u <= 1:
+        return _add(a0, _mul(da, t))
+    return None
+
+
+def point_inside_loop2d(loop, point):
+    ''' debug.point_inside_loop2d (counts crossings to a point outside the loop) '''
+    out = (1.1 * max(v[0] for v in loop), 1.1 * max(v[1] for v in loop))
+    intersections = sum(
+        1 for i in range(len(loop))
+        if _intersect_line_line_2d(point, out, loop[i - 1], loop[i])
+    )
+    return bool(math.fmod(intersections, 2))
+
+
+def get_path_length(verts):
+    ''' maths.get_path_length, debug.get_path_length '''
+    if len(verts) < 2:
+        return 0
+    return sum(_length(_sub(verts[i + 1], verts[i])) for i in range(len(verts) - 1))
+
+
+def closest_t_and_distance_point_to_line_segment(p, p0, p1):
+    ''' debug.closest_t_and_distance_point_to_line_segment '''
+    v0p, v1p, v01 = _sub(p, p0), _sub(p, p1), _sub(p1, p0)
+    if _length(v01) == 0: return (0.0, _length(v0p))
+    if _dot(v01, v0p) < 0: return (0.0, _length(v0p))
+    if _dot(v01, v1p) > 0: return (1.0, _length(v1p))
+    v01n = _mul(v01, 1 / _length(v01))
+    d_on_line = _dot(v01n, v0p)
+    p_on_line = _add(p0, _mul(v01n, d_on_line))
+    return (d_on_line / _length(v01), _length(_sub(p, p_on_line)))
+
+
+def _cross(a, b):
+    return (a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0])
+
+
+def vector_angle_between(v0, v1, vcross):
+    ''' debug.vector_angle_between '''
+    a = math.acos(max(-1.0, min(1.0, _dot(v0, v1) / (_length(v0) * _length(v1)))))
+    d = _dot(_cross(v0, v1), vcross)
+    return a if d < 0 else 2 * math.pi - a
+
+
+def delta_angles(vec_about, l_vecs):
+    ''' maths.delta_angles '''
+    v0 = l_vecs[0]
+    l_angles = [0] + [vector_angle_between(v0, v1, vec_about) for v1 in l_vecs[1:]]
+    L = len(l_angles)
+    return [l_angles[n + 1] - l_angles[n] for n in range(0, L - 1)] + [2 * math.pi - l_angles[-1]]
+
+
+def sort_objects_by_angles(vec_about, l_objs, l_vecs):
+    ''' debug.sort_objects_by_angles '''
+    if len(l_objs) <= 1: return l_objs
+    v0 = l_vecs[0]
+    l_angles = [0] + [vector_angle_between(v0, v1, vec_about) for v1 in l_vecs[1:]]
+    l_inds = sorted(range(len(l_objs)), key=lambda i: l_angles[i])
+    return [l_objs[i] for i in l_inds]
+
+
+def clamp(v, min_v, max_v):
+    return max(min_v, min(max_v, v))
+
+
+def mid(v0, v1, v2):
+    if v0 > v1: v0, v1 = v1, v0
+    if v1 > v2: v1, v2 = v2, v1
+    if v0 > v1: v0, v1 = v1, v0
+    return v1
@@ -0,0 +1,256 @@
+'''
+Copyright (C) 2018 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import gc
+import sys
+import array
+import types
+import ctypes
+import weakref
+
+import numpy as np
+import pytest
+
+from conftest import PACKAGE, import_module, installed_bgl
+
+
+'''
+ext.bgl_ext with bgl_stub as bgl (NumPy-backed Buffers), and with
+ctypes_bgl, a bgl whose Buffers are C_Buffer structs, so the ctypes paths
+(struct writes and reference counting) run without Blender
+'''
+
+
+@pytest.fixture
+def bgl_ext(stub):
+    return import_module('ext.bgl_ext')
+
+
+@pytest.mark.parametrize('dtype,gltype', [
+    (np.int8, 'GL_BYTE'), (np.uint8, 'GL_BYTE'),
+    (np.int16, 'GL_SHORT'), (np.uint16, 'GL_SHORT'),
+    (np.int32, 'GL_INT'), (np.uint32, 'GL_INT'),
+    (np.float32, 'GL_FLOAT'), (np.float64, 'GL_DOUBLE'),
+])
+def test_np_array_as_bgl_Buffer_types(stub, bgl_ext, dtype, gltype):
+    # unsigned arrays use the signed type of the same size
+    data = np.arange(12, dtype=dtype).reshape(4, 3)
+    buf = bgl_ext.np_array_as_bgl_Buffer(data)
+    assert buf.type == getattr(stub, gltype)
+    assert buf.dimensions == [4, 3]
+    data[1, 2] = 42
+    assert buf[1][2] == 42      # shares memory
+
+
+@pytest.mark.parametrize('dtype', [np.int64, np.uint64, np.float16, np.complex64, np.bool_])
+def test_np_array_as_bgl_Buffer_unsupported_dtype(bgl_ext, dtype):
+    with pytest.raises(TypeError):
+        bgl_ext.np_array_as_bgl_Buffer(np.zeros(4, dtype=dtype))
+
+
+def test_np_array_as_bgl_Buffer_wrong_type(bgl_ext):
+    with pytest.raises(TypeError):
+        bgl_ext.np_array_as_bgl_Buffer([1.0, 2.0, 3.0])
+    with pytest.raises(TypeError):
+        bgl_ext.np_array_as_bgl_Buffer(None)
+
+
+def test_np_array_as_bgl_Buffer_non_contiguous(bgl_ext):
+    data = np.zeros((10, 3), dtype=np.float32)
+    with pytest.raises(ValueError):
+        bgl_ext.np_array_as_bgl_Buffer(data[::2])
+    with pytest.raises(ValueError):
+        bgl_ext.np_array_as_bgl_Buffer(data.T)
+    raw = np.zeros(4 * 4 + 1, dtype=np.uint8)
+    with pytest.raises(ValueError):
+        bgl_ext.np_array_as_bgl_Buffer(raw[1:].view(np.float32))     # unaligned
+    bgl_ext.np_array_as_bgl_Buffer(np.ascontiguousarray(data[::2]))
+
+
+def test_np_array_as_bgl_Buffer_memoryview_fallback(stub, bgl_ext):
+    data = bytearray(b'\x01\x02\x03')
+    buf = bgl_ext.np_array_as_bgl_Buffer(data)
+    assert buf.type == stub.GL_BYTE
+    data[0] = 9
+    assert buf[0] == 9          # shares memory
+
+    buf = bgl_ext.np_array_as_bgl_Buffer(array.array('f', [1.0, 2.0]))
+    assert buf.type == stub.GL_FLOAT and buf.to_list() == [1.0, 2.0]
+    buf = bgl_ext.np_array_as_bgl_Buffer(memoryview(np.arange(3, dtype=np.uint16)))
+    assert buf.type == stub.GL_SHORT and buf.to_list() == [0, 1, 2]
+
+
+def test_np_array_as_bgl_Buffer_keeps_array_alive(bgl_ext):
+    data = np.arange(8, dtype=np.float32)
+    ref = weakref.ref(data)
+    buf = bgl_ext.np_array_as_bgl_Buffer(data)
+    del data
+    gc.collect()
+    assert ref() is not None
+    del buf
+    gc.collect()
+    assert ref() is None
+
+
+def test_make_Buffer_keeps_parent_alive(bgl_ext):
+    owner = np.zeros(4)
+    ref = weakref.ref(owner)
+    buf, _ = bgl_ext._make_Buffer(1, owner, 128)
+    del owner
+    gc.collect()
+    assert ref() is not None and buf.parent is ref()
+    assert buf.offset == 128
+    del buf
+    gc.collect()
+    assert ref() is None
+
+
+def test_VoidBufValue(bgl_ext):
+    value = bgl_ext.VoidBufValue(64)
+    ref = weakref.ref(value)
+    buf = value.buf
+    # the Buffer does not depend on (or keep alive) the VoidBufValue
+    del value
+    gc.collect()
+    assert ref() is None
+    assert buf.offset == 64 and buf.parent is None
+
+
+###############################################################################
+# ctypes paths
+
+
+def _C_Buffer():
+    # C_Buffer of the bgl_ext being imported with ctypes_bgl
+    return sys.modules[PACKAGE + '.ext.bgl_ext'].C_Buffer
+
+
+class _BufferType(type):
+    # bgl_ext checks that its C_Buffer has the size of bgl.Buffer
+    __basicsize__ = property(lambda cls: ctypes.sizeof(_C_Buffer()))
+
+
+class CtypesBuffer(metaclass=_BufferType):
+    '''
+    stand-in for bgl.Buffer whose C struct is a C_Buffer kept in structs
+    (keyed on id), and which manages parent like bgl.c: items of a Buffer
+    hold a reference to it, and dealloc releases parent
+    '''
+    structs = {}
+
+    def __init__(self, type, dimensions, parent=None):
+        dims = [dimensions] if isinstance(dimensions, int) else list(dimensions)
+        self._dims = (ctypes.c_int * len(dims))(*dims)
+        c_buf = _C_Buffer()()
+        c_buf.type, c_buf.ndimensions = type, len(dims)
+        c_buf.dimensions = ctypes.cast(self._dims, ctypes.POINTER(ctypes.c_int))
+        if parent is not None:
+            ctypes.pythonapi.Py_IncRef(ctypes.py_object(parent))
+            c_buf.parent = parent
+        CtypesBuffer.structs[id(self)] = c_buf
+
+    def __getitem__(self, index):
+        # like Buffer_item: sub-Buffer with its own dimensions and parent self
+        return CtypesBuffer(CtypesBuffer.structs[id(self)].type, list(self._dims)[1:], parent=self)
+
+    def __del__(self):
+        c_buf = CtypesBuffer.structs.pop(id(self))
+        try:
+            parent = c_buf.parent
+        except ValueError:
+            return      # NULL parent
+        ctypes.pythonapi.Py_DecRef(ctypes.py_object(parent))
+
+
+@pytest.fixture
+def ctypes_bgl(monkeypatch):
+    ''' returns ext.bgl_ext imported with a bgl of CtypesBuffers '''
+    bgl = types.ModuleType('bgl')
+    bgl.Buffer = CtypesBuffer
+    bgl.GL_BYTE, bgl.GL_SHORT, bgl.GL_INT = 0x1400, 0x1402, 0x1404
+    bgl.GL_FLOAT, bgl.GL_DOUBLE = 0x1406, 0x140A
+    def install():
+        sys.modules['bgl'] = bgl
+        bgl_ext = import_module('ext.bgl_ext')
+        structs = CtypesBuffer.structs
+        monkeypatch.setattr(bgl_ext.C_Buffer, 'from_address', classmethod(lambda cls, address: structs[address]))
+        return bgl_ext
+    with installed_bgl(install) as bgl_ext:
+        yield bgl_ext
+    gc.collect()
+    assert not CtypesBuffer.structs, 'Buffers were leaked'
+
+
+def test_ctypes_make_Buffer(ctypes_bgl):
+    owner = np.zeros(4)
+    refs = sys.getrefcount(owner)
+    buf, c_buf = ctypes_bgl._make_Buffer(2, owner, 1234)
+    assert not ctypes_bgl._is_stub
+    assert c_buf.buf == 1234
+    assert c_buf.parent is owner
+    assert c_buf.ndimensions == 2 and c_buf.dimensions[0] == c_buf.dimensions[1] == 1
+    # the indexed Buffer was released; buf holds a reference to owner
+    assert len(CtypesBuffer.structs) == 1
+    del c_buf
+    assert sys.getrefcount(owner) > refs
+    del buf
+    gc.collect()
+    assert sys.getrefcount(owner) == refs
+    assert not CtypesBuffer.structs
+
+
+@pytest.mark.parametrize('dtype,gltype', [
+    (np.int8, 'GL_BYTE'), (np.uint8, 'GL_BYTE'),
+    (np.int16, 'GL_SHORT'), (np.uint16, 'GL_SHORT'),
+    (np.int32, 'GL_INT'), (np.uint32, 'GL_INT'),
+    (np.float32, 'GL_FLOAT'), (np.float64, 'GL_DOUBLE'),
+])
+@pytest.mark.parametrize('shape', [(), (5,), (4, 3), (2, 3, 4)])
+def test_ctypes_np_array_as_bgl_Buffer(ctypes_bgl, dtype, gltype, shape):
+    data = np.zeros(shape, dtype=dtype)
+    refs = sys.getrefcount(data)
+    ref = weakref.ref(data)
+    buf = ctypes_bgl.np_array_as_bgl_Buffer(data)
+    c_buf = CtypesBuffer.structs[id(buf)]
+    assert c_buf.type == getattr(sys.modules['bgl'], gltype)
+    assert c_buf.buf == data.ctypes.data            # shares memory
+    assert c_buf.parent is data
+    shape = shape or (1,)
+    assert c_buf.ndimensions == len(shape)
+    assert [c_buf.dimensions[i] for i in range(len(shape))] == list(shape)
+    del c_buf
+    assert sys.getrefcount(data) > refs
+    del data
+    gc.collect()
+    assert ref() is not None                        # buf keeps array alive
+    del buf
+    gc.collect()
+    assert ref() is None
+
+
+def test_ctypes_VoidBufValue(ctypes_bgl):
+    value = ctypes_bgl.VoidBufValue(64)
+    buf = value.buf
+    c_buf = CtypesBuffer.structs[id(buf)]
+    assert c_buf.buf == 64 and c_buf.parent is None
+    del value, c_buf
+    gc.collect()
+    assert id(buf) in CtypesBuffer.structs          # buf does not depend on VoidBufValue
@@ -0,0 +1,154 @@
+'''
+Copyright (C) 2018 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import numpy as np
+import pytest
+
+
+'''
+bgl_stub driven directly (numpy only), the way BGLBufferedRender and
+Shader drive it.  BMeshRender under the stub is in test_bmesh_render.py
+'''
+
+
+def setup_triangles(stub, tris, indices=None):
+    '''
+    creates a program with a vert_pos attrib pointing at tris (n x 3 x 3),
+    and optionally binds an element buffer with indices (uint32)
+    '''
+    program = stub.glCreateProgram()
+    stub.glUseProgram(program)
+    buf = stub.Buffer(stub.GL_INT, 2)
+    stub.glGenBuffers(2, buf)
+    data = np.asarray(tris, dtype=np.float32).reshape(-1, 3)
+    stub.glBindBuffer(stub.GL_ARRAY_BUFFER, buf[0])
+    stub.glBufferData(stub.GL_ARRAY_BUFFER, data.nbytes, stub.Buffer.from_array(data), stub.GL_STATIC_DRAW)
+    loc = stub.glGetAttribLocation(program, 'vert_pos')
+    stub.glVertexAttribPointer(loc, 3, stub.GL_FLOAT, stub.GL_FALSE, 0, stub.Buffer.pointer(0))
+    if indices is not None:
+        idx = np.asarray(indices, dtype=np.uint32)
+        stub.glBindBuffer(stub.GL_ELEMENT_ARRAY_BUFFER, buf[1])
+        stub.glBufferData(stub.GL_ELEMENT_ARRAY_BUFFER, idx.nbytes, stub.Buffer.from_array(idx), stub.GL_STATIC_DRAW)
+    return program
+
+
+def set_vert_scales(stub, program, scales):
+    scales = np.asarray(scales, dtype=np.float32)
+    loc = stub.glGetUniformLocation(program, 'vert_scales')
+    stub.glUniform3fv(loc, len(scales), stub.Buffer.from_array(scales))
+
+
+# triangle covering part of the right half (x > 0) of the raster
+right_tri = [[(0.2, -0.5, 0.0), (0.8, -0.5, 0.0), (0.5, 0.5, 0.0)]]
+
+
+def covered(stub):
+    ''' returns number of covered pixels in left and right halves of image '''
+    mask = stub.image[..., 3] > 0
+    w = mask.shape[1]
+    return int(mask[:, :w // 2].sum()), int(mask[:, w // 2:].sum())
+
+
+###############################################################################
+# draw counting
+
+
+def test_instanced_arrays_count_one_draw_call(stub):
+    program = setup_triangles(stub, right_tri * 4)
+    set_vert_scales(stub, program, [(1, 1, 1)] * 8)
+    stub.begin_frame()
+    stub.glDrawArraysInstanced(stub.GL_TRIANGLES, 0, 12, 8)
+    stats = stub.end_frame()
+    assert stats['draw calls'] == 1
+    assert stats['vertices'] == 12 * 8
+    assert stub.calls['glDrawArraysInstanced'] == 1
+
+
+def test_instanced_elements_count_one_draw_call(stub):
+    program = setup_triangles(stub, right_tri, indices=[0, 1, 2, 2, 1, 0])
+    set_vert_scales(stub, program, [(1, 1, 1)] * 3)
+    stub.begin_frame()
+    stub.glDrawElementsInstanced(stub.GL_TRIANGLES, 6, stub.GL_UNSIGNED_INT, stub.Buffer.pointer(0), 3)
+    stats = stub.end_frame()
+    assert stats['draw calls'] == 1
+    assert stats['vertices'] == 6 * 3
+    assert stub.calls['glDrawElementsInstanced'] == 1
+    assert stub.calls['glDrawElements'] == 0
+
+
+def test_uniform_arrays_are_stored(stub):
+    program = setup_triangles(stub, right_tri)
+    set_vert_scales(stub, program, [(1, 1, 1), (-1, 1, 1)])
+    assert stub.get_uniform('vert_scales') == ((1, 1, 1), (-1, 1, 1))
+
+
+###############################################################################
+# rasterizing
+
+
+def test_instanced_draw_rasterizes_each_vert_scale(stub):
+    program = setup_triangles(stub, right_tri)
+    set_vert_scales(stub, program, [(1, 1, 1), (-1, 1, 1)])
+    stub.glDrawArraysInstanced(stub.GL_TRIANGLES, 0, 3, 2)
+    left, right = covered(stub)
+    assert right > 0 and left == right      # mirrored copy in the left half
+
+    # only the first instance
+    stub.clear_image()
+    stub.glDrawArraysInstanced(stub.GL_TRIANGLES, 0, 3, 1)
+    assert covered(stub) == (0, right)
+
+
+def test_draw_applies_vert_scale(stub):
+    program = setup_triangles(stub, right_tri)
+    stub.glDrawArrays(stub.GL_TRIANGLES, 0, 3)
+    left, right = covered(stub)
+    assert left == 0 and right > 0
+
+    stub.clear_image()
+    stub.glUniform3f(stub.glGetUniformLocation(program, 'vert_scale'), -1.0, 1.0, 1.0)
+    stub.glDrawArrays(stub.GL_TRIANGLES, 0, 3)
+    assert covered(stub) == (right, 0)
+
+
+###############################################################################
+# benchmarks
+
+
+@pytest.mark.parametrize('ntris', [1000, 5000])
+def test_benchmark_stub_instanced_draw(stub, benchmark, ntris):
+    ''' CPU cost of counting and rasterizing a mirrored (2 instance) draw under the stub '''
+    rng = np.random.default_rng(0)
+    tris = rng.random((ntris, 1, 3)) * 0.1 + rng.random((ntris, 3, 3)) * 0.02
+    program = setup_triangles(stub, tris)
+    set_vert_scales(stub, program, [(1, 1, 1), (-1, 1, 1)])
+
+    def draw():
+        stub.clear_image()
+        stub.begin_frame()
+        stub.glDrawArraysInstanced(stub.GL_TRIANGLES, 0, ntris * 3, 2)
+        return stub.end_frame()
+
+    benchmark.group = 'stub instanced draw'
+    benchmark.extra_info['triangles'] = ntris
+    stats = benchmark(draw)
+    assert stats['draw calls'] == 1 and stats['vertices'] == ntris * 3 * 2
+    assert covered(stub)[0] > 0 and covered(stub)[1] > 0
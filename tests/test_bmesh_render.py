@@ -0,0 +1,143 @@
+'''
+Copyright (C) 2018 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import types
+
+import numpy as np
+import pytest
+
+from conftest import import_module
+
+
+'''
+bmesh_render under bgl_stub.  needs bpy, bmesh, and mathutils, so run
+inside Blender (no GPU needed), for example:
+
+    blender --background --python-expr "import pytest; pytest.main(['addon_common/tests'])"
+'''
+
+bmesh = pytest.importorskip('bmesh')
+pytestmark = pytest.mark.blender
+
+
+@pytest.fixture
+def bmesh_render(stub):
+    ''' bmesh_render, imported with the stub as bgl '''
+    return import_module('common.bmesh_render')
+
+
+def create_grid(segments):
+    ''' returns BMesh of a segments x segments grid of quads '''
+    bme = bmesh.new()
+    bmesh.ops.create_grid(bme, x_segments=segments, y_segments=segments, size=1.0)
+    return bme
+
+
+###############################################################################
+# glDraw* functions
+
+
+def test_glDrawBuffered_reuses_gl_buffers(stub, bmesh_render):
+    bme = create_grid(4)
+    faces = list(bme.faces)
+    bmesh_render.glDrawBMFaces(faces)
+
+    # same number of vertices: storage is overwritten, not reallocated
+    stub.begin_frame()
+    bmesh_render.glDrawBMFaces(faces)
+    assert stub.calls['glBufferData'] == 0
+    assert stub.calls['glBufferSubData'] == 3
+
+    stub.begin_frame()
+    bmesh_render.glDrawBMFaces(faces[:2])
+    assert stub.calls['glBufferData'] == 3
+    bme.free()
+
+
+def test_vertex_dict_option(stub, bmesh_render):
+    bme = create_grid(2)
+    moved = bmesh_render.Vector((1, 2, 3))
+    vdict = {bmv: (moved, bmv.normal) for bmv in bme.verts}
+    bmesh_render.glDrawBMVerts(list(bme.verts), opts={'vertex dict': vdict})
+    render = bmesh_render.get_immediate_render(stub.GL_POINTS)
+    assert np.allclose(render.arrays['pos'], (1, 2, 3))
+
+    # vertices missing from the dict are added with their own co and normal
+    vdict = {}
+    bmesh_render.glDrawBMEdges(list(bme.edges), opts={'vertex dict': vdict})
+    assert set(vdict) == set(bme.verts)
+    render = bmesh_render.get_immediate_render(stub.GL_LINES)
+    assert np.allclose(render.arrays['pos'][:2], [tuple(bmv.co) for bmv in bme.edges[0].verts])
+    bme.free()
+
+
+def test_draw_errors_propagate_under_stub(stub, bmesh_render, monkeypatch):
+    # BMeshRender.draw hides errors with a real bgl, but not under the stub
+    render = bmesh_render.BMeshRender(create_grid(2))
+    def fail(*args, **kwargs): raise RuntimeError('draw failed')
+    monkeypatch.setattr(render.buf_faces, 'draw', fail)
+    with pytest.raises(RuntimeError):
+        render.draw({})
+
+
+def test_mirror_uniforms_reach_selected_variant(stub, bmesh_render):
+    # glSetMirror assigns to the variant selected at the time; drawing with
+    # another variant must still use the mirror settings
+    shader = bmesh_render.bmeshShader
+    shader.select({'CULL_BACKFACES': 'false'})
+    frame = types.SimpleNamespace(
+        o=bmesh_render.Vector((1, 2, 3)), x=bmesh_render.Vector((1, 0, 0)),
+        y=bmesh_render.Vector((0, 1, 0)), z=bmesh_render.Vector((0, 0, 1)),
+    )
+    bmesh_render.glSetMirror(symmetry={'x'}, view='Face', effect=0.5, frame=frame)
+
+    stub.record_log = True
+    bme = create_grid(2)
+    bmesh_render.glDrawBMFaces(list(bme.faces), opts={'cull backfaces': True})
+    variant = shader.get({'CULL_BACKFACES': 'true'})
+    assert variant is not shader.get({'CULL_BACKFACES': 'false'})
+    programs = [args[0] for (name, args) in stub.log if name == 'glUseProgram' and args[0]]
+    assert programs == [variant.shaderProg]
+    assert stub.calls['glDrawElementsInstanced'] + stub.calls['glDrawArraysInstanced'] + \
+        stub.calls['glDrawElements'] + stub.calls['glDrawArrays'] > 0
+
+    get = lambda name: stub.get_uniform(name, program=variant.shaderProg)
+    assert get('mirroring') == (1.0, 0.0, 0.0)
+    assert get('mirror_o') == (1.0, 2.0, 3.0)
+    assert get('mirror_view') == (2,)
+    assert get('mirror_effect') == (0.5,)
+    bme.free()
+
+
+###############################################################################
+# benchmarks
+
+
+def test_benchmark_bmesh_render(stub):
+    ''' bgl_stub.benchmark_bmesh_render: draws, vertices, and state changes per frame '''
+    bgl_stub = import_module('common.bgl_stub')
+    results = bgl_stub.benchmark_bmesh_render(resolutions=(8, 32), frames=1)
+    assert len(results) == 2
+    for stats in results:
+        assert stats['draw calls'] > 0 and stats['vertices'] > 0
+    # same number of draw calls; mirrored copies are instances, not extra draws
+    assert results[0]['draw calls'] == results[1]['draw calls']
+    assert results[1]['vertices'] > results[0]['vertices']
@@ -0,0 +1,114 @@
+'''
+Copyright (C) 2018 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+import numpy as np
+import pytest
+
+from conftest import import_module
+
+bmesh_utils = import_module('common.bmesh_utils')
+
+
+def polygon_area(pts):
+    ''' signed (shoelace) area of 2D polygon; positive if counter-clockwise '''
+    pts = np.asarray(pts, dtype=np.float64)
+    x, y = pts[:, 0], pts[:, 1]
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+
+def check_triangulation(pts2d, axis=2):
+    '''
+    triangulates pts2d (lifted to 3D, in the plane perpendicular to axis) and
+    checks that the triangles cover the polygon exactly: n - 2 triangles with
+    the winding of the polygon, whose areas sum to the polygon's area
+    '''
+    coords = [tuple(np.insert(np.asarray(p, dtype=np.float64), axis, 0.0)) for p in pts2d]
+    tris = bmesh_utils.triangulate_polygon(coords)
+    n = len(pts2d)
+    assert len(tris) == 3 * (n - 2)
+    assert set(tris) <= set(range(n))
+    area = polygon_area(pts2d)
+    tri_areas = [polygon_area([pts2d[i] for i in tris[k:k+3]]) for k in range(0, len(tris), 3)]
+    assert all(a * area >= 0 for a in tri_areas)        # same winding as polygon (or degenerate)
+    assert sum(tri_areas) == pytest.approx(area)
+    return tris
+
+
+# concave "arrow": the reflex vertex (index 3) must not be fanned from
+arrow = [(0, 0), (4, 0), (4, 4), (2, 1), (0, 4)]
+
+
+def test_triangulate_polygon_convex_is_fan():
+    assert bmesh_utils.triangulate_polygon([(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)]) == (0, 1, 2, 0, 2, 3)
+    assert bmesh_utils.triangulate_polygon([(0, 0, 0), (1, 0, 0), (0, 1, 0)]) == (0, 1, 2)
+    assert bmesh_utils.triangulate_polygon([(0, 0, 0), (1, 0, 0)]) == ()
+
+
+@pytest.mark.parametrize('axis', [0, 1, 2])
+def test_triangulate_polygon_concave(axis):
+    check_triangulation(arrow, axis=axis)
+    # comb with several reflex vertices
+    comb = [(0, 0), (6, 0), (6, 3), (5, 3), (5, 1), (4, 1), (4, 3), (3, 3), (3, 1), (2, 1), (2, 3), (0, 3)]
+    check_triangulation(comb, axis=axis)
+
+
+def test_triangulate_polygon_clockwise():
+    # same polygons in clockwise order (ex: face seen from behind)
+    check_triangulation(arrow[::-1])
+    check_triangulation([(0, 0), (0, 2), (1, 1), (2, 2), (2, 0)])
+
+
+def test_triangulate_polygon_collinear():
+    # square with extra verts along its edges: convex, fanned
+    check_triangulation([(0, 0), (1, 0), (2, 0), (2, 2), (1, 2), (0, 2)])
+    # collinear verts next to a reflex vertex
+    check_triangulation([(0, 0), (2, 0), (4, 0), (4, 4), (3, 2), (2, 1), (1, 2), (0, 4)])
+
+
+class Vert:
+    def __init__(self, co):
+        self.co = co
+
+
+class Face:
+    def __init__(self, verts):
+        self.verts = verts
+
+
+def test_triangulation_cache_follows_moved_verts():
+    verts = [Vert((x, y, 0.0)) for (x, y) in [(0, 0), (4, 0), (4, 4), (2, 5), (0, 4)]]
+    face = Face(verts)
+    cache = bmesh_utils.BMeshTriangulationCache()
+    fan = cache.get_indices(face)
+    assert fan == (0, 1, 2, 0, 2, 3, 0, 3, 4)
+    assert cache.get_indices(face) is fan       # cached
+
+    # moving vert 3 down makes face concave: fan from vert 0 would cover outside of face
+    verts[3].co = (2, 1, 0.0)
+    tris = cache.get_indices(face)
+    assert tris != fan
+    assert tris == bmesh_utils.triangulate_polygon([v.co for v in verts])
+    assert cache.get_indices(face) is tris
+
+    # topology change
+    face.verts = verts[:4]
+    assert cache.get_indices(face) == bmesh_utils.triangulate_polygon([v.co for v in verts[:4]])
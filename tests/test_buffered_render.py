@@ -0,0 +1,218 @@
+'''
+Copyright (C) 2018 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import numpy as np
+import pytest
+
+from conftest import import_module
+
+
+'''
+BGLBufferedRender (and the array builders of bmesh_render) under
+bgl_stub.  these do not use Blender, so they run with plain pytest through
+the blender_stubs fixture.  BMeshRender is in test_bmesh_render.py
+'''
+
+
+@pytest.fixture
+def bmesh_render(blender_stubs, stub):
+    ''' bmesh_render, imported with the stub as bgl '''
+    return import_module('common.bmesh_render')
+
+
+class GridVert:
+    def __init__(self, co):
+        self.co, self.normal = co, (0.0, 0.0, 1.0)
+
+
+class GridFace:
+    def __init__(self, verts):
+        self.verts, self.normal = verts, (0.0, 0.0, 1.0)
+        self.smooth, self.select = False, False
+
+
+def grid_faces(segments):
+    '''
+    returns faces of a segments x segments grid of quads, as stand-ins with
+    the attributes of BMFace and BMVert that bmfaces_to_arrays reads
+    '''
+    coords = np.linspace(-1.0, 1.0, segments + 1).tolist()
+    verts = [GridVert((x, y, 0.0)) for y in coords for x in coords]
+    w = segments + 1
+    return [
+        GridFace([verts[j*w+i], verts[j*w+i+1], verts[(j+1)*w+i+1], verts[(j+1)*w+i]])
+        for j in range(segments) for i in range(segments)
+    ]
+
+
+###############################################################################
+# partial uploads
+
+
+def test_small_edits_upload_only_dirty_ranges(stub, bmesh_render):
+    n = 30000
+    pos = np.random.default_rng(0).random((n, 3)).astype(np.float32)
+    keys = list(range(n // 3)) * 3      # each key is used by 3 scattered vertices
+    render = bmesh_render.BGLBufferedRender(stub.GL_TRIANGLES)
+
+    stub.begin_frame()
+    render.buffer(pos, pos, np.zeros(n), None, keys=keys)
+    assert stub.end_frame()['upload bytes'] == n * (12 + 12 + 1)
+
+    # moving one vertex uploads its 3 copies only
+    stub.begin_frame()
+    render.update_key(5, pos=(1, 2, 3))
+    render.flush()
+    stats = stub.end_frame()
+    assert stats['upload bytes'] == 3 * 12
+    assert stub.calls['glBufferData'] == 0
+    gpu_pos = stub.buffers[render.vbo_pos].view(np.float32).reshape(n, 3)
+    assert np.allclose(gpu_pos[[5, 5 + n // 3, 5 + 2 * n // 3]], (1, 2, 3))
+    assert np.array_equal(gpu_pos[6], pos[6])
+
+    # selection changes upload one byte per changed vertex
+    sel = np.zeros(n, dtype=np.uint8)
+    sel[[0, 1000, 20000]] = 1
+    stub.begin_frame()
+    render.update_selection(sel)
+    render.flush()
+    assert stub.end_frame()['upload bytes'] == 3
+    assert np.array_equal(stub.buffers[render.vbo_sel], sel)
+
+    # nearby edits are merged into one upload
+    stub.begin_frame()
+    render.update_offsets([100, 103], norm=(0, 0, 1))
+    render.flush()
+    assert stub.calls['glBufferSubData'] == 1
+    assert stub.end_frame()['upload bytes'] == 4 * 12
+
+
+###############################################################################
+# benchmarks
+
+
+def test_benchmark_build_buffers_1m_triangles(stub, bmesh_render, benchmark):
+    ''' CPU-side cost of building and uploading the buffers of a 1M triangle mesh '''
+    faces = grid_faces(710)
+    tricache = bmesh_render.BMeshTriangulationCache()
+    render = bmesh_render.BGLBufferedRender(stub.GL_TRIANGLES)
+
+    def build():
+        pos, norm, sel = bmesh_render.bmfaces_to_arrays(faces, tricache=tricache)
+        render.buffer(pos, norm, sel, None)
+        return len(pos) // 3
+
+    benchmark.group = 'build buffers'
+    ntris = benchmark.pedantic(build, rounds=1)
+    benchmark.extra_info['triangles'] = ntris
+    assert ntris >= 1000000
+    assert stub.stats['upload bytes'] == ntris * 3 * (4 * 3 + 4 * 3 + 1)
+
+
+def test_buffer_wraps_float32_arrays_without_copying(stub, bmesh_render):
+    pos = np.random.default_rng(1).random((300, 3)).astype(np.float32)
+    render = bmesh_render.BGLBufferedRender(stub.GL_POINTS)
+    render.buffer(pos, pos, np.zeros(300, dtype=np.uint8), None)
+    assert np.shares_memory(render.arrays['pos'], pos)
+    assert np.array_equal(stub.buffers[render.vbo_pos].view(np.float32).reshape(-1, 3), pos)
+    # lists (and other dtypes) are converted once
+    render.buffer(pos.tolist(), pos.astype(np.float64), [0] * 300, None)
+    assert render.arrays['pos'].dtype == np.float32 and render.arrays['norm'].dtype == np.float32
+
+
+@pytest.mark.parametrize('impl', ['list', 'array'])
+def test_benchmark_buffer_list_vs_array(stub, bmesh_render, benchmark, impl):
+    ''' time and peak Python memory of buffer() for list vs NumPy input '''
+    import tracemalloc
+    n = 300000
+    rng = np.random.default_rng(2)
+    pos, norm = rng.random((n, 3)).astype(np.float32), rng.random((n, 3)).astype(np.float32)
+    sel = np.zeros(n, dtype=np.uint8)
+    if impl == 'list':
+        pos, norm, sel = pos.tolist(), norm.tolist(), sel.tolist()
+    render = bmesh_render.BGLBufferedRender(stub.GL_TRIANGLES)
+
+    tracemalloc.start()
+    render.buffer(pos, norm, sel, None)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    benchmark.group = 'buffer list vs array'
+    benchmark.extra_info['peak MB'] = round(peak / 1e6, 1)
+    benchmark(render.buffer, pos, norm, sel, None)
+    if impl == 'array':
+        # CPU-side copy is the input itself; only the stub's GPU copy is allocated
+        assert peak < 2 * n * (12 + 12 + 1)
+
+
+###############################################################################
+# culling and decimation
+
+
+def set_chunks(render, boxes, starts, lod_starts):
+    ''' sets chunks of render directly: boxes of (mins, maxs), and vertex / lod index starts (with end) '''
+    render.count = starts[-1]
+    render.chunks = {
+        'mins': np.array([mn for (mn, _) in boxes], dtype=np.float32),
+        'maxs': np.array([mx for (_, mx) in boxes], dtype=np.float32),
+        'starts': np.array(starts[:-1]), 'ends': np.array(starts[1:]),
+        'lod starts': np.array(lod_starts[:-1]), 'lod ends': np.array(lod_starts[1:]),
+    }
+
+
+def test_get_draw_ranges_merges_culled_and_lod_chunks(stub, bmesh_render):
+    render = bmesh_render.BGLBufferedRender(stub.GL_TRIANGLES)
+    set_chunks(render, [
+        ((-0.8, -0.5, 0), (-0.2, 0.5, 0)),      # large
+        ((-0.2, -0.5, 0), (0.4, 0.5, 0)),       # large, next in buffer: merged with previous
+        ((2.0, -0.5, 0), (3.0, 0.5, 0)),        # outside view: culled
+        ((0.5, 0.0, 0), (0.6, 0.1, 0)),         # small: decimated
+        ((0.7, 0.0, 0), (0.8, 0.1, 0)),         # small, but decimated to nothing
+    ], starts=[0, 30, 60, 90, 120, 150], lod_starts=[0, 6, 9, 9, 15, 15])
+    viewport = (200, 200)
+
+    # no view: everything
+    assert render._get_draw_ranges([(1, 1, 1)]) == [(0, 150, None)]
+
+    ranges = render._get_draw_ranges([(1, 1, 1)], mvp=np.eye(4), viewport=viewport, lod_pixels=32)
+    assert [r[:2] for r in ranges] == [(0, 60), (0, 6)]
+    assert ranges[0][2] is None
+    assert ranges[1][2].offset == 9 * 4         # byte offset of chunk's decimated indices
+
+    # no decimation: small chunks are drawn in full, but not merged across the culled chunk
+    ranges = render._get_draw_ranges([(1, 1, 1)], mvp=np.eye(4), viewport=viewport, lod_pixels=0)
+    assert ranges == [(0, 60, None), (90, 60, None)]
+
+
+def test_get_draw_ranges_culls_against_all_scales(stub, bmesh_render):
+    render = bmesh_render.BGLBufferedRender(stub.GL_TRIANGLES)
+    set_chunks(render, [
+        ((-0.9, -0.5, 0), (-0.5, 0.5, 0)),
+        ((0.5, -0.5, 0), (0.9, 0.5, 0)),
+    ], starts=[0, 30, 60], lod_starts=[0, 3, 6])
+    # view of x in [-2, 0]
+    mvp = np.eye(4)
+    mvp[0, 3] = 1.0
+    ranges = render._get_draw_ranges([(1, 1, 1)], mvp=mvp, viewport=(200, 200), lod_pixels=0)
+    assert ranges == [(0, 30, None)]
+    # mirrored copy of second chunk is in view
+    ranges = render._get_draw_ranges([(1, 1, 1), (-1, 1, 1)], mvp=mvp, viewport=(200, 200), lod_pixels=0)
+    assert ranges == [(0, 60, None)]
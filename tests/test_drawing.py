@@ -0,0 +1,187 @@
+'''
+Copyright (C) 2018 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import numpy as np
+import pytest
+
+from conftest import import_module
+
+
+'''
+drawing under bgl_stub.  needs bpy and mathutils, so run inside Blender
+(see test_bmesh_render.py)
+'''
+
+bpy = pytest.importorskip('bpy')
+pytestmark = pytest.mark.blender
+
+
+@pytest.fixture
+def ImageAtlas(stub):
+    stub.record_log = True
+    return import_module('common.drawing').ImageAtlas
+
+
+def image(w, h, value=255):
+    return np.full((h, w, 4), value, dtype=np.uint8)
+
+
+def calls(stub, name):
+    return [args for (n, args) in stub.log if n == name]
+
+
+def test_image_atlas_uploads_dirty_rect(stub, ImageAtlas):
+    ImageAtlas.add('a', image(8, 4))
+    ImageAtlas.upload()
+    assert len(calls(stub, 'glTexImage2D')) == 1 and not calls(stub, 'glTexSubImage2D')
+
+    # nothing new: no upload
+    ImageAtlas.upload()
+    assert len(calls(stub, 'glTexImage2D')) == 1 and not calls(stub, 'glTexSubImage2D')
+
+    # later images only upload the rectangle covering them
+    ImageAtlas.add('b', image(3, 2))
+    ImageAtlas.add('c', image(5, 4))
+    ImageAtlas.upload()
+    assert len(calls(stub, 'glTexImage2D')) == 1
+    (args,) = calls(stub, 'glTexSubImage2D')
+    _, _, x, y, w, h, _, _, data = args
+    pad = ImageAtlas.PADDING
+    assert (x, y, w, h) == (8 + 3 * pad, pad, 3 + 2 * pad + 5, 4)
+    assert data.dimensions == [h, w, 4]
+
+
+def test_image_atlas_remove_releases_pages(stub, ImageAtlas):
+    ImageAtlas.add('a', image(8, 8))
+    ImageAtlas.add('big', image(ImageAtlas.PAGE_SIZE, 8))    # does not fit: second page
+    texture, _, _, _ = ImageAtlas.get('big')
+    ImageAtlas.upload()
+    assert len(ImageAtlas._pages) == 2
+
+    ImageAtlas.remove('big')
+    assert not ImageAtlas.has('big') and ImageAtlas.has('a')
+    (args,) = calls(stub, 'glDeleteTextures')
+    assert args[1][0] == texture
+    assert len(ImageAtlas._pages) == 1
+
+    ImageAtlas.remove('missing')    # ignored
+    ImageAtlas.clear()
+    assert not ImageAtlas.has('a') and not ImageAtlas._pages
+    assert len(calls(stub, 'glDeleteTextures')) == 2
+
+    # atlas is usable after clear; new page is allocated again
+    ImageAtlas.add('a', image(8, 8))
+    ImageAtlas.upload()
+    assert len(calls(stub, 'glTexImage2D')) == 3
+
+
+def test_image_atlas_release_removes_after_last_holder(stub, ImageAtlas):
+    ImageAtlas.add('a', image(8, 8))
+    ImageAtlas.acquire('a')
+    ImageAtlas.acquire('a')
+    ImageAtlas.release('a', ImageAtlas.generation)
+    ImageAtlas.upload()
+    assert ImageAtlas.has('a')
+    ImageAtlas.release('a', ImageAtlas.generation)
+    assert ImageAtlas.has('a')      # removal is deferred to upload (main thread)
+    ImageAtlas.upload()
+    assert not ImageAtlas.has('a')
+
+
+def test_image_atlas_clear_increments_generation(stub, ImageAtlas):
+    generation = ImageAtlas.generation
+    ImageAtlas.add('a', image(8, 8))
+    ImageAtlas.acquire('a')
+    ImageAtlas.clear()
+    assert ImageAtlas.generation == generation + 1
+
+    # releases from before clear do not remove images added after it
+    ImageAtlas.add('a', image(8, 8))
+    ImageAtlas.acquire('a')
+    ImageAtlas.release('a', generation)
+    ImageAtlas.upload()
+    assert ImageAtlas.has('a')
+    ImageAtlas.clear()
+
+
+@pytest.fixture
+def UI_Image(ImageAtlas):
+    ui = import_module('common.ui')
+    yield ui.UI_Image
+    ImageAtlas.clear()
+
+
+def test_ui_image_pixels_released_on_delete(stub, ImageAtlas, UI_Image):
+    a = UI_Image(image(4, 4, 10), async_load=False)
+    b = UI_Image(image(4, 4, 10), async_load=False)
+    assert not ImageAtlas._entries      # atlas is only touched while drawing
+    a.buffer_image()
+    b.buffer_image()
+    assert a.atlas_key == b.atlas_key and len(ImageAtlas._entries) == 1
+    key = a.atlas_key
+    del a
+    ImageAtlas.upload()
+    assert ImageAtlas.has(key)          # still used by b
+    del b
+    ImageAtlas.upload()
+    assert not ImageAtlas.has(key)
+
+
+def test_ui_image_rebuffers_after_clear(stub, ImageAtlas, UI_Image):
+    img = UI_Image(image(4, 4, 10), async_load=False)
+    img.buffer_image()
+    ImageAtlas.clear()
+    img.buffer_image()
+    assert img.buffered and ImageAtlas.has(img.atlas_key)
+    assert img.texture_id == ImageAtlas.get(img.atlas_key)[0]
+    assert img.atlas_generation == ImageAtlas.generation
+    ImageAtlas.upload()
+    assert len(calls(stub, 'glTexImage2D')) == 1
+
+
+def test_batch2d_flush_sets_scissor_per_call(stub, ImageAtlas, monkeypatch):
+    drawing = import_module('common.drawing')
+    ScissorStack = drawing.ScissorStack
+    monkeypatch.setattr(bpy.context, 'region', type('Region', (), {'width': 64, 'height': 64})(), raising=False)
+    monkeypatch.setattr(ScissorStack, 'started', True)
+    monkeypatch.setattr(ScissorStack, 'stack', [(0, 0, 64, 64)])
+    batch = drawing.Batch2D()
+    batch.rect(0, 10, 10, 10, (1, 0, 0, 1))
+    ScissorStack.stack.append((2, 2, 4, 4))
+    batch.rect(0, 10, 10, 10, (0, 1, 0, 1))
+    ScissorStack.stack.pop()
+    monkeypatch.setattr(ScissorStack, 'started', False)
+    batch.rect(0, 10, 10, 10, (0, 0, 1, 1))
+    monkeypatch.setattr(ScissorStack, 'started', True)
+    stub.log.clear()
+    batch.flush()
+
+    scissor_calls = [
+        (n, args) for (n, args) in stub.log
+        if n == 'glScissor' or (n in {'glEnable', 'glDisable'} and args[0] == stub.GL_SCISSOR_TEST)
+        or n == 'glDrawArrays'
+    ]
+    assert [(n, args if n != 'glDrawArrays' else None) for (n, args) in scissor_calls] == [
+        ('glEnable', (stub.GL_SCISSOR_TEST,)), ('glScissor', (0, 0, 64, 64)), ('glDrawArrays', None),
+        ('glScissor', (2, 2, 4, 4)), ('glDrawArrays', None),
+        ('glDisable', (stub.GL_SCISSOR_TEST,)), ('glDrawArrays', None),
+        ('glScissor', (0, 0, 64, 64)),      # ScissorStack box is restored
+    ]
@@ -0,0 +1,571 @@
+'''
+Copyright (C) 2018 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import itertools
+
+import numpy as np
+import pytest
+
+import scalar_reference as ref
+from conftest import import_module
+
+kernels = import_module('common.kernels')
+
+
+def random_triangles(rng, n, spread=10.0, size=1.0):
+    ''' (n,3,2) counter-clockwise triangles scattered over [0,spread)^2 '''
+    tris = rng.random((n, 1, 2)) * spread + (rng.random((n, 3, 2)) - 0.5) * size
+    flip = kernels.triangles2D_det(tris[:, 0], tris[:, 1], tris[:, 2]) < 0
+    tris[flip] = tris[flip][:, [0, 2, 1]]
+    return tris
+
+
+def grid_triangles(n):
+    '''
+    about n triangles of a jittered grid mesh, returned as ((T,3,2) triangles,
+    (T,3) vertex indices).  neighboring triangles share vertices, and a few
+    are pushed over their neighbors so the mesh self-intersects
+    '''
+    rng = np.random.default_rng(0)
+    side = int(np.ceil(np.sqrt(n / 2))) + 1
+    gy, gx = np.mgrid[0:side, 0:side]
+    coords = np.stack((gx.ravel(), gy.ravel()), axis=1) + (rng.random((side * side, 2)) - 0.5) * 0.2
+    moved = rng.choice(len(coords), size=max(1, len(coords) // 100), replace=False)
+    coords[moved] += (rng.random((len(moved), 2)) - 0.5) * 3
+    v = (np.arange(side - 1)[:, None] * side + np.arange(side - 1)[None, :]).ravel()
+    indices = np.concatenate((
+        np.stack((v, v + 1, v + side + 1), axis=1),
+        np.stack((v, v + side + 1, v + side), axis=1),
+    ))[:n]
+    tris = coords[indices]
+    flip = kernels.triangles2D_det(tris[:, 0], tris[:, 1], tris[:, 2]) < 0
+    tris[flip] = tris[flip][:, [0, 2, 1]]
+    return tris, indices
+
+
+###############################################################################
+# triangles
+
+
+def test_triangles2D_overlap_matches_scalar():
+    rng = np.random.default_rng(1)
+    tris0, tris1 = random_triangles(rng, 2000, spread=3), random_triangles(rng, 2000, spread=3)
+    expected = [ref.triangle2D_overlap(t0.tolist(), t1.tolist()) for (t0, t1) in zip(tris0, tris1)]
+    assert kernels.triangles2D_overlap(tris0, tris1).tolist() == expected
+    assert any(expected) and not all(expected)
+
+
+def test_triangles2D_overlap_pairs_matches_brute_force():
+    rng = np.random.default_rng(2)
+    tris = random_triangles(rng, 200)
+    expected = [
+        (i, j) for (i, j) in itertools.combinations(range(len(tris)), 2)
+        if ref.triangle2D_overlap(tris[i].tolist(), tris[j].tolist())
+    ]
+    pairs = kernels.triangles2D_overlap_pairs(tris)
+    assert sorted(map(tuple, pairs.tolist())) == expected
+
+
+def test_triangles2D_overlap_pairs_ignores_neighbors():
+    tris, indices = grid_triangles(2000)
+    pairs = kernels.triangles2D_overlap_pairs(tris, indices=indices)
+    shared = [set(indices[i]) & set(indices[j]) for (i, j) in pairs.tolist()]
+    assert not any(shared)
+    expected = [
+        (i, j) for (i, j) in kernels.aabb2D_overlap_pairs(tris.min(axis=1), tris.max(axis=1)).tolist()
+        if not set(indices[i]) & set(indices[j]) and ref.triangle2D_overlap(tris[i].tolist(), tris[j].tolist())
+    ]
+    assert sorted(map(tuple, pairs.tolist())) == sorted(expected)
+
+
+def test_benchmark_triangles2D_overlap_pairs_50k(benchmark):
+    tris, indices = grid_triangles(50000)
+    benchmark.group = 'self-intersection'
+    benchmark.extra_info['triangles'] = len(tris)
+    pairs = benchmark(kernels.triangles2D_overlap_pairs, tris, indices=indices)
+    assert len(tris) == 50000 and len(pairs) > 0
+
+
+###############################################################################
+# segments and loops
+
+
+def test_segments2D_intersection_matches_scalar():
+    # compared against intersect_line_line_2d (as used by debug.point_inside_loop2d).
+    # maths.segment2D_intersection steps from b0 away from a0-a1 (the sign of
+    # its dot is flipped), so it misses most crossings and is not a reference
+    rng = np.random.default_rng(3)
+    a0, a1, b0, b1 = (rng.random((2000, 2)) * 4 for _ in range(4))
+    points, hit = kernels.segments2D_intersection(a0, a1, b0, b1)
+    for i in range(len(a0)):
+        p = ref._intersect_line_line_2d(*(v[i].tolist() for v in (a0, a1, b0, b1)))
+        assert hit[i] == (p is not None)
+        if p is not None:
+            assert np.allclose(points[i], p)
+    assert hit.any() and not hit.all()
+
+
+def test_segments2D_intersection_pairs_matches_brute_force():
+    rng = np.random.default_rng(4)
+    segs = rng.random((300, 1, 2)) * 10 + (rng.random((300, 2, 2)) - 0.5) * 2
+    expected = {}
+    for i, j in itertools.combinations(range(len(segs)), 2):
+        p = ref._intersect_line_line_2d(*segs[i].tolist(), *segs[j].tolist())
+        if p is not None: expected[(i, j)] = p
+    pairs, points = kernels.segments2D_intersection_pairs(segs)
+    found = dict(zip(map(tuple, pairs.tolist()), points.tolist()))
+    assert sorted(found) == sorted(expected)
+    assert all(np.allclose(found[k], expected[k]) for k in found)
+
+
+def test_points2D_inside_loop_matches_scalar():
+    rng = np.random.default_rng(5)
+    angles = np.sort(rng.random(40)) * 2 * np.pi
+    radii = 1 + rng.random(40) * 2
+    loop = np.stack((np.cos(angles) * radii, np.sin(angles) * radii), axis=1) + 5
+    points = rng.random((1000, 2)) * 10
+    expected = [ref.point_inside_loop2d(loop.tolist(), p) for p in points.tolist()]
+    assert kernels.points2D_inside_loop(loop, points).tolist() == expected
+    assert any(expected) and not all(expected)
+
+
+###############################################################################
+# plane slicing
+
+
+def grid_mesh(nx, ny):
+    ''' (V,3) coords and (T,3) tris of an nx x ny grid of unit quads at z=0 (open boundary) '''
+    gy, gx = np.mgrid[0:ny + 1, 0:nx + 1]
+    coords = np.stack((gx.ravel(), gy.ravel(), np.zeros(gx.size)), axis=1).astype(np.float64)
+    v = (np.arange(ny)[:, None] * (nx + 1) + np.arange(nx)[None, :]).ravel()
+    tris = np.concatenate((
+        np.stack((v, v + 1, v + nx + 2), axis=1),
+        np.stack((v, v + nx + 2, v + nx + 1), axis=1),
+    ))
+    return coords, tris
+
+
+def tube_mesh(segments, rings, capped, center=(0, 0, 0)):
+    '''
+    (V,3) coords and (T,3) tris of a tube around the z axis with height
+    rings - 1.  capped tubes are closed meshes; open tubes have a boundary
+    at each end
+    '''
+    a = np.arange(segments) * (2 * np.pi / segments)
+    ring = np.stack((np.cos(a), np.sin(a)), axis=1)
+    coords = np.array([(x, y, z) for z in range(rings) for (x, y) in ring], dtype=np.float64)
+    tris = []
+    for r in range(rings - 1):
+        for i in range(segments):
+            v0, v1 = r * segments + i, r * segments + (i + 1) % segments
+            tris += [(v0, v1, v1 + segments), (v0, v1 + segments, v0 + segments)]
+    if capped:
+        bottom, top = len(coords), len(coords) + 1
+        coords = np.concatenate((coords, [(0, 0, 0), (0, 0, rings - 1)]))
+        top_ring = (rings - 1) * segments
+        for i in range(segments):
+            j = (i + 1) % segments
+            tris += [(bottom, j, i), (top, top_ring + i, top_ring + j)]
+    return coords + center, np.array(tris)
+
+
+def angles_around(points, center):
+    d = points[:, :2] - np.asarray(center)[:2]
+    return np.arctan2(d[:, 1], d[:, 0])
+
+
+def test_plane_slice_closed_mesh_loops_are_ordered():
+    coords0, tris0 = tube_mesh(16, 4, capped=True)
+    coords1, tris1 = tube_mesh(16, 4, capped=True, center=(5, 0, 0))
+    coords = np.concatenate((coords0, coords1))
+    tris = np.concatenate((tris0, tris1 + len(coords0)))
+    loops = kernels.plane_slice_triangles((0, 0, 1.5), (0, 0, 1), coords, tris)
+    assert len(loops) == 2
+    for points, cyclic in loops:
+        assert cyclic and len(points) == 16 * 2     # crossing each ring quad's 2 triangles
+        assert np.allclose(points[:, 2], 1.5)
+        center = (0, 0) if points[:, 0].mean() < 2.5 else (5, 0)
+        # consecutive points go around the tube in one direction
+        steps = np.diff(np.unwrap(angles_around(points, center)))
+        assert (steps > 0).all() or (steps < 0).all()
+        assert abs(steps.sum()) < 2 * np.pi
+
+
+def test_plane_slice_open_boundary_polylines():
+    coords, tris = tube_mesh(16, 4, capped=False)
+    # slicing along the tube's axis cuts it into two walls, from bottom boundary to top
+    polylines = kernels.plane_slice_triangles((0, 0, 0), (0, 1, 0.001), coords, tris)
+    assert len(polylines) == 2
+    for points, cyclic in polylines:
+        assert not cyclic
+        assert sorted((points[0, 2], points[-1, 2])) == pytest.approx([0, 3], abs=0.01)
+        dz = np.diff(points[:, 2])
+        assert (dz >= -1e-9).all() or (dz <= 1e-9).all()
+
+
+def test_plane_slice_verts_on_plane():
+    coords, tris = grid_mesh(3, 3)
+    # plane through a column of verts: verts on the plane are in front, so
+    # the slice is one polyline through them, not one per touching triangle
+    ((points, cyclic),) = kernels.plane_slice_triangles((1, 0, 0), (1, 0, 0), coords, tris)
+    assert not cyclic
+    assert np.allclose(points[:, 0], 1)
+    assert points[0, 1] == 0 and points[-1, 1] == 3 or points[0, 1] == 3 and points[-1, 1] == 0
+    dy = np.diff(points[:, 1])
+    assert (dy >= 0).all() or (dy <= 0).all()
+    # plane containing the whole mesh: nothing crosses it
+    assert kernels.plane_slice_triangles((0, 0, 0), (0, 0, 1), coords, tris) == []
+
+
+@pytest.mark.blender
+def test_plane_slice_mesh_matches_kernel():
+    pytest.importorskip('mathutils')
+    maths = import_module('common.maths')
+    coords, tris = tube_mesh(8, 3, capped=True)
+    plane = maths.Plane(maths.Point((0, 0, 0.5)), maths.Normal((0, 0, 1)))
+    ((points, cyclic),) = plane.slice_mesh(coords.tolist(), tris.tolist())
+    ((expected, expected_cyclic),) = kernels.plane_slice_triangles((0, 0, 0.5), (0, 0, 1), coords, tris)
+    assert cyclic == expected_cyclic
+    assert np.allclose([tuple(p) for p in points], expected)
+
+
+###############################################################################
+# paths, angles, and scalar helpers
+
+
+def test_get_path_length_matches_scalar():
+    rng = np.random.default_rng(7)
+    for n in (0, 1, 2, 50):
+        verts = rng.random((n, 3))
+        assert kernels.get_path_length(verts) == pytest.approx(ref.get_path_length(verts.tolist()))
+    verts = rng.random((20, 3))
+    cyclic = ref.get_path_length(verts.tolist() + verts[:1].tolist())
+    assert kernels.get_path_length(verts, cyclic=True) == pytest.approx(cyclic)
+
+
+def test_closest_t_and_distance_matches_scalar():
+    rng = np.random.default_rng(8)
+    points, p0, p1 = rng.random((500, 3)), rng.random((500, 3)), rng.random((500, 3))
+    p1[:10] = p0[:10]   # degenerate segments
+    t, d = kernels.closest_t_and_distance_points_to_segments(points, p0, p1)
+    expected = [
+        ref.closest_t_and_distance_point_to_line_segment(*args)
+        for args in zip(points.tolist(), p0.tolist(), p1.tolist())
+    ]
+    assert np.allclose(t, [e[0] for e in expected])
+    assert np.allclose(d, [e[1] for e in expected])
+
+
+def planar_vectors(rng, n, axis):
+    ''' n random vectors perpendicular to axis, with random lengths '''
+    vecs = np.cross(rng.random((n, 3)) - 0.5, axis)
+    return vecs * (rng.random((n, 1)) + 0.5)
+
+
+def test_vector_angles_between_matches_scalar():
+    rng = np.random.default_rng(9)
+    axis = np.array([0.2, -0.3, 1.0])
+    vecs = planar_vectors(rng, 200, axis)
+    angles = kernels.vector_angles_between(vecs[0], vecs[1:], axis)
+    expected = [ref.vector_angle_between(vecs[0].tolist(), v, axis.tolist()) for v in vecs[1:].tolist()]
+    assert np.allclose(angles, expected)
+
+
+def test_delta_angles_and_sort_by_angles_match_scalar():
+    rng = np.random.default_rng(10)
+    axis = np.array([0.5, 1.0, -0.25])
+    vecs = planar_vectors(rng, 12, axis)
+    deltas = kernels.delta_angles(axis, vecs)
+    assert np.allclose(deltas, ref.delta_angles(axis.tolist(), vecs.tolist()))
+    assert deltas.sum() == pytest.approx(2 * np.pi)
+    objs = list(range(len(vecs)))
+    order = kernels.sort_by_angles(axis, vecs)
+    assert order.tolist() == ref.sort_objects_by_angles(axis.tolist(), objs, vecs.tolist())
+
+
+def test_angles_of_duplicate_directions_match_scalar():
+    # vectors along vecs[0] are at 2pi (sorted last), as in debug.vector_angle_between
+    rng = np.random.default_rng(11)
+    axis = np.array([0.0, 0.0, 1.0])
+    vecs = planar_vectors(rng, 6, axis)
+    vecs = np.concatenate((vecs, [vecs[0] * 2, vecs[3] * 2, vecs[0]]))
+    angles = kernels.angles_about(axis, vecs)
+    assert angles[0] == 0 and angles[6] == angles[8] == pytest.approx(2 * np.pi)
+    assert angles[7] == pytest.approx(angles[3])
+    deltas = kernels.delta_angles(axis, vecs)
+    assert np.allclose(deltas, ref.delta_angles(axis.tolist(), vecs.tolist()))
+    objs = list(range(len(vecs)))
+    order = kernels.sort_by_angles(axis, vecs)
+    assert order.tolist() == ref.sort_objects_by_angles(axis.tolist(), objs, vecs.tolist())
+    assert order.tolist()[-2:] == [6, 8]
+
+
+def test_triangles2D_area_clamp_mid_match_scalar():
+    rng = np.random.default_rng(11)
+    tris = rng.random((100, 3, 2))
+    expected = [ref.triangle2D_area(*t) for t in tris.tolist()]
+    assert np.allclose(kernels.triangles2D_area(tris), expected)
+    v = rng.random((3, 100)) * 4 - 2
+    assert kernels.clamp(v[0], -1, 1).tolist() == [ref.clamp(x, -1, 1) for x in v[0].tolist()]
+    assert kernels.mid(*v).tolist() == [ref.mid(*abc) for abc in zip(*v.tolist())]
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_kernels_keep_float_dtype(dtype):
+    rng = np.random.default_rng(12)
+    points, p0, p1 = (rng.random((10, 3)).astype(dtype) for _ in range(3))
+    t, d = kernels.closest_t_and_distance_points_to_segments(points, p0, p1)
+    assert t.dtype == dtype and d.dtype == dtype
+    assert kernels.path_segment_lengths(points).dtype == dtype
+    assert kernels.triangles2D_area(points[:9].reshape(3, 3, 3)[..., :2]).dtype == dtype
+    assert kernels.angles_about((0, 0, 1), points).dtype == dtype
+    # lists and ints are computed in float64
+    assert kernels.path_segment_lengths(points.tolist()).dtype == np.float64
+    assert kernels.path_segment_lengths(np.arange(6).reshape(3, 2)).dtype == np.float64
+
+
+def _benchmark_data(n=5000):
+    rng = np.random.default_rng(13)
+    axis = np.array([0.0, 0.0, 1.0])
+    data = {
+        'path': rng.random((n, 3)),
+        'points': rng.random((n, 3)), 'p0': rng.random(3), 'p1': rng.random(3),
+        'axis': axis, 'vecs': planar_vectors(rng, n, axis),
+        'tris': rng.random((n, 3, 2)),
+    }
+    data.update({k + ' list': v.tolist() for (k, v) in list(data.items())})
+    return data
+
+
+# name => (kernel, scalar original); each takes the data from _benchmark_data
+KERNEL_BENCHMARKS = {
+    'get_path_length': (
+        lambda d: kernels.get_path_length(d['path']),
+        lambda d: ref.get_path_length(d['path list']),
+    ),
+    'closest_t_and_distance': (
+        lambda d: kernels.closest_t_and_distance_points_to_segments(d['points'], d['p0'], d['p1']),
+        lambda d: [ref.closest_t_and_distance_point_to_line_segment(p, d['p0 list'], d['p1 list']) for p in d['points list']],
+    ),
+    'vector_angle_between': (
+        lambda d: kernels.vector_angles_between(d['vecs'][0], d['vecs'], d['axis']),
+        lambda d: [ref.vector_angle_between(d['vecs list'][0], v, d['axis list']) for v in d['vecs list']],
+    ),
+    'delta_angles': (
+        lambda d: kernels.delta_angles(d['axis'], d['vecs']),
+        lambda d: ref.delta_angles(d['axis list'], d['vecs list']),
+    ),
+    'sort_by_angles': (
+        lambda d: kernels.sort_by_angles(d['axis'], d['vecs']),
+        lambda d: ref.sort_objects_by_angles(d['axis list'], list(range(len(d['vecs list']))), d['vecs list']),
+    ),
+    'triangle2D_area': (
+        lambda d: kernels.triangles2D_area(d['tris']),
+        lambda d: [ref.triangle2D_area(*t) for t in d['tris list']],
+    ),
+}
+
+
+@pytest.mark.parametrize('impl', ['kernel', 'scalar'])
+@pytest.mark.parametrize('name', sorted(KERNEL_BENCHMARKS))
+def test_benchmark_kernel_vs_scalar(benchmark, name, impl):
+    fn = KERNEL_BENCHMARKS[name][impl == 'scalar']
+    benchmark.group = name
+    benchmark.extra_info['impl'] = impl
+    benchmark(fn, _benchmark_data())
+
+
+###############################################################################
+# chunks (culling and decimation)
+
+
+def test_grid_partition_covers_points_in_cell_order():
+    rng = np.random.default_rng(3)
+    points = rng.random((2000, 3)) * (10, 5, 1)
+    order, starts, ends = kernels.grid_partition(points, 64)
+    assert sorted(order.tolist()) == list(range(len(points)))
+    assert starts[0] == 0 and ends[-1] == len(points)
+    assert np.array_equal(starts[1:], ends[:-1]) and (ends > starts).all()
+    assert len(starts) >= len(points) // 64 // 2
+    # chunks are cells of a grid: their bounds do not overlap
+    chunks = [points[order[s:e]] for (s, e) in zip(starts, ends)]
+    mins, maxs = [c.min(axis=0) for c in chunks], [c.max(axis=0) for c in chunks]
+    for i, j in itertools.combinations(range(len(chunks)), 2):
+        assert ((maxs[i] < mins[j]) | (maxs[j] < mins[i])).any()
+    # points of a cell keep their order
+    for s, e in zip(starts, ends):
+        assert (np.diff(order[s:e]) > 0).all()
+
+
+def test_grid_partition_flat_and_empty():
+    points = np.zeros((10, 3))
+    points[:, 0] = np.arange(10)
+    order, starts, ends = kernels.grid_partition(points, 2)
+    assert order.tolist() == list(range(10))
+    assert len(starts) == 5
+    order, starts, ends = kernels.grid_partition(np.zeros((0, 3)), 2)
+    assert len(order) == len(starts) == len(ends) == 0
+
+
+@pytest.mark.parametrize('prim_size', [1, 2, 3])
+def test_cluster_decimate_indices_stay_in_chunk(prim_size):
+    rng = np.random.default_rng(4)
+    nprims = 3000
+    coords = (rng.random((nprims, 1, 3)) * 10 + rng.random((nprims, prim_size, 3)) * 0.1).reshape(-1, 3)
+    order, starts, ends = kernels.grid_partition(coords.reshape(nprims, prim_size, 3).mean(axis=1), 500)
+    coords = coords.reshape(nprims, prim_size, 3)[order].reshape(-1, 3)
+    indices, lod_starts, lod_ends = kernels.cluster_decimate(coords, prim_size, starts, ends, resolution=4)
+
+    assert 0 < len(indices) < len(coords)
+    assert np.array_equal(lod_starts[1:], lod_ends[:-1]) and lod_ends[-1] == len(indices)
+    for i in range(len(starts)):
+        chunk = indices[lod_starts[i]:lod_ends[i]]
+        assert len(chunk) % prim_size == 0
+        assert (chunk >= starts[i] * prim_size).all() and (chunk < ends[i] * prim_size).all()
+        prims = chunk.reshape(-1, prim_size)
+        # no collapsed or duplicated primitives
+        for a, b in itertools.combinations(range(prim_size), 2):
+            assert (prims[:, a] != prims[:, b]).all()
+        assert len(np.unique(np.sort(prims, axis=1), axis=0)) == len(prims)
+
+
+def test_cluster_decimate_keeps_distinct_primitives():
+    # each triangle is far larger than a grid cell: nothing collapses
+    coords = np.array([[(0, 0, 0), (1, 0, 0), (0, 1, 0)], [(1, 1, 1), (0, 1, 1), (1, 0, 1)]], dtype=np.float64)
+    indices, lod_starts, lod_ends = kernels.cluster_decimate(coords.reshape(-1, 3), 3, [0], [2])
+    assert indices.tolist() == list(range(6))
+    assert lod_starts.tolist() == [0] and lod_ends.tolist() == [6]
+
+
+def test_aabbs_view_bounds_culls_and_measures():
+    mins = np.array([(-0.5, -0.5, 0.0), (2.0, 0.0, 0.0), (0.5, -2.0, -0.5), (-0.25, 0.0, 0.0)])
+    maxs = np.array([(0.5, 0.5, 0.0), (3.0, 1.0, 0.0), (1.5, 2.0, 0.5), (0.25, 0.0, 0.0)])
+    visible, pixels = kernels.aabbs_view_bounds(mins, maxs, np.eye(4), (100, 60))
+    # second box is right of the frustum; third crosses its right and top/bottom planes
+    assert visible.tolist() == [True, False, True, True]
+    # ndc sizes scaled by half of viewport, larger side
+    assert pixels[0] == pytest.approx(50)           # 1 x 1 ndc: 50 x 30 pixels
+    assert pixels[2] == pytest.approx(60 * 4 / 2)   # 1 x 4 ndc: 50 x 120 pixels
+    assert pixels[3] == pytest.approx(25)           # 0.5 x 0 ndc: 25 x 0 pixels
+
+
+def test_aabbs_view_bounds_camera_plane():
+    # perspective: w = -z, so the camera looks down -z
+    mvp = np.array([(1, 0, 0, 0), (0, 1, 0, 0), (0, 0, -1, -0.2), (0, 0, -1, 0)], dtype=np.float64)
+    mins = np.array([(-1, -1, -4), (-1, -1, -1), (-1, -1, 1)])
+    maxs = np.array([(1, 1, -2), (1, 1, 1), (1, 1, 2)])
+    visible, pixels = kernels.aabbs_view_bounds(mins, maxs, mvp, (100, 100))
+    assert visible.tolist() == [True, True, False]      # third is behind camera
+    assert pixels[0] == pytest.approx(2 / 2 * 50)       # nearest face at distance 2
+    assert pixels[1] == np.inf                          # crosses camera plane
+
+
+###############################################################################
+# id buffers (picking)
+
+
+def rasterize(prim_size, coords, ids=None, size=1.0, window=(0, 0, 24, 24), **kwargs):
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+    if ids is None: ids = np.arange(1, len(coords) // prim_size + 1)
+    return kernels.rasterize_ids(window, coords, prim_size, np.asarray(ids), size=size, **kwargs)[0]
+
+
+def test_rasterize_points_are_squares():
+    ids = rasterize(1, [(10.5, 10.5, 0.5)], size=5)
+    rows, cols = np.nonzero(ids)
+    assert (rows.min(), rows.max(), cols.min(), cols.max()) == (8, 12, 8, 12)
+    assert len(rows) == 25
+    # non-integer sizes are rounded, like GL without point smoothing
+    assert np.array_equal(rasterize(1, [(10.5, 10.5, 0.5)], size=4.6), ids)
+
+
+def test_rasterize_wide_lines_are_parallelograms():
+    # x-major line through pixel centers: 3 rows high, square ends, and
+    # the last column is left out (diamond-exit rule)
+    ids = rasterize(2, [(2.5, 5.5, 0.5), (12.5, 5.5, 0.5)], size=3)
+    rows, cols = np.nonzero(ids)
+    assert sorted(set(rows.tolist())) == [4, 5, 6]
+    assert sorted(set(cols.tolist())) == list(range(2, 12))
+    assert len(rows) == 3 * 10
+
+    # y-major line is widened horizontally
+    ids = rasterize(2, [(5.5, 2.5, 0.5), (6.5, 12.5, 0.5)], size=3)
+    rows, cols = np.nonzero(ids)
+    assert sorted(set(rows.tolist())) == list(range(2, 12))
+    assert all(np.count_nonzero(ids[r]) == 3 for r in range(2, 12))
+
+    # diagonal x-major line covers exactly 3 pixels per column; a round
+    # capsule of width 3 would cover 5 (vertical extent 3*sqrt(2))
+    ids = rasterize(2, [(0.5, 0.5, 0.5), (20.5, 20.5, 0.5)], size=3)
+    assert all(np.count_nonzero(ids[:, c]) == 3 for c in range(2, 18))
+    assert ids[11, 10] and not ids[12, 10]
+
+    # zero-length lines are not drawn
+    assert not rasterize(2, [(5.5, 5.5, 0.5), (5.5, 5.5, 0.5)], size=3).any()
+
+
+def test_rasterize_triangles_share_edges_without_overlap():
+    quad = [(2, 2, 0.5), (20, 2, 0.5), (20, 20, 0.5), (2, 20, 0.5)]
+    coords = [quad[0], quad[1], quad[2], quad[0], quad[2], quad[3]]
+    ids = rasterize(3, coords)
+    assert np.count_nonzero(ids) == 18 * 18
+    # each pixel center belongs to exactly one triangle
+    one, two = rasterize(3, coords[:3]), rasterize(3, coords[3:])
+    assert not np.any(one & two)
+
+
+def test_pick_nearest_edge_and_depth_bias():
+    # two horizontal edges at rows 6 and 16; cursor at row 9 is nearer the first
+    edges = [(2.5, 6.5, 0.5), (20.5, 6.5, 0.5), (2.5, 16.5, 0.5), (20.5, 16.5, 0.5)]
+    ids = rasterize(2, edges, size=3)
+    assert kernels.nearest_id(ids, (10, 9), 10) == 1
+    assert kernels.nearest_id(ids, (10, 13), 10) == 2
+    assert kernels.nearest_id(ids, (10, 11), 1) == 0
+
+    # a face in front of edge 2 hides it, but edge 1 lying on the face
+    # stays pickable thanks to the depth bias
+    face = [(0, 0, 0.5), (24, 0, 0.5), (24, 24, 0.5), (0, 0, 0.5), (24, 24, 0.5), (0, 24, 0.5)]
+    ids_buf, depth_buf = kernels.rasterize_ids((0, 0, 24, 24), np.array(face, dtype=np.float64), 3, np.zeros(2, dtype=np.int64))
+    edges = np.array(edges, dtype=np.float64)
+    edges[2:, 2] = 0.6
+    ids, _ = kernels.rasterize_ids((0, 0, 24, 24), edges, 2, np.array([1, 2]), size=3,
+                                   depth_bias=0.00005, ids_buf=ids_buf, depth_buf=depth_buf)
+    assert kernels.nearest_id(ids, (10, 13), 10) == 1
+    assert not np.any(ids == 2)
+
+
+@pytest.mark.blender
+def test_kernels_match_maths():
+    ''' compares against the scalar versions in maths.py (inside Blender only) '''
+    pytest.importorskip('mathutils')
+    maths = import_module('common.maths')
+    from mathutils import Vector
+    rng = np.random.default_rng(6)
+    tris0, tris1 = random_triangles(rng, 500, spread=3), random_triangles(rng, 500, spread=3)
+    expected = [
+        maths.triangle2D_overlap([Vector(p) for p in t0], [Vector(p) for p in t1])
+        for (t0, t1) in zip(tris0.tolist(), tris1.tolist())
+    ]
+    assert kernels.triangles2D_overlap(tris0, tris1).tolist() == expected
+    path = rng.random((50, 3))
+    assert kernels.get_path_length(path) == pytest.approx(maths.get_path_length([Vector(v) for v in path.tolist()]))
+    expected = [maths.triangle2D_area(*(Vector(p) for p in t)) for t in tris0.tolist()]
+    assert np.allclose(kernels.triangles2D_area(tris0), expected)
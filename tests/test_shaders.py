@@ -0,0 +1,133 @@
+'''
+Copyright (C) 2018 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import pytest
+
+from conftest import import_module
+
+
+'''
+shaders under bgl_stub.  needs bpy, so run inside Blender (see
+test_bmesh_render.py)
+'''
+
+bpy = pytest.importorskip('bpy')
+pytestmark = pytest.mark.blender
+
+
+@pytest.fixture
+def shaders(stub):
+    return import_module('common.shaders')
+
+
+def test_variants_replay_when_funcStart_changes_values(stub, shaders):
+    # funcStart assigns a new value on each enable, which must not hide
+    # the values assigned while another variant was selected
+    enables = []
+    def start(shader):
+        enables.append(shader)
+        shader.assign('view_distance', float(len(enables)))
+
+    variants = shaders.ShaderVariants('test', 'bmesh_render.glsl', funcStart=start)
+    off, on = {'CULL_BACKFACES': 'false'}, {'CULL_BACKFACES': 'true'}
+    get = lambda name, defines: stub.get_uniform(name, program=variants.get(defines).shaderProg)
+
+    variants.select(off)
+    variants.enable()
+    variants.assign('mirror_o', (1.0, 2.0, 3.0))
+    variants.disable()
+
+    variants.select(on)
+    variants.enable()
+    assert enables[-1] is variants       # funcStart assigns through the variants
+    assert get('mirror_o', on) == (1.0, 2.0, 3.0)
+    assert get('view_distance', on) == (2.0,)
+    variants.assign('color', (1.0, 0.0, 0.0, 1.0))
+    variants.disable()
+
+    variants.select(off)
+    variants.enable()
+    assert get('color', off) == (1.0, 0.0, 0.0, 1.0)
+    assert get('view_distance', off) == (3.0,)
+    variants.disable()
+
+    # selected variant has all values: a changed value keeps it current
+    variants.select(on)
+    variants.enable()
+    assert get('view_distance', on) == (4.0,)
+    assert variants.current == {variants.get_key(on)}
+    variants.disable()
+
+
+###############################################################################
+# source cache and startup
+
+
+GLSL = '''
+uniform vec4 color;
+
+// vertex shader
+#version 120
+void main() { gl_Position = vec4(0.0); }
+
+// fragment shader
+#version 120
+void main() { gl_FragColor = color * SCALE; }
+'''
+
+
+@pytest.fixture
+def source_cache_path(shaders, tmp_path, monkeypatch):
+    path = str(tmp_path / 'sources.json')
+    monkeypatch.setattr(shaders.Shader, 'get_source_cache_path', staticmethod(lambda: path))
+    monkeypatch.setattr(shaders.Shader, 'source_cache', None)
+    return path
+
+
+def test_source_cache_is_keyed_on_source(shaders, source_cache_path, tmp_path):
+    import json
+    Shader = shaders.Shader
+    fn = tmp_path / 'test.glsl'
+    fn.write_text(GLSL)
+    vert, frag = Shader.preprocess_file(str(fn), defines={'SCALE': '1.0'})
+    assert '#define SCALE 1.0' in frag
+    assert len(json.load(open(source_cache_path))) == 1
+
+    # next session reads the cache from disk
+    Shader.source_cache = None
+    assert Shader.preprocess_file(str(fn), defines={'SCALE': '1.0'}) == (vert, frag)
+    assert len(Shader.source_cache) == 1
+
+    # other defines, and edited files, are preprocessed again
+    Shader.preprocess_file(str(fn), defines={'SCALE': '2.0'})
+    fn.write_text(GLSL.replace('color * SCALE', 'SCALE * color'))
+    _, frag = Shader.preprocess_file(str(fn), defines={'SCALE': '1.0'})
+    assert 'SCALE * color' in frag
+    assert len(json.load(open(source_cache_path))) == 3
+
+
+def test_benchmark_shader_startup(stub, shaders, source_cache_path):
+    stub.begin_frame()
+    results = shaders.benchmark_shader_startup(rounds=2)
+    assert set(results) == {'lazy cold', 'lazy warm', 'eager cold', 'eager warm'}
+    # lazy shaders are not compiled; eager ones are deleted after timing
+    assert stub.calls['glCreateProgram'] == 6 * 2 * 2
+    assert stub.calls['glDeleteProgram'] == stub.calls['glCreateProgram']
@@ -0,0 +1,211 @@
+'''
+Copyright (C) 2018 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+import math
+
+import pytest
+
+from conftest import import_module
+
+
+'''
+text measurement (LRUCache, FontAdvanceTable, and the text caches of
+Drawing) against FakeFont, a stand-in for blf.dimensions.  runs with plain
+pytest through the blender_stubs fixture
+'''
+
+
+class FakeFont:
+    '''
+    blf.dimensions of a font whose glyphs have an advance, ink edges
+    (relative to the pen position), and optional kerning pairs.  the width
+    of a string is the extent of the ink of its glyphs; spaces have no ink.
+    its height is the font size (set with blf.size)
+    '''
+    def __init__(self, kerns=None):
+        self.kerns = kerns or {}
+        self.calls = 0
+        self.size = 12
+
+    def set_size(self, size, dpi=None, fontid=None):
+        self.size = size
+
+    def advance(self, c): return 5 + ord(c) % 4
+    def left(self, c): return (ord(c) % 3) * 0.5
+    def right(self, c): return self.advance(c) - (ord(c) % 2) * 0.5
+
+    def dimensions(self, text, fontid=None):
+        self.calls += 1
+        pen, lefts, rights = 0, [], []
+        for i, c in enumerate(text):
+            if i: pen += self.kerns.get(text[i-1:i+1], 0)
+            if c != ' ':
+                lefts.append(pen + self.left(c))
+                rights.append(pen + self.right(c))
+            pen += self.advance(c)
+        return ((max(rights) - min(lefts)) if rights else 0, self.size * (1 + text.count('\n')))
+
+
+@pytest.fixture
+def drawing(blender_stubs, stub):
+    return import_module('common.drawing')
+
+
+@pytest.fixture
+def profiler(drawing, monkeypatch):
+    ''' enabled profiler with counters cleared '''
+    profiler = drawing.profiler
+    monkeypatch.setattr(type(profiler), '_enabled', True)
+    profiler.clear()
+    yield profiler
+    profiler.clear()
+
+
+@pytest.fixture
+def font(drawing, monkeypatch):
+    ''' FakeFont measuring for FontManager (fontid 0) '''
+    font = FakeFont()
+    FontManager = import_module('common.fontmanager').FontManager
+    monkeypatch.setattr(FontManager, 'dimensions', staticmethod(font.dimensions))
+    monkeypatch.setattr(FontManager, 'size', staticmethod(font.set_size))
+    monkeypatch.setattr(FontManager, '_last_fontid', 0)
+    monkeypatch.setattr(FontManager, '_kerning', set())
+    return font
+
+
+@pytest.fixture
+def instance(drawing, font, monkeypatch):
+    ''' Drawing instance at dpi 72, so sizes are not scaled '''
+    monkeypatch.setattr(drawing.Drawing, 'update_dpi', staticmethod(lambda: None))
+    monkeypatch.setattr(drawing.Drawing, '_dpi_mult', 1)
+    return drawing.Drawing.get_instance()
+
+
+###############################################################################
+# LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used(drawing, profiler):
+    cache = drawing.LRUCache('test cache', 2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1          # a is now more recently used than b
+    cache.put('c', 3)
+    assert 'b' not in cache and 'a' in cache and 'c' in cache
+    cache.put('a', 4)                   # updating a makes it most recent
+    cache.put('d', 5)
+    assert 'c' not in cache and cache.get('a') == 4
+    cache.set_capacity(1)
+    assert len(cache) == 1 and 'a' in cache
+
+    assert cache.get('b') is None and cache.get('b', 0) == 0
+    assert profiler.get_count('test cache hits') == 2
+    assert profiler.get_count('test cache misses') == 2
+    assert profiler.get_count('test cache evictions') == 3
+
+
+def test_lru_cache_counts_nothing_when_profiler_disabled(drawing):
+    profiler = drawing.profiler
+    profiler.clear()
+    cache = drawing.LRUCache('test cache', 1)
+    cache.get(cache.put('a', 1))
+    cache.put('b', 2)
+    assert profiler.get_count('test cache misses') == 0
+    assert profiler.get_count('test cache evictions') == 0
+
+
+###############################################################################
+# FontAdvanceTable
+
+
+strings = ['x', 'Hello', 'Hello world', '  two  spaces  ', 'The quick brown fox, jumped!', 'AVATAR', 'xx.x', ' ', '']
+
+
+@pytest.mark.parametrize('text', strings)
+def test_font_advance_table_matches_dimensions(drawing, font, text):
+    table = drawing.FontAdvanceTable()
+    assert not table.kerning
+    assert table.width(text) == pytest.approx(font.dimensions(text)[0])
+
+
+@pytest.mark.parametrize('text', strings)
+def test_font_advance_table_kerning(drawing, font, text):
+    font.kerns = {'AV': -1.5, 'VA': -1.0, 'TA': -0.5, 'o ': 0.5, 'x.': -1.0, 'xx': 0.25}
+    drawing.fm.enable_kerning_default()
+    table = drawing.FontAdvanceTable()
+    assert table.kerning
+    assert table.width(text) == pytest.approx(font.dimensions(text)[0])
+
+
+def test_font_advance_table_measures_new_glyphs_once(drawing, font):
+    table = drawing.FontAdvanceTable()
+    calls = font.calls
+    assert table.width('héllo') == pytest.approx(font.dimensions('héllo')[0])
+    assert font.calls == calls + 1 + 3      # dimensions above, and é measured with 3 calls
+    table.width('héllo')
+    assert font.calls == calls + 1 + 3
+
+
+###############################################################################
+# Drawing text caches
+
+
+def test_measure_line_width(instance, font, profiler):
+    d = instance
+    assert d.measure_line_width('Hello world') == math.ceil(font.dimensions('Hello world')[0])
+    # table is made once per font and size; later lines only sum advances
+    calls = font.calls
+    assert d.measure_line_width('world, Hello') == math.ceil(font.dimensions('world, Hello')[0])
+    assert font.calls == calls + 1
+
+    # verify_text_width compares against blf, and uses blf if they differ
+    d.verify_text_width = True
+    key = (0, d.fontsize_scaled)
+    d.advance_tables.get(key).advances['o'] += 1
+    assert d.measure_line_width('Hello world') == math.ceil(font.dimensions('Hello world')[0])
+    assert profiler.get_count('text width mismatches') == 1
+
+
+def test_get_text_width_caches_lines(instance, font, profiler):
+    d = instance
+    assert d.get_text_width('ab\nabcdef') == math.ceil(font.dimensions('abcdef')[0])
+    assert d.get_text_width(['abcdef', 'ab']) == math.ceil(font.dimensions('abcdef')[0])
+    # each line was measured once, though the texts differ
+    assert profiler.get_count('text width cache misses') == 2
+    assert profiler.get_count('text width cache hits') == 2
+
+
+def test_get_text_run(instance, font, profiler):
+    d = instance
+    lh, lb = d.line_height, d.line_base
+    run = d.get_text_run('one\n\nthree')
+    assert run == [('one', 0, -lb), ('three', 0, -(2 * lh + lb))]     # empty line is skipped
+    assert d.get_text_run(['one', '', 'three']) is run
+    assert profiler.get_count('text run cache hits') == 1
+
+    # runs depend on font size
+    d.set_font_size(24)
+    assert d.line_height != lh
+    run24 = d.get_text_run('one\n\nthree')
+    assert run24 is not run and run24[1][2] == -(2 * d.line_height + d.line_base)
+    d.set_font_size(12)
+    assert d.get_text_run('one\n\nthree') is run